@@ -0,0 +1,191 @@
+import io
+import os
+import re
+import time
+import posixpath
+import tarfile
+import threading
+import zipfile
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Tuple
+
+ARCHIVE_SUFFIXES = (".zip", ".tar")
+# <archief>.zip of <archief>.tar als map in een pad: /data/batch.zip/batch/nummer/...
+ARCHIVE_IN_PATH = re.compile(r"\.(?:zip|tar)(?=[/\\]|$)", re.IGNORECASE)
+
+# Aantal archieven dat een proces tegelijk open houdt; de minst recent
+# gebruikte reader wordt gesloten (lange watch-runs zien veel archieven).
+MAX_OPEN_ARCHIVES = 8
+
+_readers: "OrderedDict[tuple, ArchiveReader]" = OrderedDict()
+_readers_lock = threading.Lock()
+
+
+def _forget_readers():
+    """After a fork: readers and lock are the parent's (the lock may be held by one of its threads)."""
+    global _readers_lock
+    _readers.clear()
+    _readers_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_readers)
+
+
+class ArchiveReader:
+    """
+    Random access to the members of a zip or uncompressed tar archive.
+
+    Reads are serialized with a lock, so one reader can be shared by the
+    prefetch and snippet threads of a process.
+    """
+
+    def __init__(self, archive: str):
+        self.archive = archive
+        self.lock = threading.Lock()
+        self.closed = False
+        if zipfile.is_zipfile(archive):
+            self.zip = zipfile.ZipFile(archive)
+            self.tar = None
+            self.members = {info.filename: info for info in self.zip.infolist() if not info.is_dir()}
+        else:
+            self.zip = None
+            try:
+                # alleen ongecomprimeerde tar: een .tar.gz kan niet willekeurig gelezen worden
+                self.tar = tarfile.open(archive, "r:")
+            except tarfile.ReadError as e:
+                raise OSError(f"{archive} is geen zip- of (ongecomprimeerd) tar-archief: {e}") from e
+            self.members = {info.name: info for info in self.tar.getmembers() if info.isfile()}
+
+    def names(self) -> List[str]:
+        """Names of the file members, in archive order."""
+        return list(self.members)
+
+    def read(self, name: str) -> bytes:
+        info = self.members.get(name)
+        if info is None:
+            raise FileNotFoundError(f"{name} niet gevonden in {self.archive}")
+        with self.lock:
+            if self.closed:
+                # gesloten door close_archives of verdrongen uit de cache
+                raise OSError(f"{self.archive} is al gesloten")
+            if self.zip is not None:
+                return self.zip.read(info)
+            return self.tar.extractfile(info).read()
+
+    def identity(self, name: str) -> Tuple[int, int]:
+        """(size, mtime in ns) of a member, like os.stat for a regular file."""
+        info = self.members.get(name)
+        if info is None:
+            raise FileNotFoundError(f"{name} niet gevonden in {self.archive}")
+        if self.zip is not None:
+            return info.file_size, int(time.mktime(info.date_time + (0, 0, -1))) * 1_000_000_000
+        return info.size, int(info.mtime) * 1_000_000_000
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            (self.zip or self.tar).close()
+
+
+def is_archive(path: str) -> bool:
+    """True for a zip or tar file given as batch."""
+    return path.lower().endswith(ARCHIVE_SUFFIXES) and os.path.isfile(path)
+
+
+def split_archive_path(path: str) -> Tuple[str, str] | None:
+    """
+    Split a path inside an archive into (archive path, member name).
+
+    Returns None for a regular path (also for a directory that happens to be
+    called ``something.zip``).
+    """
+    match = ARCHIVE_IN_PATH.search(path)
+    if match is None or not os.path.isfile(path[:match.end()]):
+        return None
+    return path[:match.end()], path[match.end() + 1:].replace("\\", "/")
+
+
+def open_archive(archive: str) -> ArchiveReader:
+    """
+    Reader for ``archive``, shared within this process (not across a fork).
+
+    Readers are keyed on the size and mtime of the archive, so an archive
+    that is replaced gets a new reader (the old one is closed). At most
+    MAX_OPEN_ARCHIVES readers stay open; the least recently used is closed.
+    """
+    st = os.stat(archive)
+    key = (archive, st.st_mtime_ns, st.st_size)
+    with _readers_lock:
+        reader = _readers.get(key)
+        if reader is None:
+            for stale in [k for k in _readers if k[0] == archive]:
+                _readers.pop(stale).close()
+            reader = _readers[key] = ArchiveReader(archive)
+            while len(_readers) > MAX_OPEN_ARCHIVES:
+                _readers.popitem(last=False)[1].close()
+        _readers.move_to_end(key)
+        return reader
+
+
+def close_archives(path: str | None = None):
+    """
+    Close the readers of the archive holding ``path`` (a batch path, member
+    or archive) in this process, or all readers without ``path``. A regular
+    path is ignored.
+    """
+    split = split_archive_path(path) if path else None
+    archive = split[0] if split else path
+    with _readers_lock:
+        for key in [k for k in _readers if path is None or k[0] == archive]:
+            _readers.pop(key).close()
+
+
+@contextmanager
+def closing_archives(path: str):
+    """Close the archive readers for ``path`` (see close_archives) when the block ends."""
+    try:
+        yield
+    finally:
+        close_archives(path)
+
+
+def read_file(path: str) -> bytes:
+    """Contents of a regular file or of an archive member."""
+    split = split_archive_path(path)
+    if split is None:
+        with open(path, "rb") as f:
+            return f.read()
+    return open_archive(split[0]).read(split[1])
+
+
+def open_file(path: str):
+    """Binary file object for a regular file or an archive member."""
+    split = split_archive_path(path)
+    if split is None:
+        return open(path, "rb")
+    return io.BytesIO(open_archive(split[0]).read(split[1]))
+
+
+def file_identity(path: str) -> Tuple[int, int]:
+    """(size, mtime in ns) of a regular file or an archive member."""
+    split = split_archive_path(path)
+    if split is None:
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns
+    return open_archive(split[0]).identity(split[1])
+
+
+def archive_batch_path(archive: str) -> str:
+    """
+    Batch path for an archive: the folder inside the archive that holds the
+    issue folders, found from the first METS member
+    (``<batch>/<issue>/<issue>_mets.xml``). For an archive without such a
+    folder the archive itself is the batch.
+    """
+    for name in open_archive(archive).names():
+        if name.endswith("_mets.xml"):
+            root = posixpath.dirname(posixpath.dirname(name))
+            return f"{archive}/{root}" if root else archive
+    return archive
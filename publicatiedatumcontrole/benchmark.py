@@ -0,0 +1,430 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from statistics import median
+from typing import Callable, Dict, List
+
+from .utils import MONTHS
+from .metrics import peak_rss_mb
+
+# modules die bij het opstarten niet geladen horen te worden
+HEAVY_MODULES = ["pandas", "numpy", "scipy", "matplotlib", "PIL", "rapidfuzz", "lxml"]
+
+
+def _env() -> dict:
+    """Environment in which the package is importable from any working directory."""
+    env = os.environ.copy()
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env["PYTHONPATH"] = os.pathsep.join(p for p in [package_root, env.get("PYTHONPATH")] if p)
+    return env
+
+
+def _time_command(cmd: List[str], repeat: int, cwd: str | None = None) -> float:
+    """Median wall time in seconds of running ``cmd`` ``repeat`` times."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(cmd, cwd=cwd, env=_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       check=True)
+        timings.append(time.perf_counter() - start)
+    return median(timings)
+
+
+def loaded_heavy_modules(module: str) -> List[str]:
+    """Heavy modules that are loaded by importing ``module`` in a fresh interpreter."""
+    code = (f"import sys, {module}; "
+            f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", code], env=_env(), capture_output=True, text=True,
+                         check=True)
+    return [m for m in out.stdout.strip().split(",") if m]
+
+
+def startup_benchmark(repeat: int = 5) -> Dict[str, float]:
+    """
+    Measure the startup path of the CLI in fresh interpreters.
+
+    Returns dict {case: median seconds} for the bare interpreter, ``--help``
+    and a run over one empty batch.
+    """
+    python = sys.executable
+    cli = [python, "-m", "publicatiedatumcontrole"]
+    results = {"python -c pass": _time_command([python, "-c", "pass"], repeat),
+               "--help": _time_command(cli + ["--help"], repeat)}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        batch = os.path.join(tmp, "empty_batch")
+        os.makedirs(batch)
+        results["empty batch"] = _time_command(
+            cli + [batch, "-o", os.path.join(tmp, "out"), "--log", os.path.join(tmp, "run.log")],
+            repeat, cwd=tmp)
+    return results
+
+
+def time_stage(func: Callable, unit: str, trace_memory: bool = False) -> tuple:
+    """
+    Run one stage and measure it. ``func`` returns (result, item count).
+
+    Returns tuple:
+        (result, metrics dict with wall/cpu seconds, items, throughput and memory)
+    """
+    if trace_memory:
+        tracemalloc.start()
+    wall, cpu = time.perf_counter(), time.process_time()
+    result, items = func()
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+    metrics = {"wall_s": round(wall, 4), "cpu_s": round(cpu, 4), "items": items, "unit": unit,
+               "per_s": round(items / wall, 1) if wall > 0 else None, "peak_rss_mb": peak_rss_mb()}
+    if trace_memory:
+        metrics["py_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+        tracemalloc.stop()
+    return result, metrics
+
+
+def stage_benchmark(batch: str, kde_backend: str = "auto", max_snippets: int = 50,
+                    trace_memory: bool = False) -> Dict[str, dict]:
+    """
+    Time each stage of the pipeline separately on one batch, serially in
+    this process.
+
+    Stages: discovery (get_files), alto_parse (read_alto_strings), month_match
+    (MonthMatcher on every string, cold cache), detect (candidate detection
+    on the parsed pages), mets_parse, kde (per title, incl. VPOS score),
+    compare (compare_dates) and, when the batch has access images, snippets.
+
+    Returns dict {stage: metrics} (see time_stage).
+    """
+    import pandas as pd
+    from . import matcher as matcher_module
+    from .getfiles import get_files
+    from .extract import read_alto_strings, read_mets_records, mets_records_to_dict
+    from .runner import _detect_candidates, candidate_frame
+    from .scores import kde_gaussian, vpos_score
+    from .compare import compare_dates
+    from .report import render_snippets
+    # scores/report laden scipy en matplotlib pas bij gebruik; niet meetellen in de stappen
+    import scipy.stats, scipy.signal, scipy.ndimage  # noqa: F401,E401
+
+    months = dict(MONTHS)
+    stages: Dict[str, dict] = {}
+
+    def run(name, unit, func):
+        result, stages[name] = time_stage(func, unit, trace_memory=trace_memory)
+        return result
+
+    alto_files, mets_files = run("discovery", "files", lambda: (lambda f: (f, len(f[0]) + len(f[1])))(
+        get_files(batch)))
+
+    def parse():
+        pages = [read_alto_strings(f) for f in alto_files]
+        return pages, sum(len(page.contents) for page in pages)
+    pages = run("alto_parse", "strings", parse)
+    stages["alto_parse"]["files_per_s"] = round(len(alto_files) / stages["alto_parse"]["wall_s"], 1) \
+        if stages["alto_parse"]["wall_s"] else None
+
+    def match():
+        month_matcher = matcher_module.MonthMatcher(months)
+        tokens = [token for page in pages for token in page.contents if token]
+        for token in tokens:
+            month_matcher.match(token)
+        return month_matcher.cache_stats(), len(tokens)
+    hits, misses = run("month_match", "strings", match)
+    stages["month_match"]["cache_hit_rate"] = matcher_module.hit_rate(hits, misses)
+
+    def detect():
+        matcher_module._MATCHERS.clear()  # koude cache, zoals in een nieuwe worker
+        candidates = []
+        for alto_file, page in zip(alto_files, pages):
+            candidates.extend(_detect_candidates(alto_file, page, months))
+        return candidates, len(alto_files)
+    candidates = run("detect", "files", detect)
+
+    records = run("mets_parse", "files", lambda: (read_mets_records(mets_files), len(mets_files)))
+
+    df = candidate_frame(candidates)
+    df_mets = pd.DataFrame(mets_records_to_dict(records))
+    df_mets["title_edition"] = df_mets["mets_title"] + "_" + df_mets["mets_edition"]
+    df_merged = pd.merge(df, df_mets, on="filename")
+
+    def kde():
+        scored = [vpos_score(kde_gaussian(group.copy(), backend=kde_backend))
+                  for _, group in df_merged.groupby("title_edition", sort=False)]
+        return scored, len(df_merged)
+    run("kde", "candidates", kde)
+
+    run("compare", "candidates", lambda: (compare_dates(df_merged.copy()), len(df_merged)))
+
+    with_image = df_merged[[os.path.exists(os.path.join(batch, f, "access", f"{f}_00001_access.jp2"))
+                            for f in df_merged["filename"]]].head(max_snippets)
+    if len(with_image):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.makedirs(os.path.join(tmp, "images"))
+            run("snippets", "snippets", lambda: (render_snippets(with_image, batch, tmp), len(with_image)))
+
+    return stages
+
+
+# regio voor de parser-benchmark: linksboven, ongeveer waar een geleerde datumregio ligt
+PARSER_REGION = {"hmin": 0, "vmin": 0, "hmax": 1500, "vmax": 1000}
+
+
+def reference_alto_strings(alto_file: str, header_fraction: float | None = None, region: dict | None = None,
+                           data: bytes | None = None):
+    """
+    Reference for the ALTO parser backends, without streaming or early
+    termination: the document is parsed into a full tree, every String is
+    read in document order as the original ``get_alto_data`` did, and the
+    header band and region rules of read_alto_strings are applied per
+    TextBlock and TextLine afterwards.
+
+    Returns AltoStrings.
+    """
+    from array import array
+    from lxml import etree
+    from .archive import open_file
+    from .extract import AltoStrings
+
+    if data is None:
+        with open_file(alto_file) as f:
+            data = f.read()
+    root = etree.fromstring(data)
+
+    def elements(parent, name):
+        return (e for e in parent.iter() if isinstance(e.tag, str) and etree.QName(e).localname == name)
+
+    def number(element, key, convert=float):
+        try:
+            return convert(element.get(key))
+        except (TypeError, ValueError):
+            return None
+
+    page_height = next((h for h in (number(p, "HEIGHT", lambda v: int(float(v))) for p in elements(root, "Page"))
+                        if h is not None), None)
+    if header_fraction or region:
+        band_limit = page_height * header_fraction if header_fraction and page_height is not None else None
+        strings = []
+        block_vpos = None
+        neighbour = True
+        for block in elements(root, "TextBlock"):
+            # een blok zonder leesbare VPOS hoort bij het vorige blok
+            block_vpos = number(block, "VPOS") if number(block, "VPOS") is not None else block_vpos
+            below_band = block_vpos is not None and band_limit is not None and block_vpos > band_limit
+            below_region = block_vpos is not None and region is not None and block_vpos > region["vmax"]
+            neighbour = neighbour or (block_vpos is not None and not below_band and not below_region)
+            for line in elements(block, "TextLine"):
+                box = [number(line, key) for key in ("VPOS", "HPOS")] + \
+                    [number(line, key) if line.get(key) is not None else 0.0 for key in ("HEIGHT", "WIDTH")]
+                in_region = region is None or None in box or (
+                    box[0] <= region["vmax"] and box[0] + box[2] >= region["vmin"] and
+                    box[1] <= region["hmax"] and box[1] + box[3] >= region["hmin"])
+                for string in elements(line, "String"):
+                    if below_region or not in_region or (below_band and not neighbour):
+                        continue
+                    if _reference_string(string, strings) and below_band:
+                        neighbour = False
+    else:
+        strings = []
+        for string in elements(root, "String"):
+            _reference_string(string, strings)
+
+    return AltoStrings(page_height, [c for c, _, _ in strings], array("i", [v for _, v, _ in strings]),
+                       array("i", [h for _, _, h in strings]))
+
+
+def _reference_string(string, strings: list) -> bool:
+    """Append (CONTENT, VPOS, HPOS) of a String with integer coordinates that fit in 32 bits."""
+    try:
+        vpos, hpos = int(string.get("VPOS")), int(string.get("HPOS"))
+    except (TypeError, ValueError):
+        return False
+    if not all(-2 ** 31 <= v < 2 ** 31 for v in (vpos, hpos)):
+        return False
+    strings.append((string.get("CONTENT"), vpos, hpos))
+    return True
+
+
+def parser_benchmark(batch: str, max_files: int = 500, header_fraction: float = 0.25) -> Dict[str, dict]:
+    """
+    Conformance and throughput of the ALTO parser backends on the front
+    pages of ``batch``.
+
+    Every backend parses every file in memory, for the full page, the header
+    band and a region (PARSER_REGION), and must give exactly the same
+    AltoStrings as reference_alto_strings (page height, contents, VPOS and
+    HPOS). The reference is timed as well.
+
+    Returns dict {parser: {mode: {"strings_per_s", "files_per_s", "mismatches"}}}.
+    """
+    from .getfiles import get_files
+    from .extract import ALTO_BACKENDS, read_alto_strings
+
+    alto_files = get_files(batch)[0][:max_files]
+    data = []
+    for alto_file in alto_files:
+        with open(alto_file, "rb") as f:
+            data.append(f.read())
+    modes = {"full": {}, "header": {"header_fraction": header_fraction}, "region": {"region": PARSER_REGION}}
+    parsers = {"referentie": reference_alto_strings}
+    parsers.update({backend: lambda f, backend=backend, **kwargs: read_alto_strings(f, backend=backend, **kwargs)
+                    for backend in ALTO_BACKENDS})
+
+    results: Dict[str, dict] = {}
+    reference: Dict[str, list] = {}
+    for name, parse in parsers.items():
+        results[name] = {}
+        for mode, kwargs in modes.items():
+            start = time.perf_counter()
+            pages = [parse(f, data=d, **kwargs) for f, d in zip(alto_files, data)]
+            seconds = time.perf_counter() - start
+            pages = [(p.page_height, p.contents, p.vpos.tolist(), p.hpos.tolist()) for p in pages]
+            reference.setdefault(mode, pages)
+            strings = sum(len(p[1]) for p in pages)
+            results[name][mode] = {
+                "strings_per_s": round(strings / seconds) if seconds else None,
+                "files_per_s": round(len(pages) / seconds, 1) if seconds else None,
+                "mismatches": [f for f, page, ref in zip(alto_files, pages, reference[mode]) if page != ref],
+            }
+    return results
+
+
+def run_benchmark(batch: str | None = None, issues: int = 200, seed: int = 0, jp2: bool = False,
+                  kde_backend: str = "auto", trace_memory: bool = False) -> dict:
+    """
+    Stage benchmark on ``batch``, or on a freshly generated synthetic batch
+    of ``issues`` issues when no batch is given.
+
+    Returns dict that can be written as JSON and compared between runs.
+    """
+    from .cache import TOOL_VERSION
+
+    report = {"tool_version": TOOL_VERSION, "python": platform.python_version(),
+              "platform": platform.platform(), "cpu_count": os.cpu_count(),
+              "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "kde_backend": kde_backend}
+
+    if batch:
+        report["batch"] = {"path": os.path.abspath(batch)}
+        report["stages"] = stage_benchmark(batch, kde_backend=kde_backend, trace_memory=trace_memory)
+    else:
+        from .synthetic import generate_batch
+
+        with tempfile.TemporaryDirectory() as tmp:
+            synthetic = os.path.join(tmp, "synthetic_batch")
+            report["batch"] = {"synthetic": generate_batch(synthetic, issues=issues, jp2=jp2, seed=seed),
+                               "seed": seed}
+            report["stages"] = stage_benchmark(synthetic, kde_backend=kde_backend, trace_memory=trace_memory)
+    return report
+
+
+def compare_reports(base: dict, new: dict) -> List[str]:
+    """Table lines with the wall time per stage of two benchmark reports."""
+    lines = [f"{'stage':<14} {'base s':>9} {'new s':>9} {'speedup':>8}"]
+    for stage, metrics in new["stages"].items():
+        old = base.get("stages", {}).get(stage)
+        if not old:
+            lines.append(f"{stage:<14} {'-':>9} {metrics['wall_s']:>9.3f} {'-':>8}")
+            continue
+        speedup = old["wall_s"] / metrics["wall_s"] if metrics["wall_s"] else float("inf")
+        lines.append(f"{stage:<14} {old['wall_s']:>9.3f} {metrics['wall_s']:>9.3f} {speedup:>7.2f}x")
+    return lines
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m publicatiedatumcontrole.benchmark",
+        description="Benchmarks voor publicatiedatumcontrole"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_startup = sub.add_parser("startup", help="Meet de opstarttijd van de CLI")
+    p_startup.add_argument("--repeat", type=int, default=5, help="Aantal herhalingen per meting (default 5)")
+
+    p_generate = sub.add_parser("generate", help="Schrijf een synthetische batch")
+    p_generate.add_argument("output", help="Map voor de batch")
+    p_generate.add_argument("--issues", type=int, default=200, help="Aantal nummers (default 200)")
+    p_generate.add_argument("--titles", nargs="+", default=["Het Nieuws", "De Courant"],
+                            help="Krantentitels, nummers wisselen tussen deze titels")
+    p_generate.add_argument("--body-words", type=int, default=2000, help="Woorden lopende tekst per pagina")
+    p_generate.add_argument("--noise", type=float, default=0.1,
+                            help="Kans op een OCR-fout per datumwoord (default 0.1)")
+    p_generate.add_argument("--error-rate", type=float, default=0.1,
+                            help="Aandeel nummers met een afwijkende METS-datum (default 0.1)")
+    p_generate.add_argument("--jp2", action="store_true", help="Schrijf ook (kleine) JP2 access-afbeeldingen")
+    p_generate.add_argument("--seed", type=int, default=0)
+
+    p_run = sub.add_parser("run", help="Meet de doorlooptijd per stap op een (synthetische) batch")
+    p_run.add_argument("batch", nargs="?", help="Bestaande batch; zonder batch wordt een synthetische gemaakt")
+    p_run.add_argument("--issues", type=int, default=200, help="Aantal nummers van de synthetische batch")
+    p_run.add_argument("--jp2", action="store_true", help="Synthetische batch met JP2's (meet ook snippets)")
+    p_run.add_argument("--seed", type=int, default=0)
+    p_run.add_argument("--kde-backend", choices=["auto", "exact", "grid"], default="auto")
+    p_run.add_argument("--trace-memory", action="store_true",
+                       help="Meet ook de Python-geheugenpiek per stap (tracemalloc; trager)")
+    p_run.add_argument("-o", "--output", help="Schrijf het resultaat als JSON naar dit bestand")
+
+    p_parsers = sub.add_parser("parsers", help="Vergelijk de ALTO-parsers: zelfde resultaat en strings per seconde")
+    p_parsers.add_argument("batch", nargs="?", help="Bestaande batch; zonder batch wordt een synthetische gemaakt")
+    p_parsers.add_argument("--issues", type=int, default=200, help="Aantal nummers van de synthetische batch")
+    p_parsers.add_argument("--max-files", type=int, default=500, help="Maximaal aantal ALTO-bestanden (default 500)")
+
+    p_compare = sub.add_parser("compare", help="Vergelijk twee JSON-resultaten van 'run'")
+    p_compare.add_argument("base")
+    p_compare.add_argument("new")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "startup":
+        heavy = loaded_heavy_modules("publicatiedatumcontrole.cli")
+        print(f"Zware modules na 'import publicatiedatumcontrole.cli': {', '.join(heavy) or 'geen'}")
+        for case, seconds in startup_benchmark(args.repeat).items():
+            print(f"{case:<20} {seconds * 1000:8.0f} ms")
+
+    elif args.command == "generate":
+        from .synthetic import generate_batch
+
+        counts = generate_batch(args.output, issues=args.issues, titles=args.titles, body_words=args.body_words,
+                                noise=args.noise, error_rate=args.error_rate, jp2=args.jp2, seed=args.seed)
+        print(json.dumps(counts))
+
+    elif args.command == "run":
+        report = run_benchmark(args.batch, issues=args.issues, seed=args.seed, jp2=args.jp2,
+                               kde_backend=args.kde_backend, trace_memory=args.trace_memory)
+        text = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+        print(text)
+
+    elif args.command == "parsers":
+        if args.batch:
+            results = parser_benchmark(args.batch, max_files=args.max_files)
+        else:
+            from .synthetic import generate_batch
+
+            with tempfile.TemporaryDirectory() as tmp:
+                generate_batch(os.path.join(tmp, "synthetic_batch"), issues=args.issues)
+                results = parser_benchmark(os.path.join(tmp, "synthetic_batch"), max_files=args.max_files)
+        print(f"{'parser':<10} {'pagina':<7} {'strings/s':>10} {'bestanden/s':>12} {'afwijkend':>10}")
+        for name, modes in results.items():
+            for mode, result in modes.items():
+                print(f"{name:<10} {mode:<7} {result['strings_per_s']:>10} {result['files_per_s']:>12} "
+                      f"{len(result['mismatches']):>10}")
+        mismatches = sorted({f for modes in results.values() for r in modes.values() for f in r["mismatches"]})
+        if mismatches:
+            print(f"Afwijkende resultaten in {len(mismatches)} bestanden, bv. {mismatches[0]}")
+            sys.exit(1)
+
+    elif args.command == "compare":
+        with open(args.base, encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.new, encoding="utf-8") as f:
+            new = json.load(f)
+        print("\n".join(compare_reports(base, new)))
+
+
+if __name__ == "__main__":
+    main()
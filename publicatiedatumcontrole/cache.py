@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from importlib import metadata
+from typing import Dict, List
+
+from .archive import open_file, file_identity
+
+try:
+    TOOL_VERSION = metadata.version("publicatiedatumcontrole")
+except metadata.PackageNotFoundError:
+    TOOL_VERSION = "dev"
+
+# Ophogen als het formaat van de opgeslagen resultaten of de extractielogica
+# verandert; een andere waarde maakt de hele cache ongeldig.
+CACHE_SCHEMA = 1
+
+CACHE_FILENAME = "extract_cache.sqlite"
+
+
+def cache_fingerprint(months: dict, matcher) -> str:
+    """Fingerprint of everything that changes extraction results globally."""
+    config = {
+        "tool_version": TOOL_VERSION,
+        "schema": CACHE_SCHEMA,
+        "months": months,
+        "cutoff": matcher.cutoff,
+        "ignore": sorted(matcher.ignore),
+    }
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def alto_settings(header_fraction: float | None, region: dict | None, expected: str | None = None) -> str:
+    """Per-file parse settings that change the candidates of an ALTO file."""
+    settings = {"header_fraction": header_fraction, "region": region}
+    if expected:
+        # METS-gestuurd: alleen de verwachte datum als die direct gevonden wordt
+        settings["expected"] = expected
+    return json.dumps(settings, sort_keys=True)
+
+
+def file_digest(path: str) -> str:
+    """SHA-1 of the file content."""
+    h = hashlib.sha1()
+    with open_file(path) as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ExtractionCache:
+    """
+    On-disk cache of per-file extraction results (SQLite).
+
+    Entries are keyed by kind ('alto' / 'mets') and absolute path, and are only
+    valid while the file size, mtime (and optionally the content hash) and the
+    per-file parse settings are unchanged. A different tool version or matcher
+    configuration clears the whole cache. The least recently used entries are
+    evicted above ``max_entries``.
+    """
+
+    def __init__(self, db_path: str, fingerprint: str, use_hash: bool = False,
+                 max_entries: int = 500_000, logger: logging.Logger | None = None):
+        self.db_path = db_path
+        self.use_hash = use_hash
+        self.max_entries = max_entries
+        self.logger = logger
+        self.hits = 0
+        self.misses = 0
+        self._used: List[tuple] = []
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        # meerdere batch-workers kunnen tegelijk schrijven: wacht op locks
+        self.conn = sqlite3.connect(db_path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " kind TEXT, path TEXT, size INTEGER, mtime_ns INTEGER, digest TEXT,"
+                " settings TEXT, result TEXT, last_used REAL,"
+                " PRIMARY KEY (kind, path))"
+            )
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+            if row is None or row[0] != fingerprint:
+                if row is not None and logger:
+                    logger.info("Extractiecache ongeldig (andere versie of matcher-configuratie), wordt geleegd")
+                self.conn.execute("DELETE FROM entries")
+                self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('fingerprint', ?)", (fingerprint,))
+
+    def _identity(self, path: str) -> tuple:
+        return (*file_identity(path), file_digest(path) if self.use_hash else "")
+
+    def get_many(self, kind: str, paths: List[str], settings: Dict[str, str] | None = None) -> dict:
+        """Return {path: result} for all paths with a valid cache entry."""
+        settings = settings or {}
+        found = {}
+        for path in paths:
+            abs_path = os.path.abspath(path)
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, digest, settings, result FROM entries WHERE kind = ? AND path = ?",
+                (kind, abs_path)
+            ).fetchone()
+            if row is not None:
+                try:
+                    identity = self._identity(path)
+                except OSError:
+                    identity = None
+                if identity == tuple(row[:3]) and row[3] == settings.get(path, ""):
+                    found[path] = json.loads(row[4])
+                    self._used.append((time.time(), kind, abs_path))
+                    continue
+            self.misses += 1
+        self.hits += len(found)
+        return found
+
+    def put_many(self, kind: str, results: dict, settings: Dict[str, str] | None = None):
+        """Store {path: result} (results must be JSON serializable)."""
+        settings = settings or {}
+        rows = []
+        now = time.time()
+        for path, result in results.items():
+            try:
+                size, mtime_ns, digest = self._identity(path)
+            except OSError:
+                continue
+            rows.append((kind, os.path.abspath(path), size, mtime_ns, digest,
+                         settings.get(path, ""), json.dumps(result), now))
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def close(self):
+        """Record usage of hits, evict the oldest entries above max_entries and close."""
+        try:
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE entries SET last_used = ? WHERE kind = ? AND path = ?", self._used)
+                count = self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+                if count > self.max_entries:
+                    self.conn.execute(
+                        "DELETE FROM entries WHERE rowid IN "
+                        "(SELECT rowid FROM entries ORDER BY last_used ASC LIMIT ?)",
+                        (count - self.max_entries,)
+                    )
+        finally:
+            self.conn.close()
+
+    def log_stats(self, logger: logging.Logger | None = None):
+        logger = logger or self.logger
+        if logger and self.hits + self.misses:
+            logger.info(f"Extractiecache: {self.hits} hits, {self.misses} bestanden opnieuw verwerkt")
+
+
+def open_cache(args, months: dict, logger: logging.Logger | None = None) -> ExtractionCache | None:
+    """Open the extraction cache in the output directory, or None when disabled."""
+    if not getattr(args, "cache", False):
+        return None
+
+    from .matcher import get_matcher
+    db_path = os.path.join(args.output, CACHE_FILENAME)
+    try:
+        return ExtractionCache(db_path, cache_fingerprint(months, get_matcher(months)),
+                               use_hash=getattr(args, "cache_hash", False),
+                               max_entries=getattr(args, "cache_max_entries", 500_000) or 500_000,
+                               logger=logger)
+    except sqlite3.Error as e:
+        if logger:
+            logger.error(f"Kon extractiecache {db_path} niet openen: {e}")
+        return None
@@ -8,8 +8,10 @@ from concurrent.futures import ProcessPoolExecutor, as_completed
 
 from tqdm import tqdm
 
-from .utils import setup_logging
-from .runner import process_batch
+from .utils import setup_logging, start_log_listener, worker_log_config, MONTHS
+from .journal import RunJournal, run_journal_dir
+from .metrics import write_run_profile
+from .archive import is_archive, archive_batch_path, close_archives
 
 
 def load_config(config_path: str = "config.yaml") -> dict:
@@ -20,15 +22,18 @@ def load_config(config_path: str = "config.yaml") -> dict:
     return {}
 
 
-def determine_workers(num_batches: int) -> int:
+def determine_workers(num_batches: int, all_cores: bool = False) -> int:
     """
     Kies automatisch het aantal workers op basis van batch count en CPU cores.
     - Kleine batches: gebruik alle cores (min 2).
     - Middelgrote: gebruik min(batches, cores-1).
-    - Grote hoeveelheid: cap op 8.
+    - Grote hoeveelheid: cap op 8, tenzij all_cores=True (dan alle cores).
     """
     cores = os.cpu_count() or 2
 
+    if all_cores:
+        return max(2, cores)
+
     if num_batches <= 2:
         return max(2, cores)
 
@@ -38,12 +43,58 @@ def determine_workers(num_batches: int) -> int:
     return min(8, cores)
 
 
+def write_summary(results: list, logger, stamp: str | None = None) -> int:
+    """
+    Log the run summary and write the summary CSV and run profile to ./reports.
+
+    Returns the total number of potential errors.
+    """
+    total_alto = sum(r[1] for r in results)
+    total_mets = sum(r[2] for r in results)
+    total_candidates = sum(r[3] for r in results)
+    total_errors = sum(r[4] for r in results)
+
+    logger.info("=== Run summary ===")
+    logger.info(f"Processed {len(results)} batches")
+    logger.info(f"Total ALTO files: {total_alto}, METS files: {total_mets}")
+    logger.info(f"Total candidates (above threshold): {total_candidates}")
+    logger.info(f"Total potential errors: {total_errors}")
+
+    # ------------------ CSV SAMENVATTING ------------------
+    reports_dir = os.path.abspath("reports")
+    os.makedirs(reports_dir, exist_ok=True)
+    stamp = stamp or time.strftime('%Y%m%d_%H%M')
+    csv_name = os.path.join(reports_dir, f"run_summary_{stamp}.csv")
+
+    with open(csv_name, "w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.writer(csvfile)
+        # schatting van --sample als extra kolommen (leeg voor batches zonder steekproef)
+        sampled = any(len(r) > 6 for r in results)
+        writer.writerow(["batch_id", "alto_files", "mets_files", "candidates", "errors"] +
+                        (["sampled_issues", "est_error_rate", "ci_low", "ci_high", "escalated"] if sampled else []))
+        for r in results:
+            row = list(r[:5])  # (batch_id, alto, mets, candidates, errors)
+            if len(r) > 6:
+                e = r[6]
+                row += [e["sampled"], round(e["error_rate"], 4), round(e["ci_low"], 4), round(e["ci_high"], 4),
+                        e["escalated"]]
+            writer.writerow(row)
+        writer.writerow([])
+        writer.writerow(["TOTAL", total_alto, total_mets, total_candidates, total_errors])
+
+    logger.info(f"Samenvattings-CSV opgeslagen: {csv_name}")
+
+    profile_json, _ = write_run_profile(results, reports_dir, stamp)
+    logger.info(f"Run-profiel per stap opgeslagen: {profile_json} (en .csv)")
+    return total_errors
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Controleer publicatiedata in krantenbatches (ALTO/METS/MODS)."
     )
-    parser.add_argument("batches", nargs="+",
-                        help="Een of meerdere batchmappen")
+    parser.add_argument("batches", nargs="*",
+                        help="Een of meerdere batchmappen of .zip/.tar-archieven met een batch")
     parser.add_argument("--log", default=None, help="Logbestand (append)")
     parser.add_argument("--verbose", action="store_true",
                         help="Toon extra debug-informatie")
@@ -55,6 +106,67 @@ def main():
                         help="Genereer ook XML-rapporten naast HTML")
     parser.add_argument("--date-tolerance", type=int, default=None,
                         help="Maximaal toegestaan verschil (dag+maand+jaar) tussen ALTO en METS (default 2)")
+    parser.add_argument("--file-workers", type=int, default=None,
+                        help="Aantal processen per batch voor het verwerken van ALTO-bestanden (default 1)")
+    parser.add_argument("--file-chunksize", type=int, default=None,
+                        help="Aantal ALTO-bestanden per chunk bij --file-workers > 1 (default 200)")
+    parser.add_argument("--header-fraction", type=float, default=None,
+                        help="Lees alleen de kop van de pagina (fractie van Page/@HEIGHT, bv. 0.25); "
+                             "valt terug op de hele pagina als daar geen datum wordt gevonden")
+    parser.add_argument("--profiles", default=None,
+                        help="Map met geleerde layoutprofielen per titel/editie; volgende runs lezen "
+                             "alleen de geleerde datumregio")
+    parser.add_argument("--profile-margin", type=int, default=None,
+                        help="Marge in pixels rond de geleerde datumregio (default 200)")
+    parser.add_argument("--profile-min-hits", type=float, default=None,
+                        help="Minimale fractie nummers met de datum in de geleerde regio; daaronder wordt de "
+                             "titel opnieuw op de hele pagina doorzocht (default 0.5)")
+    parser.add_argument("--cache", action="store_true",
+                        help="Bewaar extractieresultaten per bestand in de outputmap; "
+                             "bij een nieuwe run worden alleen gewijzigde bestanden opnieuw verwerkt")
+    parser.add_argument("--cache-hash", action="store_true",
+                        help="Controleer cache-entries ook op een hash van de bestandsinhoud")
+    parser.add_argument("--resume", action="store_true",
+                        help="Hervat een onderbroken run: sla batches en ALTO-bestanden over "
+                             "die al in de run-journal staan. Zonder journal begint de run er een, "
+                             "zodat hij na een crash hervat kan worden")
+    parser.add_argument("--scheduler", choices=["batch", "global"], default=None,
+                        help="batch: één taak per batch; global: alle bestanden van alle batches "
+                             "in één gedeelde takenqueue (default batch)")
+    parser.add_argument("--all-cores", action="store_true",
+                        help="Gebruik alle CPU cores i.p.v. maximaal 8 workers")
+    parser.add_argument("--kde-backend", choices=["auto", "exact", "grid"], default=None,
+                        help="KDE-berekening: exact (scipy), grid (FFT op een raster) of auto "
+                             "(grid boven kde_max_exact kandidaten; default auto)")
+    parser.add_argument("--kde-sample", type=int,
+                        help="Fit de exacte KDE op een steekproef van maximaal dit aantal kandidaten")
+    parser.add_argument("--snippet-workers", type=int,
+                        help="Aantal threads per batch voor het maken van snippets uit de JP2's (default 4)")
+    parser.add_argument("--prefetch", type=int,
+                        help="Lees dit aantal ALTO/METS-bestanden vooruit in het geheugen "
+                             "(voor trage netwerkopslag; default 0 = uit)")
+    parser.add_argument("--prefetch-memory", type=int,
+                        help="Maximaal geheugen in MB voor vooruitgelezen bestanden per proces (default 256)")
+    parser.add_argument("--watch", metavar="INBOX",
+                        help="Blijf draaien en verwerk nieuwe batches (mappen of archieven) in deze map "
+                             "zodra ze compleet zijn; stop met SIGTERM of Ctrl+C")
+    parser.add_argument("--watch-interval", type=float,
+                        help="Aantal seconden tussen twee controles van de inbox (default 10)")
+    parser.add_argument("--watch-stable", type=float,
+                        help="Een batch is compleet als hij zoveel seconden niet veranderd is (default 60)")
+    parser.add_argument("--alto-parser", choices=["lxml", "expat"], default=None,
+                        help="XML-parser voor ALTO-bestanden: lxml of expat (sneller, zelfde resultaat; default lxml)")
+    parser.add_argument("--mets-guided", action="store_true",
+                        help="Zoek eerst de verwachte METS-datum in de kop van de pagina; alleen nummers "
+                             "zonder directe treffer worden volledig doorzocht")
+    parser.add_argument("--sample", type=int,
+                        help="Snelle triage: controleer per titel/editie alleen dit aantal willekeurige nummers "
+                             "en schat het foutpercentage van de batch (default 0 = hele batch)")
+    parser.add_argument("--sample-escalate", type=float,
+                        help="Controleer toch de hele batch als het geschatte foutpercentage boven deze "
+                             "fractie ligt (bv. 0.02)")
+    parser.add_argument("--cprofile", action="store_true",
+                        help="Profileer elke batch met cProfile (<output>/cprofile/<batch>.prof)")
 
     args = parser.parse_args()
 
@@ -66,6 +178,35 @@ def main():
     output_dir = args.output or config.get("output", "html-reports")
     xml_output = args.xml or config.get("xml", False)
     date_tolerance = args.date_tolerance or config.get("date_tolerance", 2)
+    file_workers = args.file_workers or config.get("file_workers", 1)
+    file_chunksize = args.file_chunksize or config.get("file_chunksize", 200)
+    header_fraction = args.header_fraction or config.get("header_fraction", None)
+    profiles = args.profiles or config.get("profiles", None)
+    profile_margin = args.profile_margin or config.get("profile_margin", 200)
+    profile_min_hits = args.profile_min_hits or config.get("profile_min_hits", 0.5)
+    cache = args.cache or config.get("cache", False)
+    cache_hash = args.cache_hash or config.get("cache_hash", False)
+    cache_max_entries = config.get("cache_max_entries", 500000)
+    journal_enabled = config.get("journal", False)
+    resume = args.resume
+    scheduler = args.scheduler or config.get("scheduler", "batch")
+    all_cores = args.all_cores or config.get("all_cores", False)
+    kde_backend = args.kde_backend or config.get("kde_backend", "auto")
+    kde_max_exact = config.get("kde_max_exact", 5000)
+    kde_grid_size = config.get("kde_grid_size", 256)
+    kde_sample = args.kde_sample or config.get("kde_sample", None)
+    snippet_workers = args.snippet_workers or config.get("snippet_workers", 4)
+    prefetch = args.prefetch or config.get("prefetch", 0)
+    prefetch_memory = args.prefetch_memory or config.get("prefetch_memory", 256)
+    alto_parser = args.alto_parser or config.get("alto_parser", "lxml")
+    mets_guided = args.mets_guided or config.get("mets_guided", False)
+    sample = args.sample or config.get("sample", 0)
+    sample_seed = config.get("sample_seed", 0)
+    sample_escalate = args.sample_escalate if args.sample_escalate is not None else config.get("sample_escalate", None)
+    cprofile = args.cprofile or config.get("cprofile", False)
+    watch_dir = args.watch or config.get("watch", None)
+    watch_interval = args.watch_interval or config.get("watch_interval", 10)
+    watch_stable = args.watch_stable or config.get("watch_stable", 60)
 
     # schrijf terug naar args zodat process_batch deze kan gebruiken
     args.log = logfile
@@ -74,60 +215,136 @@ def main():
     args.output = output_dir
     args.xml = xml_output
     args.date_tolerance = date_tolerance
+    args.file_workers = file_workers
+    args.file_chunksize = file_chunksize
+    args.header_fraction = header_fraction
+    args.profiles = profiles
+    args.profile_margin = profile_margin
+    args.profile_min_hits = profile_min_hits
+    args.cache = cache
+    args.cache_hash = cache_hash
+    args.cache_max_entries = cache_max_entries
+    args.scheduler = scheduler
+    args.all_cores = all_cores
+    args.kde_backend = kde_backend
+    args.kde_max_exact = kde_max_exact
+    args.kde_grid_size = kde_grid_size
+    args.kde_sample = kde_sample
+    args.snippet_workers = snippet_workers
+    args.prefetch = prefetch
+    args.prefetch_memory = prefetch_memory
+    args.alto_parser = alto_parser
+    args.mets_guided = mets_guided
+    args.sample = sample
+    args.sample_seed = sample_seed
+    args.sample_escalate = sample_escalate
+    args.cprofile = cprofile
+    args.watch = watch_dir
+
+    if not args.batches and not watch_dir:
+        parser.error("geef een of meer batches op, of een inbox met --watch")
+    if watch_dir and not os.path.isdir(watch_dir):
+        parser.error(f"inbox {watch_dir} bestaat niet")
+    from .extract import ALTO_BACKENDS  # na het parsen: --help laadt lxml niet
+    if alto_parser not in ALTO_BACKENDS:
+        parser.error(f"onbekende alto_parser '{alto_parser}' in config.yaml (kies uit {', '.join(ALTO_BACKENDS)})")
+    if sample and sample < 2:
+        parser.error("--sample moet minstens 2 nummers per titel/editie zijn")
+    if header_fraction is not None and not 0 < header_fraction <= 1:
+        parser.error("--header-fraction moet tussen 0 en 1 liggen")
 
+    start_log_listener(logfile, verbose)
     logger = setup_logging(logfile, verbose)
+
+    # pas na het parsen van de argumenten: --help en foute opties laden pandas/scipy niet
+    from .runner import process_batch
+    from .scheduler import run_scheduler
     logger.info("Start publicatiedatumcontrole (parallel mode)")
     logger.info(f"Centrale log: {logfile}")
     logger.info("Elke batch schrijft daarnaast naar eigen logfile in dezelfde map.")
 
-    months = {
-        "januari": "01", "februari": "02", "maart": "03", "april": "04",
-        "mei": "05", "juni": "06", "juli": "07", "augustus": "08",
-        "september": "09", "oktober": "10", "november": "11", "december": "12"
-    }
-
-    num_batches = len(args.batches)
-    max_workers = determine_workers(num_batches)
-    logger.info(f"Gebruik {max_workers} parallelle workers voor {num_batches} batches")
-
-    results = []
-    with ProcessPoolExecutor(max_workers=max_workers) as executor:
-        futures = {
-            executor.submit(process_batch, path, args, months, logfile, verbose): path
-            for path in args.batches
-        }
-        for fut in tqdm(as_completed(futures), total=len(futures), desc="Processing batches"):
+    months = dict(MONTHS)
+
+    # ------------------ ARCHIEVEN ------------------
+    # een archief wordt niet uitgepakt: de batchmap in het archief wordt het batchpad
+    for i, path in enumerate(args.batches):
+        if is_archive(path):
             try:
-                results.append(fut.result())
-            except Exception as e:
-                logger.error(f"Batch {futures[fut]} failed: {e}")
+                args.batches[i] = archive_batch_path(path)
+                logger.info(f"Archief {path}: batch {os.path.basename(args.batches[i])} wordt direct gelezen")
+            except OSError as e:
+                logger.error(f"Kan archief {path} niet lezen: {e}")
+    # de workers openen de archieven zelf
+    close_archives()
 
-    total_alto = sum(r[1] for r in results)
-    total_mets = sum(r[2] for r in results)
-    total_candidates = sum(r[3] for r in results)
-    total_errors = sum(r[4] for r in results)
+    # ------------------ JOURNAL / RESUME ------------------
+    # na het oplossen van de archieven: de journal hoort bij deze batches. Alleen met --resume,
+    # watch-modus of journal: true; een gewone run schrijft (en fsynct) geen journal
+    journal_on = journal_enabled or resume or bool(watch_dir)
+    journal_dir = run_journal_dir(output_dir, args.batches, watch_dir) if journal_on else None
+    args.journal = journal_dir
+    try:
+        journal = RunJournal(journal_dir, args, resume=resume, logger=logger) if journal_dir else None
+    except ValueError as e:
+        logger.error(f"Kan niet hervatten: {e}")
+        sys.exit(2)
+    finished = journal.completed_batches() if journal and resume else {}
+    batches = [path for path in args.batches if os.path.abspath(path) not in finished]
+    if finished:
+        logger.info(f"Hervatten: {len(args.batches) - len(batches)} batches al verwerkt in onderbroken run")
 
-    logger.info("=== Run summary ===")
-    logger.info(f"Processed {len(results)} batches")
-    logger.info(f"Total ALTO files: {total_alto}, METS files: {total_mets}")
-    logger.info(f"Total candidates (above threshold): {total_candidates}")
-    logger.info(f"Total potential errors: {total_errors}")
-    logger.info("Alle batches verwerkt ✅")
+    if watch_dir:
+        from .watch import watch
+        if scheduler == "global":
+            logger.warning("--watch verwerkt elke batch als één taak; --scheduler global wordt genegeerd")
 
-    # ------------------ CSV SAMENVATTING ------------------
-    reports_dir = os.path.abspath("reports")
-    os.makedirs(reports_dir, exist_ok=True)
-    csv_name = os.path.join(reports_dir, f"run_summary_{time.strftime('%Y%m%d_%H%M')}.csv")
+        def batch_summary(result: tuple):
+            # per batch een eigen samenvatting, met seconden en batch-ID: er kunnen er meer per minuut klaar zijn
+            write_summary([result], logger, stamp=f"{time.strftime('%Y%m%d_%H%M%S')}_{result[0]}")
 
-    with open(csv_name, "w", newline="", encoding="utf-8") as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(["batch_id", "alto_files", "mets_files", "candidates", "errors"])
-        for r in results:
-            writer.writerow(r)  # (batch_id, alto, mets, candidates, errors)
-        writer.writerow([])
-        writer.writerow(["TOTAL", total_alto, total_mets, total_candidates, total_errors])
+        watch(watch_dir, args, months, logfile, verbose, determine_workers(os.cpu_count() or 2, all_cores),
+              logger, journal=journal, delivered=journal.completed_deliveries() if journal and resume else {},
+              interval=watch_interval, stable=watch_stable, on_result=batch_summary)
+        sys.exit(0)
 
-    logger.info(f"Samenvattings-CSV opgeslagen: {csv_name}")
+    if sample and scheduler == "global":
+        logger.warning("--sample kiest de steekproef per batch; --scheduler batch wordt gebruikt")
+        scheduler = args.scheduler = "batch"
+
+    num_batches = len(batches)
+    max_workers = determine_workers(num_batches, all_cores=all_cores)
+    logger.info(f"Gebruik {max_workers} parallelle workers voor {num_batches} batches "
+                f"(scheduler: {scheduler})")
+    if cprofile and scheduler == "global":
+        logger.warning("--cprofile profileert per batch en werkt alleen met --scheduler batch")
+
+    results_by_path = {path: finished[os.path.abspath(path)] for path in args.batches
+                       if os.path.abspath(path) in finished}
+    if batches and scheduler == "global":
+        results_by_path.update(run_scheduler(batches, args, months, logfile, verbose, max_workers,
+                                             logger=logger, journal=journal))
+    elif batches:
+        with ProcessPoolExecutor(max_workers=max_workers, **worker_log_config()) as executor:
+            futures = {
+                executor.submit(process_batch, path, args, months, logfile, verbose): path
+                for path in batches
+            }
+            for fut in tqdm(as_completed(futures), total=len(futures), desc="Processing batches"):
+                try:
+                    results_by_path[futures[fut]] = fut.result()
+                    if journal:
+                        journal.record_batch(futures[fut], results_by_path[futures[fut]])
+                except Exception as e:
+                    logger.error(f"Batch {futures[fut]} failed: {e}")
+
+    # volgorde van de commandline, zodat een hervatte run dezelfde CSV geeft
+    results = [results_by_path[path] for path in args.batches if path in results_by_path]
+
+    total_errors = write_summary(results, logger)
+    logger.info("Alle batches verwerkt ✅")
+    if journal and len(results) == len(args.batches):
+        # niets meer te hervatten
+        journal.remove()
 
     if total_errors > 0:
         sys.exit(1)
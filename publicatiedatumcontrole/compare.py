@@ -1,52 +1,81 @@
 import logging
+import numpy as np
 import pandas as pd
-from typing import List
 
+# jaar-maand-dag, spaties rond de streepjes toegestaan (zoals int() ze accepteerde);
+# verdere onderdelen na de dag worden genegeerd. Voorloopnullen vallen buiten de
+# groep en een onderdeel heeft hoogstens 9 cijfers, zodat het in int64 past: een
+# absurd lang getal maakt alleen die rij ongeldig.
+DATE_PATTERN = r"^0*(\d{1,9})\s*-\s*0*(\d{1,9})\s*-\s*0*(\d{1,9})\s*(?:-|$)"
+INVALID_DISTANCE = 9999  # sentinel for invalid
 
-def compare_dates(df: pd.DataFrame, logger: logging.Logger | None = None) -> pd.DataFrame:
+
+def parse_dates(values: pd.Series) -> np.ndarray:
+    """
+    Parse yyyy-mm-dd strings into an integer array of shape (n, 3).
+
+    Rows that cannot be parsed get -1 in every column. A component that
+    consists only of zeros ("00") counts as unparseable, as before.
+    Whitespace around the value and its components is ignored, so
+    " 1921-03-05" and "1921 - 03 - 05" parse.
+    """
+    parts = values.astype(str).str.strip().str.extract(DATE_PATTERN)
+    valid = parts.notna().all(axis=1).to_numpy()
+
+    parsed = np.full((len(values), 3), -1, dtype=np.int64)
+    if valid.any():
+        parsed[valid] = parts[valid].astype(np.int64).to_numpy()
+    parsed[(parsed == 0).any(axis=1)] = -1
+    return parsed
+
+
+def compare_dates(df: pd.DataFrame, logger: logging.Logger | None = None,
+                  day_difference: bool = False) -> pd.DataFrame:
     """
     Compare 'alto_date' with 'mets_date' and compute a distance score.
 
+    The distance is the sum of the absolute year, month and day differences,
+    computed for the whole frame at once. Rows where either date cannot be
+    parsed get distance 9999.
+
     Args:
         df (pd.DataFrame): Must contain 'alto_date' and 'mets_date' as yyyy-mm-dd.
         logger (logging.Logger, optional): Logger for reporting.
+        day_difference (bool): Also add 'day_difference', the number of calendar
+            days between both dates (9999 if either is not a valid date).
 
     Returns:
         pd.DataFrame: With added 'distance_score' column.
     """
     try:
-        # Split dates into components
-        a_date: List[List[str]] = df["alto_date"].astype(str).str.split("-").tolist()
-        m_date: List[List[str]] = df["mets_date"].astype(str).str.split("-").tolist()
-
-        def strip_leading_zeros(dates: List[List[str]]) -> List[List[str]]:
-            cleaned = []
-            for parts in dates:
-                entry = [p.lstrip("0") if isinstance(p, str)
-                         else str(p) for p in parts]
-                cleaned.append(entry)
-            return cleaned
-
-        a_date = strip_leading_zeros(a_date)
-        m_date = strip_leading_zeros(m_date)
-
-        dis_score: List[int] = []
-        for ad, md in zip(a_date, m_date):
-            try:
-                year_diff = abs(int(ad[0]) - int(md[0]))
-                month_diff = abs(int(ad[1]) - int(md[1]))
-                day_diff = abs(int(ad[2]) - int(md[2]))
-                dis_score.append(year_diff + month_diff + day_diff)
-            except (ValueError, IndexError) as e:
-                if logger:
-                    logger.warning(f"Invalid date comparison (alto={ad}, mets={md}): {e}")
-                dis_score.append(9999)  # sentinel for invalid
-
-        df["distance_score"] = dis_score
+        a_date = parse_dates(df["alto_date"])
+        m_date = parse_dates(df["mets_date"])
+        invalid = (a_date[:, 0] < 0) | (m_date[:, 0] < 0)
+
+        distance = np.abs(a_date - m_date).sum(axis=1)
+        distance[invalid] = INVALID_DISTANCE
+        df["distance_score"] = distance
+
+        if invalid.any() and logger:
+            logger.warning(f"Invalid date comparison for {int(invalid.sum())} rows")
+
+        if day_difference:
+            a_day = _to_datetime(a_date)
+            m_day = _to_datetime(m_date)
+            days = (a_day - m_day).abs().dt.days
+            df["day_difference"] = days.fillna(INVALID_DISTANCE).astype(np.int64).to_numpy()
 
     except Exception as e:
         if logger:
             logger.error(f"Error comparing dates: {e}")
-        df["distance_score"] = 9999
+        df["distance_score"] = INVALID_DISTANCE
 
     return df
+
+
+def _to_datetime(parsed: np.ndarray) -> pd.Series:
+    """Datetimes for parsed (year, month, day) rows; NaT where invalid."""
+    return pd.to_datetime(
+        pd.DataFrame({"year": parsed[:, 0], "month": parsed[:, 1], "day": parsed[:, 2]}),
+        errors="coerce",
+    )
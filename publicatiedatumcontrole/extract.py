@@ -1,78 +1,369 @@
+import io
 import os
+import re
+import sys
 import logging
-from typing import List, Dict, Any
+from array import array
+from typing import List, Dict, Any, NamedTuple
+from xml.parsers import expat
 from lxml import etree
 
+from .archive import open_file
+from .prefetch import prefetched
+from .metrics import StageMetrics
 
-def get_alto_data(alto_file: str, logger=None) -> list:
+
+def get_alto_data(alto_file: str, logger=None, header_fraction: float | None = None,
+                  region: Dict[str, float] | None = None) -> list:
     """Extract //String/@CONTENT attributes from an ALTO XML file."""
-    alto_file_content = []
-    skipped = 0
-    with open(alto_file, "rb") as alto:
-        context = etree.iterparse(alto, events=("end",))
-        for event, elem in context:
-            if etree.QName(elem.tag).localname == "String":
-                try:
-                    alto_file_content.append([
-                        elem.get("CONTENT"),
-                        (int(elem.get("VPOS")), int(elem.get("HPOS")))
-                    ])
-                except (TypeError, ValueError):
-                    skipped += 1
+    return get_alto_page(alto_file, logger=logger, header_fraction=header_fraction, region=region)[1]
+
+
+class AltoStrings(NamedTuple):
+    """
+    The String elements of an ALTO page as parallel arrays: interned CONTENT
+    tokens and typed (32-bit) VPOS/HPOS arrays, instead of a list and a tuple
+    per word.
+    """
+    page_height: int | None
+    contents: List[str | None]
+    vpos: array
+    hpos: array
+
+
+def get_alto_page(alto_file: str, logger=None, header_fraction: float | None = None,
+                  region: Dict[str, float] | None = None, data: bytes | None = None) -> tuple:
+    """
+    Extract Page/@HEIGHT and //String/@CONTENT attributes from an ALTO XML file.
+
+    Same as read_alto_strings, as a list per word.
+
+    Returns tuple:
+        (page_height or None, [[content, (vpos, hpos)], ...])
+    """
+    page = read_alto_strings(alto_file, logger=logger, header_fraction=header_fraction, region=region, data=data)
+    return page.page_height, [[c, (v, h)] for c, v, h in zip(page.contents, page.vpos, page.hpos)]
+
+
+def read_alto_strings(alto_file: str, logger=None, header_fraction: float | None = None,
+                      region: Dict[str, float] | None = None, data: bytes | None = None,
+                      backend: str | None = None) -> AltoStrings:
+    """
+    Extract Page/@HEIGHT and the CONTENT, VPOS and HPOS of every String from
+    an ALTO XML file.
+
+    With ``header_fraction`` only the TextBlocks of the header band of the
+    page are read (blocks that start at most ``header_fraction *
+    Page/@HEIGHT`` from the top). The first String below the band after a
+    block in the band is still kept, so the last header word keeps its
+    next-word neighbour.
+
+    With ``region`` (keys 'vmin', 'vmax', 'hmin', 'hmax') only TextLines that
+    overlap the region are kept, and TextBlocks that start below 'vmax' are
+    skipped. Lines are kept whole so date tokens keep their neighbours.
+
+    When the TextBlocks are stored top-down (see blocks_top_down), parsing
+    stops at the first block below the band or region; otherwise, e.g. on a
+    page stored column by column, the whole page is scanned.
+
+    With ``data`` (the file contents, e.g. from the prefetcher) the page is
+    parsed from memory instead of from ``alto_file``.
+
+    ``backend`` selects the parser (see ALTO_BACKENDS, default 'lxml'); all
+    backends give the same result for well-formed ALTO.
+    """
+    reader = _PageReader(header_fraction, region)
+    if reader.banded:
+        if data is None:
+            with open_file(alto_file) as alto:
+                data = alto.read()
+        reader.ordered = blocks_top_down(data)
+    parse = ALTO_BACKENDS[backend or "lxml"]
+    parse(alto_file, data, reader)
+    if reader.skipped and logger:
+        logger.debug(f"Skipped {reader.skipped} invalid String elements in {alto_file}")
+    return AltoStrings(reader.page_height, reader.contents, reader.vpos, reader.hpos)
+
+
+# VPOS van elke TextBlock, direct uit de bytes (een paar honderd microseconden per pagina);
+# attributen mogen dubbele of enkele aanhalingstekens hebben
+BLOCK_VPOS = re.compile(rb'TextBlock\s[^>]*?\sVPOS\s*=\s*(["\'])(.*?)\1')
+
+
+def blocks_top_down(data: bytes) -> bool:
+    """
+    Whether the TextBlocks of an ALTO document are stored top-down (VPOS
+    never decreases), so that no block of the header band or region can
+    follow a block below it. False for pages stored column by column and
+    for unreadable VPOS values.
+    """
+    previous = float("-inf")
+    for match in BLOCK_VPOS.finditer(data):
+        try:
+            vpos = float(match.group(2))
+        except ValueError:
+            return False
+        if vpos < previous:
+            return False
+        previous = vpos
+    return True
+
+
+class _StopParsing(Exception):
+    """Raised from a SAX handler to stop parsing early."""
+
+
+class _PageReader:
+    """
+    Collects the Strings of an ALTO page for read_alto_strings, independent
+    of the parser: a backend calls the methods for the Page, TextBlock,
+    TextLine and String elements (in document order) with a function that
+    returns an attribute value. ``text_block`` and ``string`` return True
+    when parsing can stop, which only happens when ``ordered`` (blocks
+    stored top-down) is set; otherwise blocks outside the band or region are
+    skipped and parsing continues.
+    """
+
+    def __init__(self, header_fraction: float | None, region: Dict[str, float] | None):
+        self.header_fraction = header_fraction
+        self.region = region
+        # kopband/regio: TextBlocks en TextLines bepalen wat gelezen wordt en wanneer het stopt
+        self.banded = bool(header_fraction or region)
+        self.contents: List[str | None] = []
+        self.vpos = array("i")
+        self.hpos = array("i")
+        self.skipped = 0
+        self.page_height = None
+        self.band_limit = None
+        self.past_band = False
+        self.skip_block = False
+        self.neighbour = True
+        self.in_region = True
+        self.ordered = False
+
+    def page(self, get):
+        if self.banded:
+            try:
+                if get("HEIGHT"):
+                    self.page_height = int(float(get("HEIGHT")))
+                    if self.header_fraction:
+                        self.band_limit = self.page_height * self.header_fraction
+            except (TypeError, ValueError):
+                pass
+        elif self.page_height is None:
+            try:
+                self.page_height = int(float(get("HEIGHT")))
+            except (TypeError, ValueError):
+                pass
+
+    def text_block(self, get) -> bool:
+        if not self.banded:
+            return False
+        try:
+            block_vpos = float(get("VPOS"))
+        except (TypeError, ValueError):
+            return False
+        if self.region is not None and block_vpos > self.region["vmax"]:
+            self.skip_block = True
+            return self.ordered
+        self.skip_block = False
+        if self.band_limit is not None:
+            self.past_band = block_vpos > self.band_limit
+            self.neighbour = self.neighbour or not self.past_band
+            # onder de band alleen de eerste String na een blok in de band (buurwoord)
+            self.skip_block = self.past_band and not self.neighbour
+            return self.skip_block and self.ordered
+        return False
+
+    def text_line(self, get):
+        if self.region is None:
+            return
+        self.in_region = True
+        try:
+            region = self.region
+            vpos, hpos = float(get("VPOS")), float(get("HPOS"))
+            height, width = float(get("HEIGHT", 0)), float(get("WIDTH", 0))
+            self.in_region = (vpos <= region["vmax"] and vpos + height >= region["vmin"] and
+                              hpos <= region["hmax"] and hpos + width >= region["hmin"])
+        except (TypeError, ValueError):
+            pass
+
+    def string(self, get) -> bool:
+        if not self.in_region or self.skip_block:
+            return False
+        try:
+            vpos, hpos = int(get("VPOS")), int(get("HPOS"))
+            self.vpos.append(vpos)
+            self.hpos.append(hpos)
+        except (TypeError, ValueError, OverflowError):
+            # geen halve rij achterlaten als HPOS niet in de array past
+            del self.vpos[len(self.contents):]
+            self.skipped += 1
+            return False
+        # OCR-tokens herhalen zich veel: één str-object per uniek token
+        content = get("CONTENT")
+        self.contents.append(sys.intern(content) if content else content)
+        if self.past_band:
+            self.neighbour = False
+            self.skip_block = True
+            return self.ordered
+        return False
+
+
+# elementen waar de reader iets mee doet, in elke ALTO-namespace (v2, v3, v4) of zonder namespace
+ALTO_TAGS = ("{*}Page", "{*}TextBlock", "{*}TextLine", "{*}String")
+
+
+def _parse_lxml(alto_file: str, data: bytes | None, reader: _PageReader):
+    """lxml iterparse, filtered on the ALTO elements the reader needs (no events for SP, HYP, ...)."""
+    # start-events zijn alleen nodig om de kopband/regio vroeg af te kunnen breken
+    events = ("start", "end") if reader.banded else ("end",)
+    with (io.BytesIO(data) if data is not None else open_file(alto_file)) as alto:
+        for event, elem in etree.iterparse(alto, events=events, tag=ALTO_TAGS):
+            localname = elem.tag.rpartition("}")[2]
+            if event == "start":
+                if localname == "Page":
+                    reader.page(elem.get)
+                elif localname == "TextBlock":
+                    if reader.text_block(elem.get):
+                        break
+                elif localname == "TextLine":
+                    reader.text_line(elem.get)
+                continue
+
+            if localname == "String":
+                if reader.string(elem.get):
+                    break
+            elif localname == "Page" and not reader.banded:
+                reader.page(elem.get)
             elem.clear()
-    if skipped and logger:
-        logger.debug(f"Skipped {skipped} invalid String elements in {alto_file}")
-    return alto_file_content
 
 
-def extract_mets_data(mets_files: List[str], logger: logging.Logger | None = None) -> Dict[str, List[str]]:
+def _parse_expat(alto_file: str, data: bytes | None, reader: _PageReader):
+    """Expat (SAX-style) parser: only start tags, attributes as a dict, no element tree."""
+    parser = expat.ParserCreate(namespace_separator=" ")
+
+    def start(name, attrs):
+        localname = name.rpartition(" ")[2]
+        if localname == "String":
+            stop = reader.string(attrs.get)
+        elif localname == "TextLine":
+            reader.text_line(attrs.get)
+            return
+        elif localname == "TextBlock":
+            stop = reader.text_block(attrs.get)
+        elif localname == "Page":
+            reader.page(attrs.get)
+            return
+        else:
+            return
+        if stop:
+            raise _StopParsing
+
+    parser.StartElementHandler = start
+    try:
+        if data is not None:
+            parser.Parse(data, True)
+        else:
+            with open_file(alto_file) as alto:
+                parser.ParseFile(alto)
+    except _StopParsing:
+        pass
+    except expat.ExpatError as e:
+        # expat kent alleen UTF-8, UTF-16, ISO-8859-1 en ASCII; andere encodings via lxml
+        if e.code != expat.errors.codes[expat.errors.XML_ERROR_UNKNOWN_ENCODING]:
+            raise
+        _parse_lxml(alto_file, data, reader)
+
+
+# beschikbare ALTO-parsers (--alto-parser)
+ALTO_BACKENDS = {"lxml": _parse_lxml, "expat": _parse_expat}
+
+
+MODS_TAG = "{http://www.loc.gov/mods/v3}mods"
+
+
+def read_mets_record(mets_file: str, data: bytes | None = None) -> tuple:
     """
-    Extract publication date, title, and edition data from a list of METS files.
+    Read filename, publication date, title and edition from one METS file.
 
-    Args:
-        mets_files (list[str]): List of METS XML file paths.
-        logger (logging.Logger, optional): Logger for reporting.
+    Only the end events of mods:mods elements are parsed, and parsing stops as
+    soon as title, date and edition have been found (normally in the first,
+    issue-level MODS section), so the fileSec and structMap are never read.
+    With ``data`` the contents are parsed from memory.
 
-    Returns:
-        dict: Dictionary with keys 'filename', 'mets_date', 'mets_title', 'mets_edition'.
+    Returns tuple:
+        (filename, mets_date, mets_title, mets_edition)
     """
+    np_title = np_date = np_edition = None
+    with (io.BytesIO(data) if data is not None else open_file(mets_file)) as mets:
+        for _, elem in etree.iterparse(mets, events=("end",), tag=MODS_TAG):
+            for elem_child in elem:
+                if not isinstance(elem_child.tag, str):  # comments / processing instructions
+                    continue
+                if elem_child.tag.endswith("titleInfo"):
+                    for c in elem_child:
+                        if np_title is None and isinstance(c.tag, str) and c.tag.endswith("title") and c.text:
+                            np_title = c.text
+                elif elem_child.tag.endswith("part"):
+                    for c in elem_child:
+                        if np_date is None and isinstance(c.tag, str) and c.tag.endswith("date") and c.text:
+                            np_date = c.text
+                elif elem_child.tag.endswith("originInfo"):
+                    for c in elem_child:
+                        if np_edition is None and isinstance(c.tag, str) and c.tag.endswith("edition") and c.text:
+                            np_edition = c.text
+            elem.clear()
+            if np_title is not None and np_date is not None and np_edition is not None:
+                break
+
+    return (os.path.basename(mets_file).strip("_mets.xml"),
+            np_date or "",
+            np_title or "",
+            np_edition or "")
+
+
+def mets_records_to_dict(records: List[tuple | None]) -> Dict[str, List[str]]:
+    """Collect METS records into the column dict used by the runner (None = unreadable)."""
     dict_mets_dates: Dict[str, List[str]] = {"filename": [], "mets_date": [], "mets_title": [], "mets_edition": []}
+    for record in records:
+        if record is None:
+            continue
+        for key, value in zip(dict_mets_dates, record):
+            dict_mets_dates[key].append(value)
+    return dict_mets_dates
 
-    for count, mets_file in enumerate(mets_files, start=1):
-        try:
-            with open(mets_file, "rb") as mets:
-                context = etree.iterparse(mets, events=("start", "end"))
-                np_titles: List[str] = []
-                np_dates: List[str] = []
-                np_editions: List[str] = []
-
-                for _, elem in context:
-                    if elem.tag == "{http://www.loc.gov/mods/v3}mods":
-                        for elem_child in elem:
-                            if elem_child.tag.endswith("titleInfo"):
-                                for c in elem_child:
-                                    if c.tag.endswith("title") and c.text:
-                                        np_titles.append(c.text)
-                            elif elem_child.tag.endswith("part"):
-                                for c in elem_child:
-                                    if c.tag.endswith("date") and c.text:
-                                        np_dates.append(c.text)
-                            elif elem_child.tag.endswith("originInfo"):
-                                for c in elem_child:
-                                    if c.tag.endswith("edition") and c.text:
-                                        np_editions.append(c.text)
-
-                dict_mets_dates["filename"].append(
-                    os.path.basename(mets_file).strip("_mets.xml"))
-                dict_mets_dates["mets_date"].append(
-                    np_dates[0] if np_dates else "")
-                dict_mets_dates["mets_title"].append(
-                    np_titles[0] if np_titles else "")
-                dict_mets_dates["mets_edition"].append(
-                    np_editions[0] if np_editions else "")
 
+def read_mets_records(mets_files: List[str], logger: logging.Logger | None = None, args=None,
+                      metrics: StageMetrics | None = None) -> List[tuple | None]:
+    """
+    Read a list of METS files; unreadable files give None.
+
+    With ``args.prefetch`` the files are read ahead in memory (see
+    prefetch.prefetched). Parse times are added to ``metrics`` as mets_parse.
+    """
+    records: List[tuple | None] = []
+    metrics = metrics if metrics is not None else StageMetrics()
+    for mets_file, data in prefetched(mets_files, args, metrics=metrics):
+        try:
+            with metrics.stage("mets_parse", items=1):
+                records.append(read_mets_record(mets_file, data=data))
         except Exception as e:
             if logger:
                 logger.error(f"Could not extract data from METS file {mets_file}: {e}")
+            records.append(None)
+    return records
 
-    return dict_mets_dates
+
+def extract_mets_data(mets_files: List[str], logger: logging.Logger | None = None) -> Dict[str, List[str]]:
+    """
+    Extract publication date, title, and edition data from a list of METS files.
+
+    Args:
+        mets_files (list[str]): List of METS XML file paths.
+        logger (logging.Logger, optional): Logger for reporting.
+
+    Returns:
+        dict: Dictionary with keys 'filename', 'mets_date', 'mets_title', 'mets_edition'.
+    """
+    return mets_records_to_dict(read_mets_records(mets_files, logger=logger))
@@ -1,6 +1,92 @@
 import os
 import logging
-from typing import List, Tuple
+from typing import Iterator, List, Tuple
+
+from .archive import split_archive_path, open_archive
+
+# submappen van een nummer waarin geen ALTO of METS staat (JP2-afbeeldingen)
+SKIP_DIRS = {"access"}
+
+
+def iter_batch_files(path_batch: str, logger: logging.Logger | None = None) -> Iterator[Tuple[str, str]]:
+    """
+    Walk a batch folder with os.scandir and yield files as they are found.
+
+    Directories in SKIP_DIRS are not entered. Files are yielded in the same
+    order as an os.walk over the tree: the files of a directory first, then
+    its subdirectories in listing order.
+
+    A batch inside a zip or tar archive (see archive.archive_batch_path) is
+    read from the member list; member paths are ``<archive>/<member name>``.
+
+    Yields tuples:
+        ("alto", path) or ("mets", path)
+    """
+    split = split_archive_path(path_batch)
+    if split is not None:
+        yield from _iter_archive_files(*split, logger=logger)
+        return
+
+    stack = [path_batch]
+    while stack:
+        directory = stack.pop()
+        subdirs = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in SKIP_DIRS:
+                            subdirs.append(entry.path)
+                    elif entry.name.endswith("_00001_alto.xml"):
+                        yield "alto", entry.path
+                    elif entry.name.endswith("_mets.xml"):
+                        yield "mets", entry.path
+        except OSError as e:
+            if logger:
+                logger.error(f"Error scanning batch folder {directory}: {e}")
+            if directory == path_batch:
+                return
+        # omgekeerd op de stack, zodat de eerste submap eerst aan de beurt is
+        stack.extend(reversed(subdirs))
+
+
+def _iter_archive_files(archive: str, root: str, logger: logging.Logger | None = None) -> Iterator[Tuple[str, str]]:
+    """Like iter_batch_files, for the members under ``root`` in an archive (same walk order)."""
+    try:
+        names = open_archive(archive).names()
+    except OSError as e:
+        if logger:
+            logger.error(f"Error scanning batch folder {archive}: {e}")
+        return
+
+    prefix = f"{root}/" if root else ""
+    # mappenboom uit de lidnamen: map -> (bestanden, submappen), in archiefvolgorde
+    tree = {"": ([], [])}
+    for name in names:
+        if not name.startswith(prefix):
+            continue
+        parts = name[len(prefix):].split("/")
+        if SKIP_DIRS.intersection(parts[:-1]):
+            continue
+        directory = ""
+        for part in parts[:-1]:
+            subdir = f"{directory}{part}/"
+            if subdir not in tree:
+                tree[subdir] = ([], [])
+                tree[directory][1].append(subdir)
+            directory = subdir
+        tree[directory][0].append(parts[-1])
+
+    stack = [""]
+    while stack:
+        directory = stack.pop()
+        files, subdirs = tree[directory]
+        for filename in files:
+            if filename.endswith("_00001_alto.xml"):
+                yield "alto", f"{archive}/{prefix}{directory}{filename}"
+            elif filename.endswith("_mets.xml"):
+                yield "mets", f"{archive}/{prefix}{directory}{filename}"
+        stack.extend(reversed(subdirs))
 
 
 def get_files(path_batch: str, logger: logging.Logger | None = None) -> Tuple[List[str], List[str]]:
@@ -17,12 +103,8 @@ def get_files(path_batch: str, logger: logging.Logger | None = None) -> Tuple[Li
     alto_files: List[str] = []
     mets_files: List[str] = []
     try:
-        for dirpath, _, filenames in os.walk(path_batch):
-            for filename in filenames:
-                if filename.endswith("_00001_alto.xml"):
-                    alto_files.append(os.path.join(dirpath, filename))
-                elif filename.endswith("_mets.xml"):
-                    mets_files.append(os.path.join(dirpath, filename))
+        for kind, path in iter_batch_files(path_batch, logger=logger):
+            (alto_files if kind == "alto" else mets_files).append(path)
 
         if logger:
             logger.info(f"Found {len(alto_files)} ALTO and {len(mets_files)} METS in {os.path.basename(path_batch)}")
@@ -0,0 +1,149 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+from typing import Dict, List
+
+JOURNAL_DIRNAME = "run_journal"
+
+# instellingen die de uitkomst van een run bepalen; bij --resume moeten ze
+# gelijk zijn aan die van de onderbroken run
+RUN_SETTINGS = ("threshold", "date_tolerance", "header_fraction", "profiles", "profile_margin", "profile_min_hits",
+                "kde_backend", "kde_max_exact", "kde_grid_size", "kde_sample", "mets_guided", "alto_parser",
+                "sample", "sample_seed", "sample_escalate")
+
+
+def run_journal_dir(output_dir: str, batches: List[str], watch_dir: str | None = None) -> str:
+    """
+    Journal directory of a run: ``<output>/run_journal/<key>``, where the key
+    is a hash of the batch paths (or of the inbox in watch mode). Runs over
+    other batches in the same output folder get their own journal.
+    """
+    paths = [os.path.abspath(watch_dir)] if watch_dir else sorted(os.path.abspath(p) for p in batches)
+    key = hashlib.sha1("\n".join(paths).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(output_dir, JOURNAL_DIRNAME, key)
+
+
+def _batch_key(path_batch: str) -> str:
+    """Filename-safe key of a batch; the hash keeps batches with the same name apart."""
+    abs_path = os.path.abspath(path_batch)
+    return f"{os.path.basename(abs_path)}_{hashlib.sha1(abs_path.encode('utf-8')).hexdigest()[:8]}"
+
+
+def _append_lines(path: str, entries: List[dict]):
+    """Append JSON lines and force them to disk, so a crash loses at most this write."""
+    with open(path, "a", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _read_lines(path: str) -> List[dict]:
+    """Read JSON lines, ignoring a torn last line from an interrupted write."""
+    entries = []
+    if not os.path.exists(path):
+        return entries
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    return entries
+
+
+class RunJournal:
+    """
+    Journal of a (multi-batch) run, used to resume after a crash.
+
+    Raises ValueError on ``resume`` when the settings in RUN_SETTINGS differ
+    from those of the interrupted run.
+
+    Layout of the journal directory:
+        run.json              settings of the run
+        batches.jsonl         one line per finished batch with its result tuple (in watch
+                              mode also the inbox entry and its snapshot)
+        files/<batch>.jsonl   candidates per finished ALTO file of a batch
+    """
+
+    def __init__(self, journal_dir: str, args, resume: bool = False,
+                 logger: logging.Logger | None = None):
+        self.journal_dir = journal_dir
+        self.batches_path = os.path.join(journal_dir, "batches.jsonl")
+        self.files_dir = os.path.join(journal_dir, "files")
+
+        settings = {key: getattr(args, key, None) for key in RUN_SETTINGS}
+        settings_path = os.path.join(journal_dir, "run.json")
+        if resume and os.path.exists(settings_path):
+            with open(settings_path, "r", encoding="utf-8") as f:
+                previous = json.load(f)
+            changed = {key: (previous.get(key), value) for key, value in settings.items() if previous.get(key) != value}
+            if changed:
+                # hervatte en nieuwe batches zouden anders met verschillende instellingen verwerkt zijn
+                raise ValueError("instellingen wijken af van de onderbroken run (oud, nieuw): " +
+                                 ", ".join(f"{key} {old!r} -> {new!r}" for key, (old, new) in changed.items()))
+        elif os.path.isdir(journal_dir):
+            # nieuwe run over dezelfde batches: oude journal weggooien
+            shutil.rmtree(journal_dir)
+
+        os.makedirs(self.files_dir, exist_ok=True)
+        if not os.path.exists(settings_path):
+            with open(settings_path, "w", encoding="utf-8") as f:
+                json.dump(settings, f, indent=2)
+
+    def completed_batches(self) -> Dict[str, tuple]:
+        """Return {absolute batch path: result tuple} of finished batches."""
+        return {entry["path"]: tuple(entry["result"]) for entry in _read_lines(self.batches_path)}
+
+    def completed_deliveries(self) -> Dict[str, tuple | None]:
+        """
+        Return {absolute inbox entry: snapshot} of the batches finished in
+        watch mode (see watch.Inbox). The snapshot is None for an entry
+        recorded without one.
+        """
+        deliveries = {}
+        for entry in _read_lines(self.batches_path):
+            snapshot = entry.get("snapshot")
+            deliveries[entry.get("source", entry["path"])] = tuple(snapshot) if snapshot else None
+        return deliveries
+
+    def record_batch(self, path_batch: str, result: tuple, source: str | None = None,
+                     snapshot: tuple | None = None):
+        entry = {"path": os.path.abspath(path_batch), "result": list(result)}
+        if source:
+            entry.update(source=os.path.abspath(source), snapshot=list(snapshot) if snapshot else None)
+        _append_lines(self.batches_path, [entry])
+
+    def remove(self):
+        """Remove the journal after a run that finished every batch (and the parent folder when empty)."""
+        shutil.rmtree(self.journal_dir, ignore_errors=True)
+        try:
+            os.rmdir(os.path.dirname(self.journal_dir))
+        except OSError:
+            pass
+
+
+class FileJournal:
+    """Per-batch journal of ALTO candidates; written by one process only."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Dict[str, list]:
+        """Return {alto file: candidates} for the files finished earlier."""
+        return {entry["file"]: entry["candidates"] for entry in _read_lines(self.path)}
+
+    def record(self, per_file: Dict[str, list]):
+        if per_file:
+            _append_lines(self.path, [{"file": f, "candidates": [list(c) for c in candidates]}
+                                      for f, candidates in per_file.items()])
+
+
+def open_file_journal(args, path_batch: str) -> FileJournal | None:
+    """FileJournal for a batch, or None when journaling is disabled."""
+    journal_dir = getattr(args, "journal", None)
+    if not journal_dir:
+        return None
+    return FileJournal(os.path.join(journal_dir, "files", f"{_batch_key(path_batch)}.jsonl"))
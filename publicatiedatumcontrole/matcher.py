@@ -0,0 +1,84 @@
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+from rapidfuzz import fuzz, process
+
+
+class MonthMatcher:
+    """
+    Match OCR tokens against Dutch month names.
+
+    A token matches a month when ``fuzz.ratio(token.lower(), month) > cutoff``,
+    exactly like the original per-word loop. Months that cannot reach the
+    cutoff because of the length difference alone are pruned before scoring,
+    the remaining months are scored in one ``rapidfuzz.process`` call, and
+    results are kept in a bounded LRU cache (OCR tokens repeat a lot across
+    the issues of a batch).
+    """
+
+    def __init__(self, months: Dict[str, str], cutoff: float = 80,
+                 cache_size: int = 100_000, ignore: Tuple[str, ...] = ("maar",)):
+        self.months: List[str] = list(months.keys())
+        self.cutoff = cutoff
+        self.ignore = frozenset(ignore)
+        self._by_length: Dict[int, List[str]] = {}
+        self._match_lower = lru_cache(maxsize=cache_size)(self._match_uncached)
+
+    def _candidates_for_length(self, length: int) -> List[str]:
+        """
+        Months that can still score above the cutoff for a token of this length.
+
+        fuzz.ratio is 100 * 2 * matches / (len_a + len_b), so the best possible
+        score for two strings is 200 * min(len_a, len_b) / (len_a + len_b).
+        """
+        try:
+            return self._by_length[length]
+        except KeyError:
+            feasible = [
+                month for month in self.months
+                if 200 * min(length, len(month)) / (length + len(month)) > self.cutoff
+            ]
+            self._by_length[length] = feasible
+            return feasible
+
+    def _match_uncached(self, token: str) -> Tuple[str, ...]:
+        if token in self.ignore:  # problematic words, e.g. "maar" ~ "maart"
+            return ()
+
+        candidates = self._candidates_for_length(len(token))
+        if not candidates:
+            return ()
+
+        # processor=None: rapidfuzz < 3 normaliseert anders (kleine letters, leestekens weg)
+        scored = process.extract(token, candidates, scorer=fuzz.ratio, processor=None,
+                                 score_cutoff=self.cutoff, limit=None)
+        # score_cutoff is inclusive; keep the original strict '> cutoff'
+        # and return the months in their original order.
+        hits = sorted((index, month) for month, score, index in scored if score > self.cutoff)
+        return tuple(month for _, month in hits)
+
+    def match(self, token: str) -> Tuple[str, ...]:
+        """Return all month names matching the token, in the order of ``months``."""
+        return self._match_lower(token.lower())
+
+    def cache_stats(self) -> Tuple[int, int]:
+        """Return (hits, misses) of the token cache."""
+        info = self._match_lower.cache_info()
+        return info.hits, info.misses
+
+
+_MATCHERS: Dict[tuple, MonthMatcher] = {}
+
+
+def get_matcher(months: Dict[str, str]) -> MonthMatcher:
+    """Return the matcher for this months mapping, shared within the process."""
+    key = tuple(months.items())
+    if key not in _MATCHERS:
+        _MATCHERS[key] = MonthMatcher(months)
+    return _MATCHERS[key]
+
+
+def hit_rate(hits: int, misses: int) -> float:
+    """Cache hit rate in percent."""
+    lookups = hits + misses
+    return round(hits / lookups * 100.0, 1) if lookups else 0.0
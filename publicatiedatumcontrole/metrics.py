@@ -0,0 +1,129 @@
+import os
+import sys
+import csv
+import json
+import time
+import resource
+import cProfile
+from contextlib import contextmanager
+from typing import Dict, List
+
+# volgorde van de stappen in de run-profielen
+STAGES = ["discovery", "io_read", "io_wait", "mets_parse", "alto_parse", "guided_scan", "month_match", "scoring", "compare", "snippets", "report"]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class StageMetrics:
+    """
+    Wall time, CPU time, item counts and peak RSS per pipeline stage.
+
+    Stages that run in several processes (file chunks) are merged: times and
+    items are summed, peak RSS is the maximum over the processes. The data is
+    a plain dict, so it can be returned from worker processes and stored in
+    the run journal.
+    """
+
+    def __init__(self, data: Dict[str, dict] | None = None):
+        self.data: Dict[str, dict] = {}
+        if data:
+            self.merge(data)
+
+    def add(self, stage: str, wall: float, cpu: float, items: int = 0, rss: float | None = None):
+        entry = self.data.setdefault(stage, {"wall_s": 0.0, "cpu_s": 0.0, "items": 0, "calls": 0,
+                                             "peak_rss_mb": 0.0})
+        entry["wall_s"] += wall
+        entry["cpu_s"] += cpu
+        entry["items"] += items
+        entry["calls"] += 1
+        entry["peak_rss_mb"] = max(entry["peak_rss_mb"], rss if rss is not None else peak_rss_mb())
+
+    @contextmanager
+    def stage(self, stage: str, items: int = 0):
+        """
+        Time a block as ``stage``. The yielded dict can be used to set the
+        item count when it is only known afterwards: ``counter["items"] = n``.
+        """
+        counter = {"items": items}
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield counter
+        finally:
+            self.add(stage, time.perf_counter() - wall, time.process_time() - cpu, counter["items"])
+
+    def merge(self, data: Dict[str, dict]):
+        """Add the stages of another StageMetrics.as_dict()."""
+        for stage, entry in data.items():
+            mine = self.data.setdefault(stage, {"wall_s": 0.0, "cpu_s": 0.0, "items": 0, "calls": 0,
+                                                "peak_rss_mb": 0.0})
+            for key in ("wall_s", "cpu_s", "items", "calls"):
+                mine[key] += entry.get(key, 0)
+            mine["peak_rss_mb"] = max(mine["peak_rss_mb"], entry.get("peak_rss_mb", 0.0))
+
+    def as_dict(self) -> Dict[str, dict]:
+        ordered = sorted(self.data, key=lambda s: STAGES.index(s) if s in STAGES else len(STAGES))
+        return {stage: {key: round(value, 4) if isinstance(value, float) else value
+                        for key, value in self.data[stage].items()}
+                for stage in ordered}
+
+
+@contextmanager
+def profiled(path: str | None):
+    """Run a block under cProfile and write the stats to ``path`` (no-op for None)."""
+    if not path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        profiler.dump_stats(path)
+
+
+def cprofile_path(args, name: str) -> str | None:
+    """Path of the cProfile output for ``name``, or None without --cprofile."""
+    if not getattr(args, "cprofile", False):
+        return None
+    return os.path.join(args.output, "cprofile", f"{name}.prof")
+
+
+def write_run_profile(results: List[tuple], reports_dir: str, stamp: str) -> tuple:
+    """
+    Write the per-stage metrics of all batches as JSON and CSV.
+
+    ``results`` are the batch result tuples; the metrics dict is the sixth
+    element (results without metrics, e.g. from an older journal, are skipped).
+
+    Returns tuple:
+        (json path, csv path)
+    """
+    batches = {r[0]: r[5] for r in results if len(r) > 5 and r[5]}
+    total = StageMetrics()
+    for stages in batches.values():
+        total.merge(stages)
+
+    def rows(batch_id: str, stages: Dict[str, dict]) -> list:
+        return [[batch_id, stage, m["wall_s"], m["cpu_s"], m["items"], m["calls"],
+                 round(m["items"] / m["wall_s"], 1) if m["wall_s"] else "", m["peak_rss_mb"]]
+                for stage, m in stages.items()]
+
+    json_path = os.path.join(reports_dir, f"run_profile_{stamp}.json")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump({"batches": batches, "total": total.as_dict()}, f, indent=2)
+
+    csv_path = os.path.join(reports_dir, f"run_profile_{stamp}.csv")
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["batch_id", "stage", "wall_s", "cpu_s", "items", "calls", "items_per_s", "peak_rss_mb"])
+        for batch_id, stages in batches.items():
+            writer.writerows(rows(batch_id, stages))
+        writer.writerows(rows("TOTAL", total.as_dict()))
+
+    return json_path, csv_path
@@ -0,0 +1,109 @@
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, Tuple
+
+from .archive import read_file, file_identity
+
+# maximaal aantal leesthreads per proces; meer helpt niet tegen latency van de share
+MAX_THREADS = 8
+
+
+def _read(path: str) -> tuple:
+    """Read a whole file in a prefetch thread. Returns (data or None, seconds, thread CPU seconds)."""
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        data = read_file(path)
+    except OSError:
+        # de parser opent het bestand dan zelf en meldt de fout zoals zonder prefetch
+        data = None
+    return data, time.perf_counter() - wall, time.thread_time() - cpu
+
+
+def _size(path: str) -> int:
+    """Size of a file or archive member to reserve in the prefetch budget (0 if it cannot be read)."""
+    try:
+        return file_identity(path)[0]
+    except OSError:
+        return 0
+
+
+class Prefetcher:
+    """
+    Read files ahead of the parser in a small thread pool.
+
+    Up to ``depth`` files are read ahead, as long as the files in flight or
+    read but not yet parsed fit in ``memory_mb``: the size of a file is
+    reserved when its read is submitted and released when the parser takes
+    it. Files are returned in the given order. The time spent reading
+    (``io_read``, summed over the threads) and the time the parser had to
+    wait for a file (``io_wait``) are added to ``metrics``.
+    """
+
+    def __init__(self, depth: int = 8, memory_mb: float = 256, metrics=None):
+        self.depth = max(1, depth)
+        self.budget = memory_mb * 1024 * 1024
+        self.metrics = metrics
+        self.reserved = 0
+
+    def iter_files(self, paths: Iterable[str]) -> Iterator[Tuple[str, bytes | None]]:
+        """
+        Yield (path, contents) in the order of ``paths``. Contents is None
+        for a file that could not be read.
+        """
+        paths = iter(paths)
+        pending = deque()
+        # volgend bestand met zijn grootte, als het nog niet in het budget paste
+        waiting = []
+        read_s = read_cpu = wait_s = 0.0
+        files = 0
+
+        def submit(executor):
+            while len(pending) < self.depth:
+                if not waiting:
+                    path = next(paths, None)
+                    if path is None:
+                        return
+                    waiting.append((path, _size(path)))
+                path, size = waiting[0]
+                # altijd minstens één bestand onderweg, ook als één bestand groter is dan het budget
+                if pending and self.reserved + size > self.budget:
+                    return
+                waiting.pop()
+                self.reserved += size
+                pending.append((path, size, executor.submit(_read, path)))
+
+        executor = ThreadPoolExecutor(max_workers=min(self.depth, MAX_THREADS), thread_name_prefix="prefetch")
+        try:
+            submit(executor)
+            while pending:
+                path, size, future = pending.popleft()
+                wait = time.perf_counter()
+                data, seconds, cpu = future.result()
+                wait_s += time.perf_counter() - wait
+                read_s += seconds
+                read_cpu += cpu
+                files += 1
+                self.reserved -= size
+                submit(executor)
+                yield path, data
+        finally:
+            for _, _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+            if self.metrics is not None and files:
+                self.metrics.add("io_read", read_s, read_cpu, files)
+                self.metrics.add("io_wait", wait_s, 0.0, files)
+
+
+def prefetched(paths: Iterable[str], args=None, metrics=None) -> Iterator[Tuple[str, bytes | None]]:
+    """
+    Yield (path, contents) for ``paths``, read ahead when ``args.prefetch``
+    is set. Without prefetching contents is None and the parser opens the
+    file itself.
+    """
+    depth = getattr(args, "prefetch", 0) or 0
+    if depth <= 0:
+        return ((path, None) for path in paths)
+    memory_mb = getattr(args, "prefetch_memory", 256) or 256
+    return Prefetcher(depth, memory_mb, metrics=metrics).iter_files(paths)
@@ -0,0 +1,147 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+# Minimale spreiding (pixels) van een hotspot, zodat een profiel dat uit een
+# paar bijna identieke posities is geleerd niet te smal wordt.
+MIN_SPREAD = 50
+# Maximaal aantal punten uit eerdere runs dat meetelt bij het samenvoegen,
+# zodat een oud profiel nieuwe waarnemingen niet blijvend overstemt.
+MAX_HISTORY = 500
+
+
+def _profile_path(profile_dir: str, title_edition: str) -> str:
+    """One JSON file per title + edition; the hash keeps similar titles apart."""
+    slug = re.sub(r"[^\w.-]+", "_", title_edition)[:60]
+    digest = hashlib.sha1(title_edition.encode("utf-8")).hexdigest()[:8]
+    return os.path.join(profile_dir, f"{slug}_{digest}.json")
+
+
+def load_profiles(profile_dir: str, logger: logging.Logger | None = None) -> Dict[str, dict]:
+    """
+    Load all layout profiles from a profile directory.
+
+    Returns:
+        dict: {title_edition: profile}
+    """
+    profiles: Dict[str, dict] = {}
+    if not profile_dir or not os.path.isdir(profile_dir):
+        return profiles
+
+    for fname in os.listdir(profile_dir):
+        if not fname.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(profile_dir, fname), "r", encoding="utf-8") as f:
+                profile = json.load(f)
+            profiles[profile["title_edition"]] = profile
+        except (OSError, ValueError, KeyError) as e:
+            if logger:
+                logger.warning(f"Kon layoutprofiel {fname} niet lezen: {e}")
+    return profiles
+
+
+def save_profile(profile_dir: str, profile: dict, logger: logging.Logger | None = None) -> str:
+    """Write a profile atomically (concurrent batches may update the same title)."""
+    os.makedirs(profile_dir, exist_ok=True)
+    path = _profile_path(profile_dir, profile["title_edition"])
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(profile, f, indent=2)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        if logger:
+            logger.error(f"Kon layoutprofiel niet opslaan voor {profile['title_edition']}: {e}")
+        return ""
+    return path
+
+
+def learn_profile(title_edition: str, df_accepted: pd.DataFrame, previous: dict | None = None,
+                  min_points: int = 3, drifted: bool = False) -> dict | None:
+    """
+    Learn the date hotspot of a title from the confirmed candidates of a run.
+
+    ``df_accepted`` holds the candidates above threshold whose date matches
+    METS. The hotspot is their median HPOS/VPOS, with their spread and
+    bounding box. With ``previous`` the run is merged into the stored
+    profile: the hotspot becomes the points-weighted mixture of both (at most
+    MAX_HISTORY points of history count) and the bounding box their union.
+    After a layout drift (``drifted``) the hotspot is taken from this run
+    only, but the old bounding box stays in the union, so the learned region
+    covers both layouts. Returns None if there are too few candidates to
+    learn from.
+    """
+    if len(df_accepted) < min_points:
+        return None
+
+    hpos = df_accepted["HPOS"].to_numpy(dtype=float)
+    vpos = df_accepted["VPOS"].to_numpy(dtype=float)
+    points = len(df_accepted)
+    peak = [float(np.median(hpos)), float(np.median(vpos))]
+    spread = [float(hpos.std()), float(vpos.std())]
+    bbox = [float(hpos.min()), float(vpos.min()), float(hpos.max()), float(vpos.max())]
+
+    if previous:
+        old_bbox = previous["bbox"]
+        bbox = [min(bbox[0], old_bbox[0]), min(bbox[1], old_bbox[1]),
+                max(bbox[2], old_bbox[2]), max(bbox[3], old_bbox[3])]
+        if not drifted:
+            old_points = min(previous.get("points", 0), MAX_HISTORY)
+            total = old_points + points
+            merged_peak = [(old_points * p_old + points * p_new) / total
+                           for p_old, p_new in zip(previous["peak"], peak)]
+            # spreiding van het mengsel: eigen spreiding plus afstand tot de gezamenlijke piek
+            spread = [float(np.sqrt((old_points * (s_old ** 2 + (p_old - p) ** 2) +
+                                     points * (s_new ** 2 + (p_new - p) ** 2)) / total))
+                      for s_old, p_old, s_new, p_new, p in zip(previous["spread"], previous["peak"],
+                                                               spread, peak, merged_peak)]
+            peak, points = merged_peak, total
+
+    return {
+        "title_edition": title_edition,
+        "peak": peak,
+        "spread": [max(spread[0], MIN_SPREAD), max(spread[1], MIN_SPREAD)],
+        "bbox": bbox,
+        "points": int(points),
+        "runs": (previous or {}).get("runs", 0) + 1,
+        "updated": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def profile_region(profile: dict, margin: float) -> Dict[str, float]:
+    """Bounding box of the learned hotspot, widened by ``margin`` pixels."""
+    hmin, vmin, hmax, vmax = profile["bbox"]
+    return {"hmin": hmin - margin, "vmin": vmin - margin,
+            "hmax": hmax + margin, "vmax": vmax + margin}
+
+
+def issue_regions(alto_files: List[str], dict_mets_dates: dict, profiles: Dict[str, dict],
+                  margin: float) -> Dict[str, Dict[str, float]]:
+    """
+    Map ALTO files to the learned date region of their title.
+
+    Files whose title has no profile are left out and are parsed in full.
+    """
+    if not profiles:
+        return {}
+
+    title_by_issue = {
+        filename: f"{title}_{edition}"
+        for filename, title, edition in zip(dict_mets_dates["filename"],
+                                            dict_mets_dates["mets_title"],
+                                            dict_mets_dates["mets_edition"])
+    }
+    regions = {}
+    for alto_file in alto_files:
+        title_edition = title_by_issue.get(os.path.basename(alto_file).rstrip("_00001_alto.xml"))
+        if title_edition in profiles:
+            regions[alto_file] = profile_region(profiles[title_edition], margin)
+    return regions
@@ -1,16 +1,135 @@
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 from PIL import Image
-import matplotlib.pyplot as plt
 
+from .archive import split_archive_path, open_file
 
-def plot_fig(df_errors, path_batch, current_title, log_path, df_all, logger=None) -> str:
+SNIPPET_HEIGHT = 30
+# uitsnede rond de kandidaat (links, boven, rechts, onder) t.o.v. HPOS/VPOS
+SNIPPET_BOX = (-140, -20, 700, 80)
+# hoogte van de pagina-achtergrond in de figuur
+BACKGROUND_HEIGHT = 1000
+
+
+def access_path(path_batch: str, file_id: str) -> str:
+    return os.path.join(path_batch, file_id, "access", f"{file_id}_00001_access.jp2")
+
+
+def _open_image(path: str) -> Image.Image:
+    # JP2's in een archief worden pas hier (alleen voor gemarkeerde nummers) gelezen
+    return Image.open(open_file(path) if split_archive_path(path) else path)
+
+
+def reduce_level(region_height: float, target_height: int) -> int:
+    """Number of JP2 resolution halvings that keeps region_height >= target_height."""
+    level = 0
+    while region_height / 2 ** (level + 1) >= target_height:
+        level += 1
+    return level
+
+
+def open_access_image(path: str, target_height: int, region_height: float | None = None) -> tuple:
+    """
+    Decode an access image at the lowest JPEG 2000 resolution level at which
+    ``region_height`` (default: the page height) is still ``target_height``
+    pixels or more.
+
+    Only the needed wavelet levels are decoded, so a reduced image takes a
+    fraction of the time of a full decode.
+
+    Returns tuple:
+        (image, full_size) -- the decoded image and the full-resolution (width, height)
+    """
+    img = _open_image(path)
+    full_size = img.size
+    level = reduce_level(region_height or full_size[1], target_height)
+    if level and img.format == "JPEG2000":
+        img.reduce = level
+        try:
+            img.load()
+        except OSError:
+            # minder resolutieniveaus in het bestand dan gevraagd: volledig decoderen
+            img = _open_image(path)
+    img.load()
+    return img, full_size
+
+
+def page_background(img: Image.Image, full_size: tuple) -> tuple:
+    """Downscaled page image plus its extent in full-resolution (ALTO) coordinates."""
+    if img.size[1] > BACKGROUND_HEIGHT:
+        width = max(1, round(img.size[0] * BACKGROUND_HEIGHT / img.size[1]))
+        img = img.resize((width, BACKGROUND_HEIGHT), Image.BILINEAR)
+    return np.asarray(img), (0, full_size[0], full_size[1], 0)
+
+
+def _render_file(path_batch: str, file_id: str, positions: list, log_path: str,
+                 background: bool) -> tuple:
+    """Decode one access image once and save the snippets of all its candidates."""
+    left, top, right, bottom = SNIPPET_BOX
+    img, full_size = open_access_image(access_path(path_batch, file_id), SNIPPET_HEIGHT,
+                                       region_height=bottom - top)
+    scale = full_size[0] / img.size[0]
+    wsize = int((right - left) * SNIPPET_HEIGHT / (bottom - top))
+
+    impath_abs = os.path.abspath(os.path.join(log_path, "images", f"{file_id}_date.jpg"))
+    for vpos, hpos in positions:
+        box = tuple(round(c / scale) for c in (hpos + left, vpos + top, hpos + right, vpos + bottom))
+        crop_img = img.crop(box).resize((wsize, SNIPPET_HEIGHT), Image.LANCZOS)
+        crop_img.save(impath_abs, "JPEG", quality=90)
+
+    return os.path.join("images", f"{file_id}_date.jpg"), \
+        page_background(img, full_size) if background else None
+
+
+def render_snippets(df_errors, path_batch, log_path, background_file: str | None = None,
+                    workers: int = 4, logger=None) -> tuple:
+    """
+    Save the date snippets of all flagged issues.
+
+    Each access image is decoded once, at the lowest resolution level that
+    still gives a SNIPPET_HEIGHT thumbnail, in a pool of ``workers`` threads.
+    The image of ``background_file`` is also returned as plot background.
+
+    Returns tuple:
+        (snippets, background) -- dict {file_id: relative snippet path} and
+        the plot background (see page_background) or None
+    """
+    positions = {}
+    for file_id, vpos, hpos in zip(df_errors["filename"], df_errors["VPOS"], df_errors["HPOS"]):
+        positions.setdefault(file_id, []).append((vpos, hpos))
+
+    snippets, background = {}, None
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {
+            file_id: pool.submit(_render_file, path_batch, file_id, pos, log_path,
+                                 file_id == background_file)
+            for file_id, pos in positions.items()
+        }
+        for file_id, fut in futures.items():
+            try:
+                snippets[file_id], bg = fut.result()
+                if bg is not None:
+                    background = bg
+            except Exception as e:
+                if logger:
+                    logger.error(f"Kon snippet niet maken voor {file_id}: {e}")
+    return snippets, background
+
+
+def plot_fig(df_errors, path_batch, current_title, log_path, df_all, logger=None,
+             background: tuple | None = None) -> str:
     """Maak een scatter plot van alle gevonden datum-coördinaten."""
+    import matplotlib.pyplot as plt  # alleen nodig als er een figuur gemaakt wordt
+
     try:
-        bgfile = df_errors.iloc[0, 0]
-        acpath = os.path.join(path_batch, bgfile, "access", f"{bgfile}_00001_access.jp2")
-        img = plt.imread(acpath)
+        if background is None:
+            bgfile = df_errors.iloc[0, 0]
+            img, full_size = open_access_image(access_path(path_batch, bgfile), BACKGROUND_HEIGHT)
+            background = page_background(img, full_size)
+        img, extent = background
 
         fig, ax = plt.subplots()
         plt.scatter(df_all["HPOS"], df_all["VPOS"], c=df_all["score"],
@@ -30,7 +149,7 @@ def plot_fig(df_errors, path_batch, current_title, log_path, df_all, logger=None
         ax.spines["right"].set_color("0.5")
         ax.spines["left"].set_color("0.5")
 
-        ax.imshow(img, alpha=0.7)
+        ax.imshow(img, alpha=0.7, extent=extent)
 
         current_title_ = "".join(current_title.split())[:6]
         fig_filename = f"fig_{current_title_}.png"
@@ -47,35 +166,22 @@ def plot_fig(df_errors, path_batch, current_title, log_path, df_all, logger=None
         return ""
 
 
-def generate_html_log(df_errors, path_batch, current_title, log_path, logger=None, threshold: float = 0.8) -> str:
+def generate_html_log(df_errors, path_batch, current_title, log_path, logger=None, threshold: float = 0.8,
+                      snippets: dict | None = None, workers: int = 4) -> str:
     """Genereer HTML-rapport met tabellen en snippets. Geeft pad terug."""
     try:
         df_errors = df_errors.reset_index()
         df_errors = df_errors[["filename",
                                "alto_date", "mets_date", "VPOS", "HPOS"]]
 
-        # thumbnails maken
+        # thumbnails maken (tenzij al gedaan via render_snippets)
+        if snippets is None:
+            snippets, _ = render_snippets(df_errors, path_batch, log_path, workers=workers, logger=logger)
         fnames, thumb_paths = [], []
-        for file_id, vpos, hpos in zip(df_errors["filename"], df_errors["VPOS"], df_errors["HPOS"]):
-            try:
-                access_path = os.path.join(path_batch, file_id, "access", f"{file_id}_00001_access.jp2")
-                img = Image.open(access_path)
-                crop_img = img.crop(
-                    (hpos - 140, vpos - 20, hpos + 700, vpos + 80))
-                baseheight = 30
-                hpercent = baseheight / float(crop_img.size[1])
-                wsize = int((float(crop_img.size[0]) * hpercent))
-                crop_img = crop_img.resize((wsize, baseheight), Image.LANCZOS)
-
-                impath_abs = os.path.abspath(os.path.join(log_path, "images", f"{file_id}_date.jpg"))
-                impath_rel = os.path.join("images", f"{file_id}_date.jpg")
-                crop_img.save(impath_abs, "JPEG", quality=90)
-
-                thumb_paths.append(f'<img src="{impath_rel}" alt="snippet">')
+        for file_id in df_errors["filename"]:
+            if file_id in snippets:
+                thumb_paths.append(f'<img src="{snippets[file_id]}" alt="snippet">')
                 fnames.append(file_id)
-            except Exception as e:
-                if logger:
-                    logger.error(f"Kon snippet niet maken voor {file_id}: {e}")
 
         df_img = pd.DataFrame({"filename": fnames, "thumb_paths": thumb_paths})
         df_table = df_errors.merge(df_img, on="filename", how="left")
@@ -1,16 +1,34 @@
 import os
 import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat, product
+from string import punctuation as PUNCTUATION
 import pandas as pd
 import numpy as np
-from rapidfuzz import fuzz
 from tqdm import tqdm
 
-from .utils import setup_logging, clean_ocr_number
+from .utils import setup_logging, clean_ocr_number, worker_log_config, MONTHS
 from .getfiles import get_files
-from .extract import get_alto_data, extract_mets_data
-from .scores import vpos_score, kde_gaussian
-from .compare import compare_dates
-from .report import plot_fig, generate_html_log, generate_xml_log
+from .extract import read_alto_strings, AltoStrings, read_mets_records, mets_records_to_dict
+from .scores import vpos_score, kde_gaussian, profile_hotspot_score
+from .profiles import load_profiles, save_profile, learn_profile, issue_regions
+from .compare import compare_dates, parse_dates
+from .matcher import get_matcher, hit_rate
+from .cache import open_cache, alto_settings
+from .journal import open_file_journal
+from .metrics import StageMetrics, profiled, cprofile_path
+from .prefetch import prefetched
+from .archive import closing_archives
+
+# submap van de batchrapporten voor de rapporten van een steekproef
+SAMPLE_DIRNAME = "sample"
+# METS-gestuurd zonder kopband of profiel: zoek de verwachte datum in dit deel van de pagina
+GUIDED_BAND = 0.25
+# cijfers zoals OCR ze verleest; omgekeerde van utils.clean_ocr_number
+OCR_CONFUSIONS = {"1": "1iIl", "0": "0oO"}
+EXPECTED_DATE = re.compile(r"^(\d{4})-(\d{2})-(\d{2})")
 
 
 def process_batch(path_batch: str, args, months: dict, logfile: str, verbose: bool) -> tuple:
@@ -19,121 +37,683 @@ def process_batch(path_batch: str, args, months: dict, logfile: str, verbose: bo
     score candidates, and generate reports.
 
     Returns tuple:
-        (batch_id, num_alto, num_mets, num_candidates, num_errors)
+        (batch_id, num_alto, num_mets, num_candidates, num_errors, stage metrics)
     """
     batch_id = os.path.basename(path_batch)
     logger = setup_logging(logfile, verbose, batch_id=batch_id)
     logger.info(f"=== Start batch: {batch_id} ===")
+    metrics = StageMetrics()
 
-    # ------------------ GET FILES ------------------
-    from .getfiles import get_files
-    alto_files, mets_files = get_files(path_batch, logger=logger)
+    # archieven van de batch na afloop sluiten: warme workers verwerken nog veel batches
+    with profiled(cprofile_path(args, batch_id)), closing_archives(path_batch):
+        # ------------------ GET FILES ------------------
+        with metrics.stage("discovery") as counter:
+            alto_files, mets_files = get_files(path_batch, logger=logger)
+            counter["items"] = len(alto_files) + len(mets_files)
 
-    filenames, alto_dates, content_x, content_y = [], [], [], []
+        cache = open_cache(args, months, logger=logger)
+        try:
+            # ------------------ METS DATA ------------------
+            # METS eerst: de titel bepaalt welk geleerd layoutprofiel bij een ALTO hoort
+            dict_mets_dates = mets_records_to_dict(collect_mets_records(mets_files, args, logfile, verbose, batch_id,
+                                                                        logger=logger, cache=cache, metrics=metrics))
+            regions = layout_regions(alto_files, dict_mets_dates, args, logger=logger)
+            expected = expected_dates(alto_files, dict_mets_dates, args)
 
-    # ------------------ PROCESS ALTO FILES ------------------
-    logger.info(f"Verwerken van {len(alto_files)} ALTO-bestanden...")
-    for alto_file in tqdm(alto_files, desc=f"Processing ALTO ({batch_id})", unit="file", leave=False):
-        alto_content = get_alto_data(alto_file, logger=logger)
+            if getattr(args, "sample", 0):
+                return sample_batch(path_batch, args, months, logfile, verbose, alto_files, mets_files,
+                                    dict_mets_dates, regions, logger=logger, cache=cache, metrics=metrics,
+                                    expected=expected)
 
-        for word_count, alto_word in enumerate(alto_content, start=1):
-            if not alto_word or not alto_word[0]:
-                continue
+            # ------------------ PROCESS ALTO FILES ------------------
+            logger.info(f"Verwerken van {len(alto_files)} ALTO-bestanden...")
+            candidates = collect_candidates(alto_files, args, months, logfile, verbose, batch_id,
+                                            logger=logger, regions=regions, cache=cache,
+                                            journal=open_file_journal(args, path_batch), metrics=metrics,
+                                            expected=expected)
+            log_guided_stats(metrics, logger=logger)
+        finally:
+            if cache:
+                cache.log_stats(logger)
+                cache.close()
 
-            if alto_word[0].lower() in ["maar"]:  # ignore problematic words
-                continue
+        return analyse_batch(path_batch, args, candidates, dict_mets_dates,
+                             alto_files, mets_files, logfile, verbose, metrics=metrics)
 
-            for month in months.keys():
-                fuzz_score = fuzz.ratio(alto_word[0].lower(), month)
-                if fuzz_score > 80:
-                    try:
-                        prev_content = clean_ocr_number(
-                            re.sub(r"[^\w\s]", "",
-                                   alto_content[word_count - 2][0])
-                        )
-                        next_content = clean_ocr_number(
-                            re.sub(r"[^\w\s]", "", alto_content[word_count][0])
-                        )
-
-                        if (prev_content.isdigit() and len(prev_content) < 3 and
-                                next_content.isdigit() and len(next_content) < 5):
-
-                            filenames.append(os.path.basename(
-                                alto_file).rstrip("_alto_00001.xml"))
-                            alto_dates.append(f"{next_content}-{months[month]}-{prev_content.zfill(2)}")
-                            content_x.append(alto_word[1][0])
-                            content_y.append(alto_word[1][1])
-                    except (ValueError, IndexError):
-                        continue
-
-    df = pd.DataFrame({
-        "filename": filenames,
-        "alto_date": alto_dates,
-        "VPOS": content_x,
-        "HPOS": content_y,
-    })
 
-    # ------------------ METS DATA ------------------
-    dict_mets_dates = extract_mets_data(mets_files, logger=logger)
+def sample_batch(path_batch: str, args, months: dict, logfile: str, verbose: bool, alto_files: list,
+                 mets_files: list, dict_mets_dates: dict, regions: dict, logger, cache=None,
+                 metrics: StageMetrics | None = None, expected: dict | None = None) -> tuple:
+    """
+    Triage a batch on a stratified sample of ``args.sample`` issues per title
+    + edition: detect, score and compare only the sampled issues and estimate
+    the error rate of the batch (see sampling.estimate_error_rate).
+
+    When the estimate exceeds ``args.sample_escalate``, the rest of the batch
+    is processed as well and the whole batch is analysed as in a normal run;
+    the candidates of the sampled issues are reused.
+
+    Returns tuple:
+        (batch_id, num_alto, num_mets, num_candidates, num_errors, stage metrics, sample estimate)
+    """
+    from .sampling import sample_issues, sampled_alto_files, estimate_error_rate
+
+    batch_id = os.path.basename(path_batch)
+    metrics = metrics if metrics is not None else StageMetrics()
+    sample = sample_issues(dict_mets_dates, args.sample, seed=getattr(args, "sample_seed", 0) or 0)
+    sample_files = sampled_alto_files(alto_files, sample)
+    sample_set = set(sample_files)
+    sampled_issues = {issue for issues in sample.values() for issue in issues}
+    sample_mets = {key: [v for f, v in zip(dict_mets_dates["filename"], values) if f in sampled_issues]
+                   for key, values in dict_mets_dates.items()}
+
+    logger.info(f"Steekproef: {len(sample_files)} van {len(alto_files)} ALTO-bestanden "
+                f"({args.sample} nummers per titel/editie)")
+    candidates = collect_candidates(sample_files, args, months, logfile, verbose, batch_id,
+                                    logger=logger, regions=regions, cache=cache, metrics=metrics, expected=expected)
+    error_issues = {}
+    # eigen submap: rapporten van een eerdere volledige run blijven staan
+    sample_dir = os.path.join(args.output, batch_id, SAMPLE_DIRNAME)
+    shutil.rmtree(sample_dir, ignore_errors=True)
+    result = analyse_batch(path_batch, args, candidates, sample_mets, sample_files,
+                           [f for f in mets_files if os.path.basename(f).strip("_mets.xml") in sampled_issues],
+                           logfile, verbose, metrics=metrics, error_issues=error_issues, learn_profiles=False,
+                           report_dir=sample_dir)
+
+    sizes = {}
+    for title, edition in zip(dict_mets_dates["mets_title"], dict_mets_dates["mets_edition"]):
+        sizes[f"{title}_{edition}"] = sizes.get(f"{title}_{edition}", 0) + 1
+    estimate = estimate_error_rate(sizes, sample, error_issues)
+    logger.info(f"Geschat foutpercentage: {estimate['error_rate']:.1%} "
+                f"(95%-interval {estimate['ci_low']:.1%}-{estimate['ci_high']:.1%}; "
+                f"{estimate['error_issues']} van {estimate['sampled']} nummers in de steekproef)")
+
+    limit = getattr(args, "sample_escalate", None)
+    estimate["escalated"] = limit is not None and estimate["error_rate"] > limit
+    if not estimate["escalated"]:
+        return result + (estimate,)
+
+    # ------------------ ESCALATIE: HELE BATCH ------------------
+    logger.warning(f"Geschat foutpercentage boven {limit:.1%}: hele batch wordt gecontroleerd")
+    # de rapporten van de steekproef worden vervangen door die van de hele batch
+    shutil.rmtree(sample_dir, ignore_errors=True)
+    rest = [f for f in alto_files if f not in sample_set]
+    candidates += collect_candidates(rest, args, months, logfile, verbose, batch_id, logger=logger,
+                                     regions=regions, cache=cache, metrics=metrics, expected=expected)
+    # terug in bestandsvolgorde, zodat het resultaat gelijk is aan een gewone run
+    by_file = {}
+    for candidate in candidates:
+        by_file.setdefault(candidate[0], []).append(candidate)
+    candidates = [c for f in alto_files for c in by_file.pop(os.path.basename(f).rstrip("_alto_00001.xml"), [])]
+    result = analyse_batch(path_batch, args, candidates, dict_mets_dates, alto_files, mets_files,
+                           logfile, verbose, metrics=metrics)
+    return result + (estimate,)
+
+
+def analyse_batch(path_batch: str, args, candidates: list, dict_mets_dates: dict,
+                  alto_files: list, mets_files: list, logfile: str, verbose: bool,
+                  metrics: StageMetrics | None = None, error_issues: dict | None = None,
+                  learn_profiles: bool = True, report_dir: str | None = None) -> tuple:
+    """
+    Batch-level reduction: score the candidates of a batch per newspaper
+    title, compare them with METS and generate reports.
+
+    ``metrics`` holds the stage metrics of the file-level stages; the
+    scoring, comparison and report stages are added to it. If given,
+    ``error_issues`` is filled with {title_edition: set of issue filenames
+    with a potential error}. Without ``learn_profiles`` the layout profiles
+    are used but not updated (e.g. for a sample of the batch). Reports are
+    written to ``report_dir`` (default ``<output>/<batch_id>``).
+
+    Returns tuple:
+        (batch_id, num_alto, num_mets, num_candidates, num_errors, stage metrics)
+    """
+    batch_id = os.path.basename(path_batch)
+    logger = setup_logging(logfile, verbose, batch_id=batch_id)
+    metrics = metrics if metrics is not None else StageMetrics()
+
+    profile_dir = getattr(args, "profiles", None)
+    profiles = load_profiles(profile_dir, logger=logger) if profile_dir else {}
+
+    df = candidate_frame(candidates)
     df_mets = pd.DataFrame(dict_mets_dates)
+    if df_mets.empty:
+        logger.warning("Geen METS-gegevens gevonden; batch wordt niet geanalyseerd")
+        return (batch_id, len(alto_files), len(mets_files), 0, 0, metrics.as_dict())
     df_mets["title_edition"] = df_mets["mets_title"] + \
         "_" + df_mets["mets_edition"]
     newspaper_titles = df_mets["title_edition"].unique().tolist()
 
+    # één merge voor de hele batch, daarna per titel de eigen groep
+    # (groupby behoudt de rijvolgorde van de merge binnen elke groep)
+    df_merged = pd.merge(df, df_mets, on="filename")
+    groups = {title: group for title, group in df_merged.groupby("title_edition", sort=False)}
+
+    alto_fnames = set(os.path.basename(p).rstrip("_00001_alto.xml") for p in alto_files)
+
     total_candidates = 0
     total_errors = 0
 
     for current_title in newspaper_titles:
         logger.info(f"Analyse voor krant: {current_title}")
 
-        df_current = pd.merge(df, df_mets, on="filename")
-        df_current = df_current[df_current["title_edition"] == current_title]
-
-        if len(df_current) == 0:
+        df_current = groups.get(current_title)
+        if df_current is None or len(df_current) == 0:
             logger.warning(f"Geen data gevonden voor {current_title}")
             continue
 
         # ------------------ SCORES ------------------
-        df_current = kde_gaussian(df_current)
-        df_current = vpos_score(df_current)
-        col = df_current.loc[:, "kde_score":"vpos_score"]
-        df_current["score"] = np.round(col.mean(axis=1), 2)
-
-        df_filtered = df_current[df_current["score"] >= args.threshold]
-        logger.info(f"Pagina's met mogelijke datum: {len(df_filtered)} (threshold={args.threshold})")
+        # Met een layoutprofiel komen de kandidaten uit de geleerde regio;
+        # de hotspot uit het profiel vervangt dan de KDE over deze batch.
+        profile = profiles.get(current_title)
+        drifted = False
+        if profile is not None:
+            logger.info(f"Layoutprofiel gebruikt voor {current_title} ({profile['runs']} eerdere runs)")
+            df_current, df_filtered, df_compared = score_title(df_current, args, profile, logger=logger,
+                                                               metrics=metrics)
+            drifted = profile_drifted(current_title, df_compared, df_mets, alto_fnames, args, logger=logger)
+            if drifted:
+                # de datum staat niet meer in de geleerde regio: hele pagina en KDE, zoals zonder profiel
+                df_current = rescan_title(current_title, path_batch, args, df_mets, alto_files,
+                                          logfile, verbose, metrics=metrics)
+        if profile is None or drifted:
+            hotspot = guided_hotspot(current_title, df_current, args)
+            if hotspot is not None:
+                logger.info(f"Hotspot van {current_title} geleerd uit {hotspot['points']} METS-bevestigde nummers")
+            df_current, df_filtered, df_compared = score_title(df_current, args, hotspot, logger=logger,
+                                                               metrics=metrics)
 
-        alto_fnames = [os.path.basename(p).rstrip(
-            "_00001_alto.xml") for p in alto_files]
-        no_pd = set(alto_fnames) - set(df_filtered["filename"])
+        no_pd = alto_fnames.difference(df_filtered["filename"])
         if no_pd:
             perc = np.round(len(no_pd) / len(alto_files) * 100.0, 1)
             logger.warning(f"Geen publicatiedatum gevonden voor {len(no_pd)} bestanden ({perc}%)")
 
-        # ------------------ COMPARE ------------------
-        df_compared = compare_dates(df_filtered)
         df_errors = df_compared[(df_compared["distance_score"] > 0) &
                                 (df_compared["distance_score"] <= args.date_tolerance)]
 
+        if error_issues is not None:
+            error_issues[current_title] = set(df_errors["filename"])
+
+        if profile_dir and learn_profiles:
+            # alleen kandidaten die met METS overeenkomen bepalen de hotspot
+            learned = learn_profile(current_title, df_compared[df_compared["distance_score"] == 0],
+                                    previous=profile, drifted=drifted)
+            if learned:
+                save_profile(profile_dir, learned, logger=logger)
+
         total_candidates += len(df_filtered)
         total_errors += len(df_errors)
 
         if len(df_errors) > 0:
-            log_folder = os.path.join(args.output, batch_id)
+            # report (matplotlib, Pillow) alleen laden als er iets te rapporteren is
+            from .report import plot_fig, generate_html_log, render_snippets
+
+            log_folder = report_dir or os.path.join(args.output, batch_id)
             os.makedirs(os.path.join(log_folder, "images"), exist_ok=True)
 
-            plot_fig(df_errors, path_batch, current_title,
-                     log_folder, df_current, logger=logger)
-            generate_html_log(
-                df_errors,
-                path_batch,
-                current_title,
-                log_folder,
-                logger=logger,
-                threshold=args.threshold
-            )
+            # elke access-afbeelding één keer decoderen: snippets én achtergrond van de figuur
+            with metrics.stage("snippets", items=len(df_errors)):
+                snippets, background = render_snippets(df_errors, path_batch, log_folder,
+                                                       background_file=df_errors.iloc[0, 0],
+                                                       workers=getattr(args, "snippet_workers", 4),
+                                                       logger=logger)
+            with metrics.stage("report", items=len(df_errors)):
+                plot_fig(df_errors, path_batch, current_title,
+                         log_folder, df_current, logger=logger, background=background)
+                generate_html_log(
+                    df_errors,
+                    path_batch,
+                    current_title,
+                    log_folder,
+                    logger=logger,
+                    threshold=args.threshold,
+                    snippets=snippets
+                )
 
             logger.error(f"{len(df_errors)} mogelijke fouten gevonden in {current_title}")
         else:
             logger.info(f"Geen fouten gevonden voor {current_title}")
 
-    return (batch_id, len(alto_files), len(mets_files), total_candidates, total_errors)
+    return (batch_id, len(alto_files), len(mets_files), total_candidates, total_errors, metrics.as_dict())
+
+
+def score_title(df: pd.DataFrame, args, hotspot: dict | None = None, logger=None,
+                metrics: StageMetrics | None = None) -> tuple:
+    """
+    Score the candidates of one title (KDE, or the distance to ``hotspot``
+    when given, plus the VPOS score), keep those above threshold and compare
+    them with METS.
+
+    Returns tuple:
+        (scored candidates, candidates above threshold, compared candidates)
+    """
+    metrics = metrics if metrics is not None else StageMetrics()
+    with metrics.stage("scoring", items=len(df)):
+        if hotspot is not None:
+            df = profile_hotspot_score(df, hotspot, logger=logger)
+        else:
+            df = kde_gaussian(
+                df, logger=logger,
+                backend=getattr(args, "kde_backend", "auto"),
+                max_exact=getattr(args, "kde_max_exact", 5000),
+                grid_size=getattr(args, "kde_grid_size", 256),
+                sample_size=getattr(args, "kde_sample", None),
+            )
+        page_relative = bool(getattr(args, "header_fraction", None)) or hotspot is not None
+        df = vpos_score(df, page_relative=page_relative)
+        col = df.loc[:, "kde_score":"vpos_score"]
+        df["score"] = np.round(col.mean(axis=1), 2)
+
+    df_filtered = df[df["score"] >= args.threshold]
+    if logger:
+        logger.info(f"Pagina's met mogelijke datum: {len(df_filtered)} (threshold={args.threshold})")
+
+    with metrics.stage("compare", items=len(df_filtered)):
+        df_compared = compare_dates(df_filtered)
+    return df, df_filtered, df_compared
+
+
+def profile_drifted(title_edition: str, df_compared: pd.DataFrame, df_mets: pd.DataFrame, alto_fnames: set,
+                    args, logger=None) -> bool:
+    """
+    Whether the date of a title has moved out of its learned region.
+
+    An issue counts as a hit when a candidate above threshold has a date
+    within the date tolerance of METS (confirmed, or a potential error). The
+    profile has drifted when fewer than ``args.profile_min_hits`` of the
+    issues with a readable METS date in this batch are hits.
+    """
+    min_hits = getattr(args, "profile_min_hits", 0.5)
+    df_title = df_mets[(df_mets["title_edition"] == title_edition) & df_mets["filename"].isin(alto_fnames)]
+    dated = int((parse_dates(df_title["mets_date"])[:, 0] >= 0).sum())
+    hits = df_compared.loc[df_compared["distance_score"] <= args.date_tolerance, "filename"].nunique()
+    if not dated or hits >= min_hits * dated:
+        return False
+    if logger:
+        logger.warning(f"Layoutprofiel van {title_edition} past niet meer: datum gevonden in {hits} van "
+                       f"{dated} nummers; hele pagina wordt opnieuw doorzocht")
+    return True
+
+
+def rescan_title(title_edition: str, path_batch: str, args, df_mets: pd.DataFrame, alto_files: list,
+                 logfile: str, verbose: bool, metrics: StageMetrics | None = None) -> pd.DataFrame:
+    """
+    Detect the candidates of one title again without its learned region
+    (header band or full page, as for a title without a profile).
+
+    Returns the candidates merged with METS, like the per-title groups of analyse_batch.
+    """
+    batch_id = os.path.basename(path_batch)
+    issues = set(df_mets.loc[df_mets["title_edition"] == title_edition, "filename"])
+    title_files = [f for f in alto_files if os.path.basename(f).rstrip("_00001_alto.xml") in issues]
+    expected = expected_dates(title_files, df_mets, args)
+    candidates = collect_candidates(title_files, args, dict(MONTHS), logfile, verbose, batch_id,
+                                    logger=setup_logging(logfile, verbose, batch_id=batch_id),
+                                    metrics=metrics, expected=expected)
+    return pd.merge(candidate_frame(candidates), df_mets, on="filename")
+
+
+def candidate_frame(candidates: list) -> pd.DataFrame:
+    """
+    DataFrame of candidate tuples, built column by column: categorical
+    filenames and 32-bit coordinates instead of one Python object per cell.
+    """
+    columns = list(zip(*candidates)) or [()] * 5
+    return pd.DataFrame({
+        "filename": pd.Categorical(columns[0]),
+        "alto_date": pd.array(columns[1], dtype=object),
+        "VPOS": np.array(columns[2], dtype=np.int32),
+        "HPOS": np.array(columns[3], dtype=np.int32),
+        "PAGE_HEIGHT": pd.array(columns[4], dtype=object),
+    })
+
+
+def layout_regions(alto_files: list, dict_mets_dates: dict, args, logger=None) -> dict:
+    """Learned date regions per ALTO file (empty without --profiles)."""
+    profile_dir = getattr(args, "profiles", None)
+    if not profile_dir:
+        return {}
+
+    profiles = load_profiles(profile_dir, logger=logger)
+    regions = issue_regions(alto_files, dict_mets_dates, profiles,
+                            margin=getattr(args, "profile_margin", 200) or 200)
+    if logger and profiles:
+        logger.info(f"Layoutprofielen: {len(regions)} van {len(alto_files)} ALTO-bestanden "
+                    f"worden alleen in de geleerde datumregio gelezen")
+    return regions
+
+
+def find_candidates(alto_file: str, months: dict, logger=None, header_fraction: float | None = None,
+                    region: dict | None = None, metrics: StageMetrics | None = None,
+                    data: bytes | None = None, expected: str | None = None, backend: str | None = None) -> list:
+    """
+    Detect month-name date candidates in a single front-page ALTO file.
+
+    With ``region`` only the learned date region of the title is parsed, with
+    ``header_fraction`` only the header band of the page. When a restricted
+    parse finds no candidate, the next wider parse is tried, ending with the
+    full page. Parse and match times are added to ``metrics`` if given.
+    With ``data`` (prefetched file contents) every attempt parses from memory.
+    ``backend`` selects the ALTO parser (see extract.ALTO_BACKENDS).
+
+    With ``expected`` (the METS date, yyyy-mm-dd) the first, narrowest parse
+    is first scanned for exactly that date (see _verify_expected_date); if it
+    is there, it is the only candidate and the month-name search is skipped.
+
+    Returns list of tuples:
+        (filename, alto_date, VPOS, HPOS, PAGE_HEIGHT)
+    """
+    attempts = []
+    if region:
+        attempts.append({"region": region})
+    if header_fraction:
+        attempts.append({"header_fraction": header_fraction})
+    attempts.append({})
+
+    metrics = metrics if metrics is not None else StageMetrics()
+    guided_page = None
+    if expected:
+        # zonder kopband of regio alleen de kop van de pagina: daar staat de datum van het nummer
+        guided = attempts[0] if attempts[0] else {"header_fraction": GUIDED_BAND}
+        with metrics.stage("alto_parse", items=1):
+            page = read_alto_strings(alto_file, logger=logger, data=data, backend=backend, **guided)
+        with metrics.stage("guided_scan") as counter:
+            confirmed = _verify_expected_date(alto_file, page, expected, months)
+            counter["items"] = len(confirmed)
+        if confirmed:
+            return confirmed
+        if guided is attempts[0]:
+            guided_page = page
+
+    for number, attempt in enumerate(attempts):
+        if number == 0 and guided_page is not None:
+            page = guided_page
+        else:
+            with metrics.stage("alto_parse", items=int(number == 0 and not expected)):
+                page = read_alto_strings(alto_file, logger=logger, data=data, backend=backend, **attempt)
+        with metrics.stage("month_match", items=len(page.contents)):
+            candidates = _detect_candidates(alto_file, page, months)
+        if candidates or not attempt:
+            return candidates
+        if logger:
+            logger.debug(f"Geen kandidaat in {', '.join(attempt)} van {alto_file}, ruimere parse volgt")
+
+
+def _detect_candidates(alto_file: str, page: AltoStrings, months: dict) -> list:
+    """Find 'day month year' sequences around month-name matches in the ALTO strings."""
+    matcher = get_matcher(months)
+    contents = page.contents
+    filename = None
+    candidates = []
+
+    for word_count, token in enumerate(contents, start=1):
+        if not token:
+            continue
+
+        for month in matcher.match(token):
+            try:
+                prev_content = clean_ocr_number(
+                    re.sub(r"[^\w\s]", "",
+                           contents[word_count - 2])
+                )
+                next_content = clean_ocr_number(
+                    re.sub(r"[^\w\s]", "", contents[word_count])
+                )
+
+                if (prev_content.isdigit() and len(prev_content) < 3 and
+                        next_content.isdigit() and len(next_content) < 5):
+
+                    # één filename-string per bestand, gedeeld door alle kandidaten
+                    filename = filename or os.path.basename(alto_file).rstrip("_alto_00001.xml")
+                    candidates.append((
+                        filename,
+                        f"{next_content}-{months[month]}-{prev_content.zfill(2)}",
+                        page.vpos[word_count - 1],
+                        page.hpos[word_count - 1],
+                        page.page_height,
+                    ))
+            except (ValueError, IndexError):
+                continue
+
+    return candidates
+
+
+@lru_cache(maxsize=4096)
+def _ocr_variants(digits: str) -> frozenset:
+    """Spellings of a number with the OCR confusions that clean_ocr_number corrects ('1' as 'l', '0' as 'O', ...)."""
+    return frozenset("".join(chars) for chars in product(*(OCR_CONFUSIONS.get(d, d) for d in digits)))
+
+
+def _verify_expected_date(alto_file: str, page: AltoStrings, expected: str, months: dict) -> list:
+    """
+    Look for the expected (METS) date as a 'day month year' token sequence.
+
+    Day and year tokens are compared with their precomputed OCR variants
+    (after stripping punctuation), so most tokens are rejected with a set
+    lookup; the month token is only matched when its neighbours fit. The
+    scan stops at the first hit.
+
+    Returns list with the candidate tuple of the hit, or an empty list.
+    """
+    match = EXPECTED_DATE.match(expected or "")
+    if match is None:
+        return []
+    year, month_number, day = match.groups()
+    days = _ocr_variants(str(int(day))) | _ocr_variants(day.zfill(2))
+    years = _ocr_variants(year)
+    month_names = {name for name, number in months.items() if number == month_number}
+    matcher = get_matcher(months)
+    contents = page.contents
+
+    for i in range(1, len(contents) - 1):
+        prev_token, token, next_token = contents[i - 1], contents[i], contents[i + 1]
+        if (prev_token and next_token and token and prev_token.strip(PUNCTUATION) in days and
+                next_token.strip(PUNCTUATION) in years and month_names.intersection(matcher.match(token))):
+            return [(os.path.basename(alto_file).rstrip("_alto_00001.xml"), f"{year}-{month_number}-{day.zfill(2)}",
+                     page.vpos[i], page.hpos[i], page.page_height)]
+    return []
+
+
+def expected_dates(alto_files: list, dict_mets_dates: dict, args) -> dict:
+    """METS date per ALTO file for the METS-guided fast path (empty without --mets-guided)."""
+    if not getattr(args, "mets_guided", False):
+        return {}
+    by_issue = dict(zip(dict_mets_dates["filename"], dict_mets_dates["mets_date"]))
+    expected = {}
+    for alto_file in alto_files:
+        date = by_issue.get(os.path.basename(alto_file).rstrip("_alto_00001.xml"))
+        if date:
+            expected[alto_file] = date
+    return expected
+
+
+def guided_hotspot(title_edition: str, df: pd.DataFrame, args) -> dict | None:
+    """
+    Date hotspot of a title learned from the issues that the METS-guided scan
+    confirmed (exactly one candidate, equal to the METS date), like a layout
+    profile. The KDE would be fitted on one point per confirmed issue plus all
+    candidates of the other issues, which narrows its bandwidth; the
+    remaining candidates are scored against this hotspot instead.
+
+    Returns None without --mets-guided or with fewer than 3 confirmed issues.
+    """
+    if not getattr(args, "mets_guided", False):
+        return None
+    counts = df["filename"].map(df["filename"].value_counts()).astype(int)
+    confirmed = df[(counts == 1) & (df["alto_date"] == df["mets_date"])]
+    return learn_profile(title_edition, confirmed)
+
+
+def log_guided_stats(metrics: StageMetrics, logger=None):
+    """Log how many issues the METS-guided fast path confirmed directly."""
+    scan = metrics.data.get("guided_scan")
+    if logger and scan and scan["calls"]:
+        logger.info(f"METS-gestuurd: {scan['items']} van {scan['calls']} nummers direct bevestigd, "
+                    f"{scan['calls'] - scan['items']} volledig doorzocht")
+
+
+def _find_candidates_chunk(alto_files: list, args, months: dict, logfile: str, verbose: bool,
+                           batch_id: str, regions: dict | None = None, expected: dict | None = None) -> tuple:
+    """
+    Worker entry point: detect candidates for a chunk of ALTO files.
+
+    Returns tuple:
+        (candidates per file, (matcher_hits, matcher_misses), stage metrics) for this chunk
+    """
+    logger = setup_logging(logfile, verbose, batch_id=batch_id)
+    matcher = get_matcher(months)
+    hits_before, misses_before = matcher.cache_stats()
+    metrics = StageMetrics()
+
+    header_fraction = getattr(args, "header_fraction", None)
+    regions = regions or {}
+    expected = expected or {}
+    per_file = [
+        find_candidates(alto_file, months, logger=logger, header_fraction=header_fraction,
+                        region=regions.get(alto_file), metrics=metrics, data=data,
+                        expected=expected.get(alto_file), backend=getattr(args, "alto_parser", None))
+        for alto_file, data in prefetched(alto_files, args, metrics=metrics)
+    ]
+
+    hits, misses = matcher.cache_stats()
+    return per_file, (hits - hits_before, misses - misses_before), metrics.as_dict()
+
+
+def _extract_mets_chunk(mets_files: list, args, logfile: str, verbose: bool, batch_id: str) -> tuple:
+    """
+    Worker entry point: read the METS records of a chunk of METS files.
+
+    Returns tuple:
+        (records, stage metrics) for this chunk
+    """
+    logger = setup_logging(logfile, verbose, batch_id=batch_id)
+    metrics = StageMetrics()
+    records = read_mets_records(mets_files, logger=logger, args=args, metrics=metrics)
+    return records, metrics.as_dict()
+
+
+def collect_mets_records(mets_files: list, args, logfile: str, verbose: bool, batch_id: str,
+                         logger=None, cache=None, metrics: StageMetrics | None = None) -> list:
+    """
+    Read the METS records of a batch, using the extraction cache if given.
+
+    With ``args.file_workers > 1`` the files are read in chunks in a process
+    pool, like the ALTO files.
+
+    Returns list of records (None for unreadable files) in file order.
+    """
+    file_workers = max(1, getattr(args, "file_workers", 1) or 1)
+    chunksize = max(1, getattr(args, "file_chunksize", 200) or 200)
+
+    cached = cache.get_many("mets", mets_files) if cache else {}
+    todo = [f for f in mets_files if f not in cached]
+    metrics = metrics if metrics is not None else StageMetrics()
+    if file_workers == 1 or len(todo) <= chunksize:
+        fresh = dict(zip(todo, read_mets_records(todo, logger=logger, args=args, metrics=metrics)))
+    else:
+        chunks = [todo[i:i + chunksize] for i in range(0, len(todo), chunksize)]
+        fresh = {}
+        with ProcessPoolExecutor(max_workers=min(file_workers, len(chunks)), **worker_log_config()) as executor:
+            results = executor.map(_extract_mets_chunk, chunks, repeat(args), repeat(logfile), repeat(verbose),
+                                   repeat(batch_id))
+            for chunk, (records, chunk_metrics) in zip(chunks, results):
+                fresh.update(zip(chunk, records))
+                metrics.merge(chunk_metrics)
+    if cache:
+        cache.put_many("mets", {f: r for f, r in fresh.items() if r is not None})
+    return [tuple(cached[f]) if f in cached else fresh[f] for f in mets_files]
+
+
+def collect_candidates(alto_files: list, args, months: dict, logfile: str, verbose: bool,
+                       batch_id: str, logger=None, regions: dict | None = None, cache=None,
+                       journal=None, metrics: StageMetrics | None = None, expected: dict | None = None) -> list:
+    """
+    Detect candidates for all ALTO files of a batch.
+
+    Files with a valid entry in the extraction cache, or already recorded in
+    the run journal of an interrupted run, are not parsed again. With
+    ``args.file_workers > 1`` the remaining files are split into chunks of
+    ``args.file_chunksize`` and processed in a process pool. Results are
+    merged in file order, so the result is identical to a serial run.
+    Stage metrics (also those of the chunk workers) are added to ``metrics``.
+    """
+    file_workers = max(1, getattr(args, "file_workers", 1) or 1)
+    chunksize = max(1, getattr(args, "file_chunksize", 200) or 200)
+    header_fraction = getattr(args, "header_fraction", None)
+    regions = regions or {}
+    expected = expected or {}
+
+    settings = {f: alto_settings(header_fraction, regions.get(f), expected.get(f)) for f in alto_files} \
+        if cache else {}
+    cached = cache.get_many("alto", alto_files, settings) if cache else {}
+    if journal:
+        journaled = journal.load()
+        if journaled and logger:
+            logger.info(f"Hervatten: {len(journaled)} ALTO-bestanden al verwerkt in onderbroken run")
+        cached.update(journaled)
+    todo = [f for f in alto_files if f not in cached]
+
+    metrics = metrics if metrics is not None else StageMetrics()
+    per_file = {}
+    matcher_hits = matcher_misses = 0
+    if file_workers == 1 or len(todo) <= chunksize:
+        matcher = get_matcher(months)
+        hits_before, misses_before = matcher.cache_stats()
+        unjournaled = {}
+        for alto_file, data in tqdm(prefetched(todo, args, metrics=metrics), total=len(todo),
+                                    desc=f"Processing ALTO ({batch_id})", unit="file", leave=False):
+            per_file[alto_file] = unjournaled[alto_file] = find_candidates(
+                alto_file, months, logger=logger, header_fraction=header_fraction, region=regions.get(alto_file),
+                metrics=metrics, data=data, expected=expected.get(alto_file),
+                backend=getattr(args, "alto_parser", None))
+            if journal and len(unjournaled) >= chunksize:
+                journal.record(unjournaled)
+                unjournaled = {}
+        if journal:
+            journal.record(unjournaled)
+        hits, misses = matcher.cache_stats()
+        matcher_hits, matcher_misses = hits - hits_before, misses - misses_before
+    else:
+        chunks = [todo[i:i + chunksize] for i in range(0, len(todo), chunksize)]
+        if logger:
+            logger.info(f"ALTO-bestanden verdeeld over {len(chunks)} chunks ({file_workers} file-workers)")
+        with ProcessPoolExecutor(max_workers=min(file_workers, len(chunks)), **worker_log_config()) as executor:
+            results = executor.map(
+                _find_candidates_chunk,
+                chunks,
+                repeat(args),
+                repeat(months),
+                repeat(logfile),
+                repeat(verbose),
+                repeat(batch_id),
+                [{f: regions[f] for f in chunk if f in regions} for chunk in chunks],
+                [{f: expected[f] for f in chunk if f in expected} for chunk in chunks],
+            )
+            for chunk, (chunk_results, (hits, misses), chunk_metrics) in tqdm(
+                    zip(chunks, results), total=len(chunks), desc=f"Processing ALTO ({batch_id})",
+                    unit="chunk", leave=False):
+                per_file.update(zip(chunk, chunk_results))
+                metrics.merge(chunk_metrics)
+                if journal:
+                    journal.record(dict(zip(chunk, chunk_results)))
+                matcher_hits += hits
+                matcher_misses += misses
+
+    log_matcher_stats(matcher_hits, matcher_misses, logger=logger)
+    if cache:
+        cache.put_many("alto", per_file, settings)
+
+    candidates = []
+    for alto_file in alto_files:
+        if alto_file in cached:
+            candidates.extend(tuple(c) for c in cached[alto_file])
+        else:
+            candidates.extend(per_file[alto_file])
+    return candidates
+
+
+def log_matcher_stats(hits: int, misses: int, logger=None):
+    """Log the cache hit rate of the month matcher."""
+    if logger and hits + misses:
+        logger.info(f"Month-matcher cache: {hit_rate(hits, misses)}% hits "
+                    f"({hits + misses} tokens, {misses} uniek gescoord)")
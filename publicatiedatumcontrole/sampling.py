@@ -0,0 +1,76 @@
+import os
+import math
+import random
+from typing import Dict, List, Set
+
+# z-waarde voor een 95%-betrouwbaarheidsinterval
+Z_95 = 1.96
+
+
+def sample_issues(dict_mets_dates: Dict[str, List[str]], per_stratum: int, seed: int = 0) -> Dict[str, List[str]]:
+    """
+    Stratified random sample of issues: at most ``per_stratum`` issues of
+    every title + edition (the same strata as the analysis). The sample only
+    depends on the METS filenames and ``seed``, so a rerun picks the same
+    issues.
+
+    Returns:
+        dict: {title_edition: [sampled issue filenames]}
+    """
+    strata: Dict[str, List[str]] = {}
+    for filename, title, edition in zip(dict_mets_dates["filename"], dict_mets_dates["mets_title"],
+                                        dict_mets_dates["mets_edition"]):
+        strata.setdefault(f"{title}_{edition}", []).append(filename)
+
+    rng = random.Random(seed)
+    return {stratum: rng.sample(sorted(issues), min(per_stratum, len(issues)))
+            for stratum, issues in strata.items()}
+
+
+def sampled_alto_files(alto_files: List[str], sample: Dict[str, List[str]]) -> List[str]:
+    """ALTO files of the sampled issues, in batch order."""
+    issues = {issue for stratum in sample.values() for issue in stratum}
+    return [f for f in alto_files if os.path.basename(f).rstrip("_alto_00001.xml") in issues]
+
+
+def estimate_error_rate(stratum_sizes: Dict[str, int], sample: Dict[str, List[str]],
+                        error_issues: Dict[str, Set[str]], z: float = Z_95) -> dict:
+    """
+    Estimate the fraction of issues with a potential error from a stratified sample.
+
+    The point estimate weights the error rate of every title + edition by
+    its share of the issues in the batch. The interval is a Wilson score
+    interval on the effective sample size of the stratified estimate (with
+    finite population correction), so it stays meaningful when no errors or
+    only errors were found in the sample.
+
+    Returns dict:
+        {"issues", "sampled", "error_issues", "error_rate", "ci_low", "ci_high"}
+    """
+    total = sum(stratum_sizes.values())
+    sampled = sum(len(issues) for issues in sample.values())
+    found = sum(len(error_issues.get(stratum, set()) & set(issues)) for stratum, issues in sample.items())
+    if not total or not sampled:
+        return {"issues": total, "sampled": sampled, "error_issues": found,
+                "error_rate": 0.0, "ci_low": 0.0, "ci_high": 1.0}
+
+    rate = variance = 0.0
+    for stratum, issues in sample.items():
+        n, size = len(issues), stratum_sizes[stratum]
+        if not n:
+            continue
+        weight = size / total
+        p = len(error_issues.get(stratum, set()) & set(issues)) / n
+        rate += weight * p
+        if n > 1:
+            variance += weight ** 2 * (1 - n / size) * p * (1 - p) / (n - 1)
+
+    # alles geteld (of geen spreiding in de steekproef): effectieve n = aantal getrokken nummers
+    if sampled >= total:
+        return {"issues": total, "sampled": sampled, "error_issues": found,
+                "error_rate": rate, "ci_low": rate, "ci_high": rate}
+    n_eff = rate * (1 - rate) / variance if variance > 0 else sampled * total / (total - sampled)
+    centre = (rate + z * z / (2 * n_eff)) / (1 + z * z / n_eff)
+    half = z / (1 + z * z / n_eff) * math.sqrt(rate * (1 - rate) / n_eff + z * z / (4 * n_eff * n_eff))
+    return {"issues": total, "sampled": sampled, "error_issues": found,
+            "error_rate": rate, "ci_low": max(0.0, centre - half), "ci_high": min(1.0, centre + half)}
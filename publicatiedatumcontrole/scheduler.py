@@ -0,0 +1,298 @@
+import os
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, List
+
+from tqdm import tqdm
+
+from .utils import setup_logging, worker_log_config
+from .getfiles import iter_batch_files
+from .extract import mets_records_to_dict
+from .cache import open_cache, alto_settings
+from .journal import open_file_journal
+from .archive import close_archives
+from .metrics import StageMetrics
+from .runner import _find_candidates_chunk, _extract_mets_chunk, analyse_batch, layout_regions, \
+    expected_dates, log_matcher_stats, log_guided_stats
+
+# hoe lang de coördinator op een taak wacht voordat hij nieuw gevonden bestanden verwerkt
+DISCOVERY_POLL = 0.05
+
+
+class BatchState:
+    """Bookkeeping for one batch while its file-level tasks are running."""
+
+    def __init__(self, path_batch: str, alto_files: List[str], mets_files: List[str],
+                 logger: logging.Logger | None = None):
+        self.path_batch = path_batch
+        self.batch_id = os.path.basename(path_batch)
+        self.logger = logger
+        self.alto_files = alto_files
+        self.mets_files = mets_files
+        self.alto_results: Dict[str, list] = {}
+        self.mets_records: Dict[str, tuple | None] = {}
+        self.matcher_hits = 0
+        self.matcher_misses = 0
+        self.settings: Dict[str, str] = {}
+        self.metrics = StageMetrics()
+        self.journal = None
+        self.pending = 0
+        self.mets_done = False
+        self.failed = False
+        # bestanden die gevonden maar nog niet in een taak gestopt zijn
+        self.new_mets: List[str] = []
+        self.new_alto: List[str] = []
+        self.discovered = False
+
+    def candidates(self) -> list:
+        """Merge ALTO results in file order."""
+        merged = []
+        for alto_file in self.alto_files:
+            merged.extend(tuple(c) for c in self.alto_results[alto_file])
+        return merged
+
+    def mets_data(self) -> dict:
+        """Merge METS records in file order."""
+        return mets_records_to_dict([self.mets_records[f] for f in self.mets_files])
+
+
+def discover(states: List[BatchState], events: queue.Queue):
+    """
+    Discovery thread: walk the batches one after the other and put every
+    file on ``events`` as soon as it is found.
+
+    Events: (index, "alto" | "mets", path) per file and
+    (index, None, (wall seconds, cpu seconds)) when a batch is done.
+    """
+    for index, state in enumerate(states):
+        wall, cpu = time.perf_counter(), time.thread_time()
+        for kind, path in iter_batch_files(state.path_batch, logger=state.logger):
+            events.put((index, kind, path))
+        events.put((index, None, (time.perf_counter() - wall, time.thread_time() - cpu)))
+
+
+def run_scheduler(batches: List[str], args, months: dict, logfile: str, verbose: bool,
+                  max_workers: int, logger: logging.Logger | None = None, journal=None) -> dict:
+    """
+    Process all batches through one shared pool of file-level tasks.
+
+    A discovery thread walks the batch folders and hands every ALTO and METS
+    file to this coordinator as soon as it is found. Files are grouped into
+    chunks of ``args.file_chunksize`` that are queued right away, so parsing
+    overlaps with the (slow, I/O-bound) directory walk. All chunks go into a
+    single queue, so idle workers keep picking up work from whichever batch
+    still has files left. Without layout profiles ALTO chunks are queued as
+    they fill; with profiles the ALTO chunks of a batch are queued once its
+    METS chunks are done (the METS titles select the learned layout regions).
+    As soon as all chunks of a batch are done, its reduction step (scoring,
+    comparison, reporting) is submitted ahead of the remaining file tasks.
+
+    With a run journal, finished ALTO files and batches are recorded as they
+    complete, and ALTO files recorded by an interrupted run are skipped.
+
+    Returns dict {batch path: result tuple}:
+        (batch_id, num_alto, num_mets, num_candidates, num_errors, stage metrics)
+    """
+    chunksize = max(1, getattr(args, "file_chunksize", 200) or 200)
+
+    def chunked(files: list) -> list:
+        return [files[i:i + chunksize] for i in range(0, len(files), chunksize)]
+
+    # de cache wordt alleen door dit (coördinerende) proces gelezen en geschreven
+    cache = open_cache(args, months, logger=logger)
+    header_fraction = getattr(args, "header_fraction", None)
+    # zonder profielen en METS-gestuurde parse hangt de ALTO-parse niet van de METS af
+    stream_alto = not getattr(args, "profiles", None) and not getattr(args, "mets_guided", False)
+
+    states: List[BatchState] = []
+    for path_batch in batches:
+        batch_logger = setup_logging(logfile, verbose, batch_id=os.path.basename(path_batch))
+        batch_logger.info(f"=== Start batch: {os.path.basename(path_batch)} ===")
+        state = BatchState(path_batch, [], [], logger=batch_logger)
+        state.journal = open_file_journal(args, path_batch) if journal else None
+        if state.journal:
+            state.alto_results.update(state.journal.load())
+            if state.alto_results:
+                batch_logger.info(f"Hervatten: {len(state.alto_results)} ALTO-bestanden al verwerkt "
+                                  f"in onderbroken run")
+        states.append(state)
+
+    events = queue.Queue()
+    discovery = threading.Thread(target=discover, args=(states, events), name="discovery", daemon=True)
+    discovery.start()
+
+    file_tasks = deque()
+    total_tasks = 0
+    results = {}
+    running = {}
+    # Houd de queue van de pool gevuld, maar niet zo vol dat een
+    # reductiestap achter alle resterende file-taken moet wachten.
+    max_in_flight = max_workers * 2
+
+    def add_task(state: BatchState, kind: str, files: list, chunk_regions: dict | None = None,
+                 chunk_expected: dict | None = None):
+        nonlocal total_tasks
+        file_tasks.append((state, kind, files, chunk_regions, chunk_expected))
+        state.pending += 1
+        total_tasks += 1
+        progress.total += 1
+        progress.refresh()
+
+    def queue_mets(state: BatchState):
+        files, state.new_mets = state.new_mets, []
+        if cache:
+            state.mets_records.update((f, tuple(r)) for f, r in cache.get_many("mets", files).items())
+        todo = [f for f in files if f not in state.mets_records]
+        for chunk in chunked(todo):
+            add_task(state, "mets", chunk)
+
+    def queue_alto(state: BatchState, regions: dict, expected: dict | None = None):
+        files, state.new_alto = state.new_alto, []
+        expected = expected or {}
+        if cache:
+            settings = {f: alto_settings(header_fraction, regions.get(f), expected.get(f)) for f in files}
+            state.settings.update(settings)
+            state.alto_results.update(cache.get_many("alto", [f for f in files if f not in state.alto_results],
+                                                     settings))
+        todo = [f for f in files if f not in state.alto_results]
+        for chunk in chunked(todo):
+            add_task(state, "alto", chunk, {f: regions[f] for f in chunk if f in regions},
+                     {f: expected[f] for f in chunk if f in expected})
+
+    def on_discovered(state: BatchState, event: tuple):
+        index, kind, payload = event
+        if kind == "mets":
+            state.mets_files.append(payload)
+            state.new_mets.append(payload)
+            if len(state.new_mets) >= chunksize:
+                queue_mets(state)
+        elif kind == "alto":
+            state.alto_files.append(payload)
+            state.new_alto.append(payload)
+            if stream_alto and len(state.new_alto) >= chunksize:
+                queue_alto(state, {})
+        else:
+            wall, cpu = payload
+            state.metrics.add("discovery", wall, cpu, len(state.alto_files) + len(state.mets_files))
+            state.logger.info(f"Found {len(state.alto_files)} ALTO and {len(state.mets_files)} METS "
+                              f"in {state.batch_id}")
+            state.discovered = True
+            queue_mets(state)
+            if stream_alto:
+                queue_alto(state, {})
+            advance(state)
+
+    def drain_events(block: bool = False):
+        try:
+            event = events.get(timeout=DISCOVERY_POLL) if block else events.get_nowait()
+            while True:
+                on_discovered(states[event[0]], event)
+                event = events.get_nowait()
+        except queue.Empty:
+            pass
+
+    def advance(state: BatchState):
+        """Next step for a batch whose queued tasks are all done."""
+        if state.pending or state.failed or not state.discovered:
+            return
+        if not state.mets_done:
+            enqueue_alto(state)
+        else:
+            submit_reduction(state)
+
+    def enqueue_alto(state: BatchState):
+        state.mets_done = True
+        regions = {} if stream_alto else layout_regions(state.alto_files, state.mets_data(), args,
+                                                        logger=state.logger)
+        queue_alto(state, regions, expected_dates(state.alto_files, state.mets_data(), args))
+        if state.pending == 0:
+            submit_reduction(state)
+
+    def submit_reduction(state: BatchState):
+        nonlocal total_tasks
+        log_matcher_stats(state.matcher_hits, state.matcher_misses, logger=state.logger)
+        log_guided_stats(state.metrics, logger=state.logger)
+        fut = executor.submit(
+            analyse_batch, state.path_batch, args, state.candidates(), state.mets_data(),
+            state.alto_files, state.mets_files, logfile, verbose, metrics=state.metrics
+        )
+        running[fut] = (state, "reduce", None)
+        total_tasks += 1
+        progress.total += 1
+        progress.refresh()
+
+    with ProcessPoolExecutor(max_workers=max_workers, **worker_log_config()) as executor, \
+            tqdm(total=0, desc="Processing tasks") as progress:
+
+        while file_tasks or running or discovery.is_alive() or not events.empty():
+            drain_events()
+
+            while file_tasks and len(running) < max_in_flight:
+                state, kind, files, chunk_regions, chunk_expected = file_tasks.popleft()
+                if state.failed:
+                    continue
+                if kind == "alto":
+                    fut = executor.submit(_find_candidates_chunk, files, args, months, logfile, verbose,
+                                          state.batch_id, chunk_regions, chunk_expected)
+                else:
+                    fut = executor.submit(_extract_mets_chunk, files, args, logfile, verbose, state.batch_id)
+                running[fut] = (state, kind, files)
+
+            if not running:
+                # niets te doen tot de discovery-thread nieuwe bestanden vindt
+                drain_events(block=True)
+                continue
+
+            timeout = DISCOVERY_POLL if discovery.is_alive() or not events.empty() else None
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            for fut in done:
+                state, kind, files = running.pop(fut)
+                progress.update(1)
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    if logger and not state.failed:
+                        logger.error(f"Batch {state.path_batch} failed: {e}")
+                    state.failed = True
+                    continue
+
+                if kind == "reduce":
+                    results[state.path_batch] = result
+                    if journal:
+                        journal.record_batch(state.path_batch, result)
+                    # de discovery-thread las de ledenlijst in dit proces
+                    close_archives(state.path_batch)
+                    continue
+
+                if kind == "alto":
+                    per_file, (hits, misses), chunk_metrics = result
+                    state.alto_results.update(zip(files, per_file))
+                    state.matcher_hits += hits
+                    state.matcher_misses += misses
+                    state.metrics.merge(chunk_metrics)
+                    if state.journal:
+                        state.journal.record(dict(zip(files, per_file)))
+                    if cache:
+                        cache.put_many("alto", dict(zip(files, per_file)), state.settings)
+                else:
+                    records, chunk_metrics = result
+                    state.mets_records.update(zip(files, records))
+                    state.metrics.merge(chunk_metrics)
+                    if cache:
+                        cache.put_many("mets", {f: r for f, r in zip(files, records) if r is not None})
+
+                state.pending -= 1
+                advance(state)
+
+    if logger:
+        logger.info(f"Scheduler: {total_tasks - len(results)} file-taken voor {len(states)} batches")
+
+    if cache:
+        cache.log_stats(logger)
+        cache.close()
+
+    return results
@@ -1,22 +1,30 @@
 import logging
 import numpy as np
 import pandas as pd
-from scipy.stats import gaussian_kde
 
 
-def vpos_score(df: pd.DataFrame, logger: logging.Logger | None = None) -> pd.DataFrame:
+def vpos_score(df: pd.DataFrame, logger: logging.Logger | None = None,
+               page_relative: bool = False) -> pd.DataFrame:
     """
     Convert VPOS into a normalized score between 0–1.
     Publication dates are usually at the top of the page (low VPOS).
 
     Args:
-        df (pd.DataFrame): Must contain 'VPOS'.
+        df (pd.DataFrame): Must contain 'VPOS' (and 'PAGE_HEIGHT' for page_relative).
         logger (logging.Logger, optional): Logger for reporting.
+        page_relative (bool): Score VPOS against the page height instead of
+            the min/max over all candidates. Used in header mode, where all
+            candidates come from the header band and min/max would only
+            amplify small layout differences.
 
     Returns:
         pd.DataFrame: DataFrame with new column 'vpos_score'.
     """
     try:
+        if page_relative and "PAGE_HEIGHT" in df and df["PAGE_HEIGHT"].notna().all():
+            df["vpos_score"] = np.round(1 - df["VPOS"] / df["PAGE_HEIGHT"], 2)
+            return df
+
         vmin, vmax = df["VPOS"].min(), df["VPOS"].max()
         if vmin == vmax:
             df["vpos_score"] = 1.0
@@ -33,17 +41,36 @@ def vpos_score(df: pd.DataFrame, logger: logging.Logger | None = None) -> pd.Dat
     return df
 
 
-def kde_gaussian(df: pd.DataFrame, logger: logging.Logger | None = None) -> pd.DataFrame:
+def kde_gaussian(df: pd.DataFrame, logger: logging.Logger | None = None, backend: str = "auto",
+                 max_exact: int = 5000, grid_size: int = 256, sample_size: int | None = None) -> pd.DataFrame:
     """
     Apply Gaussian KDE to detect density hotspots of candidate dates.
 
+    Backends:
+    - 'exact': scipy's gaussian_kde evaluated at every candidate, O(n²).
+    - 'grid': candidates are binned on a ``grid_size`` × ``grid_size`` grid
+      and convolved (FFT) with the same Gaussian kernel (Scott bandwidth, full
+      covariance) that gaussian_kde uses; scores are interpolated back to the
+      candidates, O(n + grid² log grid). Normalized scores differ from the
+      exact ones by at most 0.01, one rounding step (see README).
+    - 'auto': 'exact' up to ``max_exact`` candidates, 'grid' above.
+
+    With ``sample_size`` the exact backend fits the density on a random
+    subset of at most that many candidates (evaluation stays on all of them).
+
     Args:
         df (pd.DataFrame): Must contain 'HPOS' and 'VPOS'.
         logger (logging.Logger, optional): Logger for reporting.
+        backend (str): 'auto', 'exact' or 'grid'.
+        max_exact (int): Largest candidate count for the exact backend in 'auto'.
+        grid_size (int): Grid resolution of the 'grid' backend.
+        sample_size (int, optional): Fit the exact KDE on at most this many points.
 
     Returns:
         pd.DataFrame: DataFrame with new column 'kde_score'.
     """
+    from scipy.stats import gaussian_kde  # scipy alleen laden als de KDE echt draait
+
     try:
         if df.empty:
             df["kde_score"] = []
@@ -51,8 +78,21 @@ def kde_gaussian(df: pd.DataFrame, logger: logging.Logger | None = None) -> pd.D
                 logger.warning("Empty DataFrame provided to kde_gaussian.")
             return df
 
-        xy = np.vstack([df["HPOS"], df["VPOS"]])
-        z = gaussian_kde(xy)(xy)
+        xy = np.vstack([df["HPOS"], df["VPOS"]]).astype(float)
+        if backend == "auto":
+            backend = "exact" if xy.shape[1] <= max_exact else "grid"
+        if logger:
+            logger.debug(f"kde_gaussian: backend={backend}, n={xy.shape[1]}")
+
+        if backend == "grid":
+            z = _kde_grid(xy, grid_size)
+        else:
+            fit = xy
+            if sample_size and xy.shape[1] > sample_size:
+                rng = np.random.default_rng(0)  # vaste seed: reproduceerbare scores
+                fit = xy[:, rng.choice(xy.shape[1], size=sample_size, replace=False)]
+            z = gaussian_kde(fit)(xy)
+
         if z.max() == z.min():
             df["kde_score"] = 0.5
             if logger:
@@ -65,3 +105,74 @@ def kde_gaussian(df: pd.DataFrame, logger: logging.Logger | None = None) -> pd.D
             logger.error(f"Error calculating kde_gaussian: {e}")
         df["kde_score"] = 0.0
     return df
+
+
+def _kde_grid(xy: np.ndarray, grid_size: int) -> np.ndarray:
+    """
+    Binned Gaussian KDE evaluated at the points in ``xy`` (shape 2 × n).
+
+    The result is proportional to gaussian_kde(xy)(xy); the constant factor
+    does not matter because the scores are min-max normalized.
+    """
+    from scipy.stats import gaussian_kde
+    from scipy.signal import fftconvolve
+    from scipy.ndimage import map_coordinates
+
+    # bandbreedte/covariantie exact zoals gaussian_kde (Scott's rule)
+    covariance = gaussian_kde(xy).covariance
+    inv_cov = np.linalg.inv(covariance)
+    sigma = np.sqrt(np.diag(covariance))
+
+    lo = xy.min(axis=1) - 3 * sigma
+    hi = xy.max(axis=1) + 3 * sigma
+    cell = (hi - lo) / (grid_size - 1)
+
+    # lineaire binning: elk punt verdeelt zijn gewicht over de 4 omliggende cellen
+    pos = (xy - lo[:, None]) / cell[:, None]
+    base = np.floor(pos).astype(int).clip(0, grid_size - 2)
+    frac = pos - base
+    grid = np.zeros((grid_size, grid_size))
+    for dx in (0, 1):
+        for dy in (0, 1):
+            weight = (frac[0] if dx else 1 - frac[0]) * (frac[1] if dy else 1 - frac[1])
+            np.add.at(grid, (base[0] + dx, base[1] + dy), weight)
+
+    # kernel op celoffsets tot 4 sigma (maximaal de hele grid)
+    reach = np.minimum(np.ceil(4 * sigma / cell).astype(int), grid_size - 1)
+    ox = np.arange(-reach[0], reach[0] + 1) * cell[0]
+    oy = np.arange(-reach[1], reach[1] + 1) * cell[1]
+    dx, dy = np.meshgrid(ox, oy, indexing="ij")
+    d2 = inv_cov[0, 0] * dx ** 2 + 2 * inv_cov[0, 1] * dx * dy + inv_cov[1, 1] * dy ** 2
+    kernel = np.exp(-0.5 * d2)
+
+    density = fftconvolve(grid, kernel, mode="same")
+    return map_coordinates(density, pos, order=1, mode="nearest")
+
+
+def profile_hotspot_score(df: pd.DataFrame, profile: dict, logger: logging.Logger | None = None) -> pd.DataFrame:
+    """
+    Score candidates by their distance to a learned date hotspot.
+
+    Used instead of kde_gaussian when a layout profile exists for the title:
+    it does not need many points, and it is not distorted when only the
+    learned region of the page was parsed.
+
+    Args:
+        df (pd.DataFrame): Must contain 'HPOS' and 'VPOS'.
+        profile (dict): Layout profile with 'peak' and 'spread' ([HPOS, VPOS]).
+        logger (logging.Logger, optional): Logger for reporting.
+
+    Returns:
+        pd.DataFrame: DataFrame with new column 'kde_score'.
+    """
+    try:
+        (peak_h, peak_v), (spread_h, spread_v) = profile["peak"], profile["spread"]
+        # kernel twee keer zo breed als de geleerde spreiding: kandidaten
+        # binnen de hotspot scoren hoog, kandidaten ernaast vallen snel af
+        d2 = ((df["HPOS"] - peak_h) / (2 * spread_h)) ** 2 + ((df["VPOS"] - peak_v) / (2 * spread_v)) ** 2
+        df["kde_score"] = np.round(np.exp(-0.5 * d2), 2)
+    except Exception as e:
+        if logger:
+            logger.error(f"Error calculating profile_hotspot_score: {e}")
+        df["kde_score"] = 0.0
+    return df
@@ -0,0 +1,470 @@
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Set
+
+from .utils import setup_logging, start_log_listener, worker_log_config, MONTHS
+
+MANIFEST_NAME = "manifest.json"
+# hoe vaak (seconden) een worker zijn claim ververst
+HEARTBEAT = 30
+# hoe vaak (seconden) een wachtende worker opnieuw probeert te claimen
+POLL = 15
+
+
+def _write_json(path: str, data):
+    """Write JSON atomically: other hosts see either nothing or the whole file."""
+    tmp_path = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def plan_shards(alto_files: List[str], mets_files: List[str], files_per_shard: int = 0) -> List[dict]:
+    """
+    Split the files of a batch into shards of ``files_per_shard`` ALTO files
+    (0 = one shard). Every shard gets the METS files of its own issues, so a
+    shard can pick the layout profile of each ALTO file; METS files without
+    ALTO go into the last shard. METS files keep their index in the batch,
+    so the merged records are in discovery order again.
+
+    Returns list of dicts: {"alto": [paths], "mets": [[index, path], ...]}
+    """
+    size = files_per_shard if files_per_shard > 0 else max(1, len(alto_files))
+    mets_by_id = {os.path.basename(f).strip("_mets.xml"): (i, f) for i, f in enumerate(mets_files)}
+    shards = []
+    for start in range(0, len(alto_files), size):
+        alto = alto_files[start:start + size]
+        ids = (os.path.basename(f).rstrip("_alto_00001.xml") for f in alto)
+        shards.append({"alto": alto, "mets": [list(mets_by_id.pop(i)) for i in ids if i in mets_by_id]})
+    if not shards:
+        shards.append({"alto": [], "mets": []})
+    shards[-1]["mets"].extend(sorted(list(entry) for entry in mets_by_id.values()))
+    return shards
+
+
+def plan(manifest_dir: str, batches: List[str], settings: dict, files_per_shard: int = 0,
+         logger=None) -> dict:
+    """
+    Planner: list the files of every batch and write the manifest and one
+    file per shard to ``manifest_dir`` (on storage shared by all workers).
+
+    Returns the manifest.
+    """
+    from .getfiles import get_files
+    from .archive import is_archive, archive_batch_path, close_archives
+    from .metrics import StageMetrics
+
+    if os.path.exists(os.path.join(manifest_dir, MANIFEST_NAME)):
+        raise FileExistsError(f"{manifest_dir} bevat al een manifest")
+    for sub in ("shards", "claims", "results", "failed", "logs"):
+        os.makedirs(os.path.join(manifest_dir, sub), exist_ok=True)
+
+    manifest = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "settings": settings, "batches": []}
+    for b, path in enumerate(batches):
+        path_batch = os.path.abspath(archive_batch_path(path) if is_archive(path) else path)
+        metrics = StageMetrics()
+        with metrics.stage("discovery") as counter:
+            alto_files, mets_files = get_files(path_batch, logger=logger)
+            counter["items"] = len(alto_files) + len(mets_files)
+        close_archives(path_batch)
+        shard_ids = []
+        for s, shard in enumerate(plan_shards(alto_files, mets_files, files_per_shard)):
+            shard_id = f"{b:05d}-{s:05d}"
+            _write_json(os.path.join(manifest_dir, "shards", f"{shard_id}.json"), dict(shard, batch=path_batch))
+            shard_ids.append(shard_id)
+        manifest["batches"].append({"path": path_batch, "reduce": f"{b:05d}-reduce", "shards": shard_ids,
+                                    "metrics": metrics.as_dict()})
+        if logger:
+            logger.info(f"Batch {os.path.basename(path_batch)}: {len(shard_ids)} shards")
+
+    _write_json(os.path.join(manifest_dir, MANIFEST_NAME), manifest)
+    return manifest
+
+
+class ShardStore:
+    """
+    Claims and results of a sharded run in a manifest directory.
+
+    A task (shard or batch reduction) is claimed by creating
+    ``claims/<task>.lock`` with O_CREAT|O_EXCL, which only one process can
+    do. While it works on a task, a worker touches its lock every HEARTBEAT
+    seconds; a lock that has not been touched for ``stale_after`` seconds
+    belongs to a dead worker and may be taken over. The age of a lock is
+    measured with the clock of the file server (the mtime of a probe file
+    written just before), not with the clock of this machine. A task is
+    done when ``results/<task>.json`` exists (written atomically); a failed
+    attempt leaves ``failed/<task>.json`` until the task succeeds.
+    """
+
+    def __init__(self, manifest_dir: str, stale_after: float = 600):
+        self.dir = manifest_dir
+        self.stale_after = stale_after
+        self.owner = f"{socket.gethostname()}-{os.getpid()}"
+        self.manifest = _read_json(os.path.join(manifest_dir, MANIFEST_NAME))
+
+    def _lock(self, task: str) -> str:
+        return os.path.join(self.dir, "claims", f"{task}.lock")
+
+    def result_path(self, task: str) -> str:
+        return os.path.join(self.dir, "results", f"{task}.json")
+
+    def done(self, task: str) -> bool:
+        return os.path.exists(self.result_path(task))
+
+    def failed_path(self, task: str) -> str:
+        return os.path.join(self.dir, "failed", f"{task}.json")
+
+    def _now(self) -> float:
+        """Current time on the file server: the mtime of a probe file written now."""
+        probe = os.path.join(self.dir, "claims", f".clock-{self.owner}")
+        with open(probe, "w"):
+            pass
+        try:
+            return os.stat(probe).st_mtime
+        finally:
+            os.remove(probe)
+
+    def _stale(self, path: str) -> bool:
+        try:
+            return self._now() - os.stat(path).st_mtime > self.stale_after
+        except FileNotFoundError:
+            return False
+
+    def claim(self, task: str) -> bool:
+        """Try to claim ``task``; False if it is done or claimed by a live worker."""
+        if self.done(task):
+            return False
+        lock = self._lock(task)
+        for _ in range(2):
+            try:
+                fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self._stale(lock):
+                    return False
+                # claim van een gestopte worker: wegzetten (rename is atomair, maar één proces lukt het)
+                stale = f"{lock}.stale-{self.owner}"
+                try:
+                    os.rename(lock, stale)
+                except OSError:
+                    return False
+                if not self._stale(stale):
+                    # intussen door een ander vernieuwd: teruggeven
+                    os.rename(stale, lock)
+                    return False
+                os.remove(stale)
+                continue
+            with os.fdopen(fd, "w") as f:
+                f.write(self.owner)
+            if self.done(task):
+                self.release(task)
+                return False
+            return True
+        return False
+
+    def release(self, task: str):
+        try:
+            os.remove(self._lock(task))
+        except FileNotFoundError:
+            pass
+
+    def heartbeat(self, task: str) -> threading.Event:
+        """Touch the lock of ``task`` until the returned event is set."""
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(HEARTBEAT):
+                try:
+                    os.utime(self._lock(task))
+                except OSError:
+                    pass
+        threading.Thread(target=beat, daemon=True).start()
+        return stop
+
+    def finish(self, task: str, result):
+        _write_json(self.result_path(task), result)
+        try:
+            os.remove(self.failed_path(task))
+        except FileNotFoundError:
+            pass
+        self.release(task)
+
+    def fail(self, task: str, error: str):
+        """Record a failed attempt (``failed/<task>.json`` counts the attempts) and release the claim."""
+        try:
+            attempts = _read_json(self.failed_path(task))["attempts"]
+        except (OSError, ValueError, KeyError):
+            attempts = 0
+        os.makedirs(os.path.dirname(self.failed_path(task)), exist_ok=True)
+        _write_json(self.failed_path(task), {"owner": self.owner, "error": error, "attempts": attempts + 1,
+                                             "time": time.strftime("%Y-%m-%dT%H:%M:%S")})
+        self.release(task)
+
+    def failures(self) -> Dict[str, dict]:
+        """{task: failure record} of the tasks whose last attempt failed."""
+        failures = {}
+        for task in self.missing():
+            try:
+                failures[task] = _read_json(self.failed_path(task))
+            except (OSError, ValueError):
+                pass
+        return failures
+
+    def next_task(self, skip: Set[str] = frozenset()) -> tuple | None:
+        """
+        Claim the next task: first any unfinished shard, then the reduction
+        of a batch whose shards are all done. Tasks in ``skip`` (e.g. the
+        tasks that already failed in this worker) are not claimed.
+
+        Returns (kind, batch entry, task id) or None if nothing can be claimed now.
+        """
+        for batch in self.manifest["batches"]:
+            for shard_id in batch["shards"]:
+                if shard_id not in skip and self.claim(shard_id):
+                    return "shard", batch, shard_id
+        for batch in self.manifest["batches"]:
+            if batch["reduce"] not in skip and all(self.done(s) for s in batch["shards"]) \
+                    and self.claim(batch["reduce"]):
+                return "reduce", batch, batch["reduce"]
+        return None
+
+    def missing(self) -> List[str]:
+        """Tasks without a result."""
+        tasks = [t for batch in self.manifest["batches"] for t in batch["shards"] + [batch["reduce"]]]
+        return [t for t in tasks if not self.done(t)]
+
+    def reachable(self, skip: Set[str] = frozenset()) -> List[str]:
+        """
+        Tasks without a result that a worker skipping ``skip`` can still
+        run: not skipped, and for a reduction no skipped shard.
+        """
+        blocked = set(skip)
+        for batch in self.manifest["batches"]:
+            if blocked.intersection(batch["shards"]):
+                blocked.add(batch["reduce"])
+        return [t for t in self.missing() if t not in blocked]
+
+
+def run_shard(store: ShardStore, shard_id: str, args, months: dict, logfile: str, verbose: bool) -> dict:
+    """Extraction of one shard: METS records and ALTO candidates, as a JSON-serializable dict."""
+    from .extract import read_mets_records, mets_records_to_dict
+    from .metrics import StageMetrics
+    from .runner import _find_candidates_chunk, layout_regions, expected_dates
+
+    shard = _read_json(os.path.join(store.dir, "shards", f"{shard_id}.json"))
+    batch_id = os.path.basename(shard["batch"])
+    logger = setup_logging(logfile, verbose, batch_id=batch_id)
+    metrics = StageMetrics()
+
+    records = read_mets_records([path for _, path in shard["mets"]], logger=logger, args=args, metrics=metrics)
+    dict_mets_dates = mets_records_to_dict(records)
+    regions = layout_regions(shard["alto"], dict_mets_dates, args, logger=logger)
+    expected = expected_dates(shard["alto"], dict_mets_dates, args)
+    per_file, (hits, misses), chunk_metrics = _find_candidates_chunk(shard["alto"], args, months, logfile, verbose,
+                                                                     batch_id, regions, expected)
+    metrics.merge(chunk_metrics)
+    return {"alto": shard["alto"], "candidates": per_file,
+            "mets": [[index, path, record] for (index, path), record in zip(shard["mets"], records)],
+            "matcher": [hits, misses], "metrics": metrics.as_dict()}
+
+
+def run_reduce(store: ShardStore, batch: dict, args, logfile: str, verbose: bool) -> dict:
+    """Batch reduction: merge the shard results in file order and analyse the batch."""
+    from .extract import mets_records_to_dict
+    from .metrics import StageMetrics
+    from .runner import analyse_batch, log_matcher_stats, log_guided_stats
+
+    metrics = StageMetrics(batch["metrics"])
+    alto_files, candidates, mets, hits, misses = [], [], [], 0, 0
+    for shard_id in batch["shards"]:
+        part = _read_json(store.result_path(shard_id))
+        alto_files.extend(part["alto"])
+        for per_file in part["candidates"]:
+            candidates.extend(tuple(c) for c in per_file)
+        mets.extend(part["mets"])
+        hits, misses = hits + part["matcher"][0], misses + part["matcher"][1]
+        metrics.merge(part["metrics"])
+    mets.sort(key=lambda entry: entry[0])
+
+    logger = setup_logging(logfile, verbose, batch_id=os.path.basename(batch["path"]))
+    log_matcher_stats(hits, misses, logger=logger)
+    log_guided_stats(metrics, logger=logger)
+    result = analyse_batch(batch["path"], args, candidates,
+                           mets_records_to_dict([tuple(r) if r is not None else None for _, _, r in mets]),
+                           alto_files, [path for _, path, _ in mets], logfile, verbose, metrics=metrics)
+    return {"result": list(result)}
+
+
+def work(manifest_dir: str, stale_after: float = 600, verbose: bool = False, logfile: str | None = None,
+         wait: bool = True) -> int:
+    """
+    Worker loop: claim and process tasks.
+
+    A task that fails is recorded (see ShardStore.fail) and not tried again
+    by this worker, so it moves on to the rest of the manifest; another
+    worker or a later run may retry it. With ``wait`` the worker keeps
+    polling every POLL seconds while tasks it can run are still missing:
+    claims of stopped workers become stale and the last batch reductions
+    are run by the workers that are left. Without ``wait`` it stops as soon
+    as nothing can be claimed.
+
+    Returns number of tasks processed by this worker.
+    """
+    store = ShardStore(manifest_dir, stale_after=stale_after)
+    args = argparse.Namespace(**store.manifest["settings"])
+    months = dict(MONTHS)
+    logfile = logfile or os.path.join(manifest_dir, "logs", store.owner, "shard.log")
+    logger = setup_logging(logfile, verbose)
+
+    processed = 0
+    failed = set()
+    waiting = False
+    while True:
+        task = store.next_task(skip=failed)
+        if task is None:
+            remaining = store.reachable(skip=failed) if wait else []
+            if not remaining:
+                break
+            if not waiting:
+                logger.info(f"{store.owner}: wachten op {len(remaining)} taken van andere workers")
+            waiting = True
+            time.sleep(POLL)
+            continue
+        waiting = False
+        kind, batch, task_id = task
+        logger.info(f"{store.owner}: {kind} {task_id} ({os.path.basename(batch['path'])})")
+        beat = store.heartbeat(task_id)
+        try:
+            if kind == "shard":
+                result = run_shard(store, task_id, args, months, logfile, verbose)
+            else:
+                result = run_reduce(store, batch, args, logfile, verbose)
+            store.finish(task_id, result)
+            processed += 1
+        except Exception as e:
+            # claim vrijgeven, zodat een andere worker (of een volgende run) het opnieuw probeert;
+            # deze worker slaat de taak verder over
+            logger.error(f"Taak {task_id} mislukt: {e}")
+            failed.add(task_id)
+            store.fail(task_id, f"{type(e).__name__}: {e}")
+        finally:
+            beat.set()
+    return processed
+
+
+def merge(manifest_dir: str, logger) -> int | None:
+    """
+    Combine the batch results into one run summary CSV and run profile
+    (in ./reports, like a normal run).
+
+    Returns the total number of potential errors, or None if tasks are missing.
+    """
+    from .cli import write_summary
+
+    store = ShardStore(manifest_dir)
+    missing = store.missing()
+    if missing:
+        failures = store.failures()
+        for task, failure in failures.items():
+            logger.error(f"Taak {task} mislukt ({failure.get('attempts', 1)}x, laatst door "
+                         f"{failure.get('owner')}): {failure.get('error')}")
+        logger.error(f"Nog {len(missing)} taken zonder resultaat, waarvan {len(failures)} mislukt "
+                     f"(bv. {', '.join(missing[:5])}); start opnieuw workers, claims van gestopte workers "
+                     f"worden na de stale-tijd overgenomen")
+        return None
+    results = [tuple(_read_json(store.result_path(b["reduce"]))["result"]) for b in store.manifest["batches"]]
+    return write_summary(results, logger)
+
+
+def main(argv: List[str] | None = None):
+    from .cli import load_config
+
+    parser = argparse.ArgumentParser(
+        prog="python -m publicatiedatumcontrole.shard",
+        description="Verdeel een run over meerdere processen of machines via een manifest op gedeelde opslag"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_plan = sub.add_parser("plan", help="Maak het manifest met de shards")
+    p_plan.add_argument("manifest", help="Map op gedeelde opslag voor manifest, claims en resultaten")
+    p_plan.add_argument("batches", nargs="+", help="Batchmappen of .zip/.tar-archieven")
+    p_plan.add_argument("--files-per-shard", type=int, default=0,
+                        help="Aantal ALTO-bestanden per shard (default 0 = één shard per batch)")
+    p_plan.add_argument("-o", "--output", help="Hoofdmap voor rapporten (moet voor alle workers bereikbaar zijn)")
+    p_plan.add_argument("--threshold", type=float)
+    p_plan.add_argument("--date-tolerance", type=int)
+    p_plan.add_argument("--header-fraction", type=float)
+    p_plan.add_argument("--profiles")
+    p_plan.add_argument("--kde-backend", choices=["auto", "exact", "grid"])
+    p_plan.add_argument("--prefetch", type=int)
+    p_plan.add_argument("--mets-guided", action="store_true")
+    p_plan.add_argument("--alto-parser", choices=["lxml", "expat"])
+
+    p_work = sub.add_parser("work", help="Claim en verwerk shards tot er niets meer te doen is")
+    p_work.add_argument("manifest")
+    p_work.add_argument("--processes", type=int, default=1, help="Aantal worker-processen op deze machine")
+    p_work.add_argument("--stale-after", type=float, default=600,
+                        help="Seconden zonder heartbeat waarna een claim van een andere worker vervalt (default 600)")
+    p_work.add_argument("--no-wait", action="store_true",
+                        help="Stoppen zodra er niets te claimen is, in plaats van te wachten tot taken van "
+                             "andere (mogelijk gestopte) workers klaar of overgenomen zijn")
+    p_work.add_argument("--verbose", action="store_true")
+
+    p_merge = sub.add_parser("merge", help="Schrijf de gecombineerde samenvatting en het run-profiel")
+    p_merge.add_argument("manifest")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "plan":
+        config = load_config("config.yaml")
+        defaults = {"threshold": 0.8, "date_tolerance": 2, "header_fraction": None, "profiles": None,
+                    "profile_margin": 200, "profile_min_hits": 0.5, "kde_backend": "auto", "kde_max_exact": 5000,
+                    "kde_grid_size": 256, "kde_sample": None, "snippet_workers": 4, "prefetch": 0, "prefetch_memory": 256,
+                    "mets_guided": False, "alto_parser": "lxml", "output": "html-reports"}
+        settings = {key: getattr(args, key, None) or config.get(key, default) for key, default in defaults.items()}
+        # andere machines hebben een andere werkmap
+        settings["output"] = os.path.abspath(settings["output"])
+        if settings["profiles"]:
+            settings["profiles"] = os.path.abspath(settings["profiles"])
+        logger = setup_logging(os.path.join(args.manifest, "logs", "plan.log"))
+        manifest = plan(args.manifest, args.batches, settings, files_per_shard=args.files_per_shard, logger=logger)
+        tasks = sum(len(b["shards"]) + 1 for b in manifest["batches"])
+        print(f"{len(manifest['batches'])} batches, {tasks} taken in {os.path.abspath(args.manifest)}")
+
+    elif args.command == "work":
+        # één map met logs per worker-machine/proces: meerdere machines schrijven niet in hetzelfde bestand
+        logfile = os.path.join(args.manifest, "logs", f"{socket.gethostname()}-{os.getpid()}", "shard.log")
+        start_log_listener(logfile, args.verbose)
+        if args.processes <= 1:
+            processed = work(args.manifest, stale_after=args.stale_after, verbose=args.verbose, logfile=logfile,
+                             wait=not args.no_wait)
+        else:
+            with ProcessPoolExecutor(max_workers=args.processes, **worker_log_config()) as executor:
+                futures = [executor.submit(work, args.manifest, args.stale_after, args.verbose, logfile,
+                                           not args.no_wait)
+                           for _ in range(args.processes)]
+                processed = sum(f.result() for f in futures)
+        print(f"{processed} taken verwerkt")
+
+    elif args.command == "merge":
+        logger = setup_logging(os.path.join(args.manifest, "logs", "merge.log"))
+        total_errors = merge(args.manifest, logger)
+        if total_errors is None:
+            sys.exit(2)
+        sys.exit(1 if total_errors else 0)
+
+
+if __name__ == "__main__":
+    main()
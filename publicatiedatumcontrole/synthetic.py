@@ -0,0 +1,170 @@
+import os
+import random
+from typing import Dict, List, Sequence
+from xml.sax.saxutils import escape
+
+from .utils import MONTHS
+
+WORDS = ("de het een van en in op dat is voor met niet aan maar er te zijn bij ook als dan nog "
+         "wel naar uit door over om tot zich zoo heeft worden hebben deze onder").split()
+
+# OCR-verwisselingen in maandnamen en cijfers
+OCR_CONFUSIONS = {"e": "c", "a": "o", "n": "u", "m": "rn", "i": "l", "r": "f", "b": "h",
+                  "1": "l", "0": "o"}
+
+
+def issue_id(index: int) -> str:
+    """
+    Synthetic issue ID. Starts and ends with characters that survive the
+    rstrip/strip of the filename suffixes in the extraction code.
+    """
+    return f"SYN_{index:08d}_P"
+
+
+def ocr_noise(text: str, rng: random.Random, rate: float) -> str:
+    """Apply one OCR confusion to ``text`` with probability ``rate``."""
+    if rate <= 0 or rng.random() >= rate:
+        return text
+    positions = [i for i, c in enumerate(text) if c in OCR_CONFUSIONS]
+    if not positions:
+        return text
+    i = rng.choice(positions)
+    return text[:i] + OCR_CONFUSIONS[text[i]] + text[i + 1:]
+
+
+def _text_block(words: List[tuple]) -> str:
+    """TextBlock with one TextLine for (content, vpos, hpos) words."""
+    vpos = words[0][1]
+    strings = "<SP/>".join(
+        f'<String CONTENT="{escape(c)}" VPOS="{v}" HPOS="{h}" WIDTH="{len(c) * 22}" HEIGHT="30"/>'
+        for c, v, h in words
+    )
+    return (f'<TextBlock VPOS="{vpos}" HPOS="100" HEIGHT="40" WIDTH="2200">'
+            f'<TextLine VPOS="{vpos}" HPOS="100" HEIGHT="30" WIDTH="2200">{strings}</TextLine></TextBlock>')
+
+
+def alto_xml(words: List[tuple], page_size: tuple) -> str:
+    """ALTO v2 document for a single page with the given words, grouped per line."""
+    lines: Dict[int, list] = {}
+    for word in words:
+        lines.setdefault(word[1], []).append(word)
+    blocks = "".join(_text_block(sorted(line, key=lambda w: w[2])) for _, line in sorted(lines.items()))
+    return ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<alto xmlns="http://www.loc.gov/standards/alto/ns-v2#"><Layout>'
+            f'<Page ID="P1" HEIGHT="{page_size[1]}" WIDTH="{page_size[0]}"><PrintSpace>'
+            f'{blocks}</PrintSpace></Page></Layout></alto>')
+
+
+def mets_xml(title: str, edition: str, date: str, pages: int, articles: int) -> str:
+    """METS document with an issue-level MODS section, article MODS, fileSec and structMap."""
+    article_mods = "".join(
+        f'<mets:dmdSec ID="DMD{k + 2}"><mets:mdWrap MDTYPE="MODS"><mets:xmlData><mods:mods>'
+        f'<mods:titleInfo><mods:title>Artikel {k + 1}</mods:title></mods:titleInfo>'
+        f'</mods:mods></mets:xmlData></mets:mdWrap></mets:dmdSec>'
+        for k in range(articles)
+    )
+    files = "".join(
+        f'<mets:file ID="FILE{k:04d}" MIMETYPE="text/xml"><mets:FLocat xlink:href="file_{k:04d}.xml"/></mets:file>'
+        for k in range(pages * 4)
+    )
+    struct = "".join(
+        f'<mets:div TYPE="page" ORDER="{k + 1}"><mets:fptr FILEID="FILE{k:04d}"/></mets:div>'
+        for k in range(pages)
+    )
+    return ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<mets:mets xmlns:mets="http://www.loc.gov/METS/" xmlns:mods="http://www.loc.gov/mods/v3" '
+            'xmlns:xlink="http://www.w3.org/1999/xlink">'
+            '<mets:dmdSec ID="DMD1"><mets:mdWrap MDTYPE="MODS"><mets:xmlData><mods:mods>'
+            f'<mods:titleInfo><mods:title>{escape(title)}</mods:title></mods:titleInfo>'
+            f'<mods:originInfo><mods:edition>{escape(edition)}</mods:edition></mods:originInfo>'
+            f'<mods:part><mods:date>{date}</mods:date></mods:part>'
+            '</mods:mods></mets:xmlData></mets:mdWrap></mets:dmdSec>'
+            f'{article_mods}<mets:fileSec><mets:fileGrp USE="text">{files}</mets:fileGrp></mets:fileSec>'
+            f'<mets:structMap TYPE="logical">{struct}</mets:structMap></mets:mets>')
+
+
+def write_jp2(path: str, words: List[tuple], page_size: tuple):
+    """Tiny JPEG 2000 access image: a blank page with a dark box per word."""
+    from PIL import Image, ImageDraw
+
+    img = Image.new("L", page_size, 235)
+    draw = ImageDraw.Draw(img)
+    for content, vpos, hpos in words:
+        draw.rectangle((hpos, vpos, hpos + len(content) * 22, vpos + 30), fill=40)
+    img.save(path, quality_mode="rates", quality_layers=[40], irreversible=True)
+
+
+def generate_batch(out_dir: str, issues: int = 100, titles: Sequence[str] = ("Het Nieuws", "De Courant"),
+                   edition: str = "Dag", date_positions: Sequence[tuple] | None = None,
+                   page_size: tuple = (2400, 3600), body_words: int = 2000, distractor_rate: float = 0.02,
+                   noise: float = 0.1, error_rate: float = 0.1, mets_pages: int = 8, mets_articles: int = 20,
+                   jp2: bool = False, seed: int = 0) -> Dict[str, int]:
+    """
+    Write a synthetic batch with one directory per issue:
+    ``<issue>/alto/<issue>_00001_alto.xml``, ``<issue>/<issue>_mets.xml`` and,
+    with ``jp2``, ``<issue>/access/<issue>_00001_access.jp2``.
+
+    Issues cycle through ``titles``; each title prints its date as
+    'day month year' at its own ``date_positions`` entry (VPOS, HPOS),
+    jittered per issue, above ``body_words`` words of running text that also
+    contains stray dates (``distractor_rate`` per line). ``noise`` is the
+    probability of an OCR confusion per date token, ``error_rate`` the
+    fraction of issues whose METS date is one day off the printed date.
+
+    Returns dict with counts: issues, errors, alto_strings.
+    """
+    rng = random.Random(seed)
+    month_names = list(MONTHS)
+    if date_positions is None:
+        date_positions = [(220 + 60 * (t % 3), 300 + 500 * (t % 2)) for t in range(len(titles))]
+
+    width, height = page_size
+    words_per_line = 12
+    line_height = 45
+    errors = 0
+    strings = 0
+    os.makedirs(out_dir, exist_ok=True)
+
+    for index in range(issues):
+        iid = issue_id(index)
+        t = index % len(titles)
+        year, month, day = rng.randint(1850, 1950), rng.randint(1, 12), rng.randint(2, 27)
+
+        printed_day = day
+        if rng.random() < error_rate:
+            printed_day = day + 1
+            errors += 1
+
+        vpos, hpos = date_positions[t]
+        vpos += rng.randint(-10, 10)
+        hpos += rng.randint(-20, 20)
+        words = [(titles[t].upper(), 100, 400),
+                 (ocr_noise(str(printed_day), rng, noise), vpos, hpos),
+                 (ocr_noise(month_names[month - 1], rng, noise), vpos, hpos + 70),
+                 (ocr_noise(str(year), rng, noise), vpos, hpos + 300)]
+
+        top = vpos + 120
+        usable = max(1, (height - top - 100) // line_height)
+        for k in range(body_words):
+            line = k // words_per_line % usable
+            v = top + line * line_height
+            h = 100 + (k % words_per_line) * (width - 300) // words_per_line
+            if k % words_per_line == 0 and rng.random() < distractor_rate:
+                words += [(str(rng.randint(1, 28)), v, h),
+                          (rng.choice(month_names), v, h + 70),
+                          (str(rng.randint(1850, 1950)), v, h + 300)]
+            else:
+                words.append((rng.choice(WORDS), v, h + 150 * (k % 2)))
+        strings += len(words)
+
+        issue_dir = os.path.join(out_dir, iid)
+        os.makedirs(os.path.join(issue_dir, "alto"), exist_ok=True)
+        with open(os.path.join(issue_dir, "alto", f"{iid}_00001_alto.xml"), "w", encoding="utf-8") as f:
+            f.write(alto_xml(words, page_size))
+        with open(os.path.join(issue_dir, f"{iid}_mets.xml"), "w", encoding="utf-8") as f:
+            f.write(mets_xml(titles[t], edition, f"{year}-{month:02d}-{day:02d}", mets_pages, mets_articles))
+        if jp2:
+            os.makedirs(os.path.join(issue_dir, "access"), exist_ok=True)
+            write_jp2(os.path.join(issue_dir, "access", f"{iid}_00001_access.jp2"), words, page_size)
+
+    return {"issues": issues, "errors": errors, "alto_strings": strings}
@@ -1,6 +1,165 @@
+import atexit
 import logging
+import logging.handlers
+import multiprocessing
 import os
 import sys
+import time
+from collections import OrderedDict
+
+# Nederlandse maandnamen → maandnummer
+MONTHS = {
+    "januari": "01", "februari": "02", "maart": "03", "april": "04",
+    "mei": "05", "juni": "06", "juli": "07", "augustus": "08",
+    "september": "09", "oktober": "10", "november": "11", "december": "12"
+}
+
+
+LOGGER_NAME = "publicatiedatumcontrole"
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s - %(message)s"
+
+# queue naar de log-listener in het hoofdproces (None = elk proces schrijft zelf)
+_LOG_QUEUE = None
+_LOG_VERBOSE = False
+_LOG_HANDLERS = ()
+
+
+class BufferedFileHandler(logging.FileHandler):
+    """
+    FileHandler that does not flush after every record: the buffer is
+    flushed at most every ``flush_interval`` seconds, for records of level
+    ERROR and higher, and when the handler is closed.
+    """
+
+    def __init__(self, filename: str, flush_interval: float = 1.0):
+        super().__init__(filename, mode="a", encoding="utf-8")
+        self.flush_interval = flush_interval
+        self._last_flush = time.monotonic()
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+            if record.levelno >= logging.ERROR or time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+                self._last_flush = time.monotonic()
+        except Exception:
+            self.handleError(record)
+
+
+class BatchRoutingHandler(logging.Handler):
+    """
+    Write records of logger ``publicatiedatumcontrole.<batch_id>`` to ``<logdir>/<batch_id>.log``.
+
+    At most ``max_open`` batch logs are kept open; the least recently used
+    one is closed (and reopened in append mode when needed), so a long
+    watch run does not keep a file open for every batch it has seen.
+    """
+
+    def __init__(self, log_dir: str, max_open: int = 64):
+        super().__init__(logging.DEBUG)
+        self.log_dir = log_dir
+        self.max_open = max_open
+        self.handlers = OrderedDict()
+
+    def emit(self, record: logging.LogRecord):
+        prefix = LOGGER_NAME + "."
+        if not record.name.startswith(prefix):
+            return
+        batch_id = record.name[len(prefix):]
+        if batch_id not in self.handlers:
+            handler = BufferedFileHandler(os.path.join(self.log_dir, f"{batch_id}.log"))
+            handler.setFormatter(self.formatter)
+            self.handlers[batch_id] = handler
+            if len(self.handlers) > self.max_open:
+                self.handlers.popitem(last=False)[1].close()
+        self.handlers.move_to_end(batch_id)
+        self.handlers[batch_id].handle(record)
+
+    def flush(self):
+        # de listener-thread kan tegelijk een nieuwe batchlog openen
+        with self.lock:
+            for handler in self.handlers.values():
+                handler.flush()
+
+    def close(self):
+        for handler in self.handlers.values():
+            handler.close()
+        super().close()
+
+
+def start_log_listener(logfile: str, verbose: bool = False):
+    """
+    Route the logging of this process and of all worker processes through
+    one listener in this (main) process.
+
+    Workers only put records on a queue; the listener thread writes them,
+    buffered, to the central log, the per-batch logs and the console. The
+    listener is stopped (and the files flushed) when the program exits.
+
+    Returns the log queue.
+    """
+    global _LOG_QUEUE, _LOG_VERBOSE, _LOG_HANDLERS
+    if _LOG_QUEUE is not None:
+        return _LOG_QUEUE
+
+    os.makedirs(os.path.dirname(logfile) or ".", exist_ok=True)
+    formatter = logging.Formatter(LOG_FORMAT)
+
+    central = BufferedFileHandler(logfile)
+    central.setLevel(logging.DEBUG)
+    console = logging.StreamHandler(sys.stderr)
+    console.setLevel(logging.DEBUG if verbose else logging.INFO)
+    per_batch = BatchRoutingHandler(os.path.dirname(logfile) or ".")
+    for handler in (central, console, per_batch):
+        handler.setFormatter(formatter)
+
+    _LOG_QUEUE = multiprocessing.Queue(-1)
+    _LOG_VERBOSE = verbose
+    _LOG_HANDLERS = (central, console, per_batch)
+    listener = logging.handlers.QueueListener(_LOG_QUEUE, central, console, per_batch,
+                                              respect_handler_level=True)
+    listener.start()
+
+    def stop():
+        listener.stop()
+        for handler in (central, console, per_batch):
+            handler.close()
+    atexit.register(stop)
+
+    _attach_queue(_LOG_QUEUE, verbose)
+    return _LOG_QUEUE
+
+
+def flush_logs():
+    """Flush the buffered log files of the listener (e.g. when a long-running watch is idle)."""
+    for handler in _LOG_HANDLERS:
+        handler.flush()
+
+
+def _attach_queue(queue, verbose: bool):
+    """Send all records of the package loggers to ``queue``."""
+    logger = logging.getLogger(LOGGER_NAME)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(logging.handlers.QueueHandler(queue))
+    logger.setLevel(logging.DEBUG if verbose else logging.INFO)
+
+
+def _init_worker_logging(queue, verbose: bool):
+    """ProcessPoolExecutor initializer: connect a worker process to the log listener."""
+    global _LOG_QUEUE, _LOG_VERBOSE
+    _LOG_QUEUE, _LOG_VERBOSE = queue, verbose
+    _attach_queue(queue, verbose)
+
+
+def worker_log_config() -> dict:
+    """
+    ProcessPoolExecutor keyword arguments that connect the workers to the log
+    listener (empty when no listener runs).
+    """
+    if _LOG_QUEUE is None:
+        return {}
+    return {"initializer": _init_worker_logging, "initargs": (_LOG_QUEUE, _LOG_VERBOSE)}
 
 
 def setup_logging(logfile: str, verbose: bool = False, batch_id: str | None = None) -> logging.Logger:
@@ -9,11 +168,17 @@ def setup_logging(logfile: str, verbose: bool = False, batch_id: str | None = No
     - Central log: logs/publicatiedatumcontrole.log
     - Optional per-batch log: logs/<batch_id>.log
     - Console logging gaat naar stderr om tqdm progressbars niet te verstoren.
+
+    With a log listener (start_log_listener) the loggers get no handlers of
+    their own: records go through the queue to the listener.
     """
-    logger_name = f"publicatiedatumcontrole{'.' + batch_id if batch_id else ''}"
+    logger_name = f"{LOGGER_NAME}{'.' + batch_id if batch_id else ''}"
     logger = logging.getLogger(logger_name)
     logger.setLevel(logging.DEBUG if verbose else logging.INFO)
 
+    if _LOG_QUEUE is not None:
+        return logger
+
     if not logger.handlers:
         # Zorg dat logmap bestaat
         os.makedirs(os.path.dirname(logfile), exist_ok=True)
@@ -26,7 +191,7 @@ def setup_logging(logfile: str, verbose: bool = False, batch_id: str | None = No
         ch = logging.StreamHandler(sys.stderr)
         ch.setLevel(logging.DEBUG if verbose else logging.INFO)
 
-        formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(name)s - %(message)s")
+        formatter = logging.Formatter(LOG_FORMAT)
         fh.setFormatter(formatter)
         ch.setFormatter(formatter)
 
@@ -0,0 +1,211 @@
+import os
+import time
+import signal
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List
+
+from .utils import worker_log_config, flush_logs
+from .archive import is_archive, archive_batch_path, close_archives
+
+# hoe vaak (seconden) de hoofdlus afgeronde batches en signalen controleert
+TICK = 1.0
+
+
+def _init_warm_worker(log_initializer=None, log_initargs=()):
+    """
+    Initializer of the watch pool: connect the worker to the log listener and
+    load the scientific stack once, so a new batch does not pay for it.
+    """
+    # alleen het hoofdproces beslist over stoppen; lopende batches maken hun werk af
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    if log_initializer:
+        log_initializer(*log_initargs)
+    import scipy.stats, scipy.signal, scipy.ndimage  # noqa: F401,E401
+    from . import runner, report  # noqa: F401
+
+
+def _warm_up() -> int:
+    return os.getpid()
+
+
+def snapshot(path: str) -> tuple:
+    """(number of files, total size, newest mtime in ns) of a batch folder or archive."""
+    if os.path.isfile(path):
+        st = os.stat(path)
+        return 1, st.st_size, st.st_mtime_ns
+    count = size = newest = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                st = os.stat(os.path.join(dirpath, filename))
+            except OSError:
+                continue
+            count += 1
+            size += st.st_size
+            newest = max(newest, st.st_mtime_ns)
+    return count, size, newest
+
+
+class Inbox:
+    """
+    Batches delivered to an inbox folder: subfolders and .zip/.tar files.
+
+    An entry is ready once its file count, total size and newest mtime have
+    not changed for ``stable`` seconds. Hidden entries (``.name``, e.g. the
+    temporary files of rsync) are ignored. An entry is returned once per
+    delivery: it is returned again when it changes after it was returned (a
+    batch delivered again or corrected under the same name) or when it is
+    removed and delivered again.
+
+    ``delivered`` ({entry path: snapshot}, e.g. from the run journal) holds
+    the entries that were returned in an earlier run; they are only
+    returned again when their snapshot differs. A snapshot of None accepts
+    the entry as it is now.
+    """
+
+    def __init__(self, path: str, stable: float = 60, delivered: Dict[str, tuple | None] | None = None):
+        self.path = path
+        self.stable = stable
+        self.pending: Dict[str, tuple] = {}
+        # snapshot van elk teruggegeven item op het moment dat het klaar was
+        self.seen: Dict[str, tuple | None] = dict(delivered or {})
+
+    def poll(self) -> List[str]:
+        """Entries that became ready since the last poll."""
+        ready = []
+        now = time.monotonic()
+        try:
+            with os.scandir(self.path) as entries:
+                names = sorted(e.path for e in entries
+                               if not e.name.startswith(".") and (e.is_dir() or is_archive(e.path)))
+        except OSError:
+            return ready
+
+        # verdwenen items vergeten: dezelfde naam is daarna een nieuwe levering
+        for gone in set(self.seen).union(self.pending).difference(names):
+            self.seen.pop(gone, None)
+            self.pending.pop(gone, None)
+
+        for path in names:
+            current = snapshot(path)
+            if path in self.seen and self.seen[path] is None:
+                # in een eerdere run verwerkt, zonder snapshot in de journal
+                self.seen[path] = current
+            if self.seen.get(path) == current:
+                continue
+            previous, since = self.pending.get(path, (None, now))
+            if current != previous:
+                self.pending[path] = (current, now)
+            elif current[0] and now - since >= self.stable:
+                del self.pending[path]
+                self.seen[path] = current
+                ready.append(path)
+        return ready
+
+
+def watch(inbox_dir: str, args, months: dict, logfile: str, verbose: bool, max_workers: int,
+          logger: logging.Logger, journal=None, delivered: Dict[str, tuple | None] | None = None,
+          interval: float = 10,
+          stable: float = 60, on_result: Callable[[tuple], None] | None = None) -> List[tuple]:
+    """
+    Process batches from ``inbox_dir`` as they are delivered, until SIGTERM
+    or SIGINT.
+
+    One process pool is started for the whole run and every worker loads
+    pandas, scipy and the report code once. The inbox is polled every
+    ``interval`` seconds; a batch is queued when it has been unchanged for
+    ``stable`` seconds (see Inbox). Inbox entries in ``delivered`` (absolute
+    path: snapshot, finished in an earlier run according to the journal)
+    are only processed again when they changed since. The journal records
+    the entry and its snapshot with every finished batch. ``on_result`` is
+    called with the result tuple of every finished
+    batch. On a stop signal no new batches are started, and the running ones
+    are finished before the pool is shut down.
+
+    Returns list of the result tuples of this run.
+    """
+    from .runner import process_batch
+
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        # niet loggen in de signal handler: de hoofdlus meldt het
+        stop.set()
+
+    previous_handlers = {sig: signal.signal(sig, request_stop) for sig in (signal.SIGTERM, signal.SIGINT)}
+
+    # absolute paden: de journal legt de inbox-items absoluut vast
+    inbox = Inbox(os.path.abspath(inbox_dir), stable=stable, delivered=delivered)
+    if delivered:
+        logger.info(f"{len(delivered)} batches al verwerkt in een eerdere run; "
+                    f"alleen gewijzigde of opnieuw geleverde batches worden verwerkt")
+    results = []
+    # future -> (batchpad, inbox-item, snapshot van de levering)
+    running = {}
+
+    def collect(done):
+        for fut in done:
+            path, source, delivery = running.pop(fut)
+            try:
+                result = fut.result()
+            except Exception as e:
+                logger.error(f"Batch {path} failed: {e}")
+                continue
+            if journal:
+                journal.record_batch(path, result, source=source, snapshot=delivery)
+            results.append(result)
+            if on_result:
+                on_result(result)
+
+    log_config = worker_log_config()
+    executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_warm_worker,
+                                   initargs=(log_config.get("initializer"), log_config.get("initargs", ())))
+    try:
+        # workers direct starten, zodat de imports niet bij de eerste batch gebeuren
+        wait([executor.submit(_warm_up) for _ in range(max_workers)])
+        logger.info(f"Watch-modus: {inbox_dir} wordt elke {interval:g} s gecontroleerd "
+                    f"({max_workers} warme workers, batch klaar na {stable:g} s zonder wijzigingen)")
+
+        next_poll = 0.0
+        while not stop.is_set():
+            if time.monotonic() >= next_poll:
+                next_poll = time.monotonic() + interval
+                for path in inbox.poll():
+                    try:
+                        path_batch = archive_batch_path(path) if is_archive(path) else path
+                    except OSError as e:
+                        logger.error(f"Kan archief {path} niet lezen: {e}")
+                        continue
+                    finally:
+                        # de worker opent het archief zelf; dit proces draait dagen door
+                        close_archives(path)
+                    if any(job[0] == path_batch for job in running.values()):
+                        # opnieuw geleverd terwijl de vorige levering nog loopt: later oppakken
+                        logger.info(f"Batch {path} gewijzigd maar wordt nog verwerkt, volgt daarna")
+                        inbox.seen.pop(path, None)
+                        continue
+                    logger.info(f"Nieuwe batch in inbox: {path}")
+                    fut = executor.submit(process_batch, path_batch, args, months, logfile, verbose)
+                    running[fut] = (path_batch, path, inbox.seen[path])
+
+            if running:
+                done, _ = wait(running, timeout=TICK, return_when=FIRST_COMPLETED)
+                collect(done)
+            else:
+                stop.wait(TICK)
+            flush_logs()
+
+        logger.info("Stopsignaal ontvangen: geen nieuwe batches meer")
+        if running:
+            logger.info(f"Wachten op {len(running)} lopende batches...")
+            collect(wait(running).done)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        for sig, handler in previous_handlers.items():
+            signal.signal(sig, handler)
+
+    logger.info(f"Watch-modus gestopt na {len(results)} batches")
+    return results
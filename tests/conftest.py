@@ -0,0 +1,28 @@
+import argparse
+import os
+
+import pytest
+
+from publicatiedatumcontrole.utils import MONTHS
+
+
+def run_args(output: str, **settings) -> argparse.Namespace:
+    """Command-line settings as cli.main passes them to process_batch (defaults of config.yaml)."""
+    values = dict(threshold=0.8, output=output, xml=False, date_tolerance=2, file_workers=1, file_chunksize=200,
+                  header_fraction=None, profiles=None, profile_margin=200, profile_min_hits=0.5, cache=False,
+                  cache_hash=False, cache_max_entries=500000, journal=None, kde_backend="auto",
+                  kde_max_exact=5000, kde_grid_size=256, kde_sample=None, snippet_workers=1, prefetch=0,
+                  prefetch_memory=256, alto_parser="lxml", mets_guided=False, sample=0, sample_seed=0,
+                  sample_escalate=None, cprofile=False)
+    values.update(settings)
+    return argparse.Namespace(**values)
+
+
+@pytest.fixture
+def months():
+    return dict(MONTHS)
+
+
+@pytest.fixture
+def logfile(tmp_path):
+    return os.path.join(tmp_path, "logs", "run.log")
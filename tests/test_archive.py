@@ -0,0 +1,76 @@
+import os
+import zipfile
+
+import pytest
+
+from publicatiedatumcontrole import archive
+from publicatiedatumcontrole.archive import open_archive, close_archives, read_file
+
+
+@pytest.fixture(autouse=True)
+def no_readers():
+    close_archives()
+    yield
+    close_archives()
+
+
+def write_zip(path, contents: bytes, mtime: int | None = None) -> str:
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr("batch/issue/issue_00001_alto.xml", contents)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def test_replaced_archive_gets_new_reader(tmp_path):
+    path = write_zip(tmp_path / "batch.zip", b"oud", mtime=1_000_000)
+    member = f"{path}/batch/issue/issue_00001_alto.xml"
+    old = open_archive(path)
+    assert read_file(member) == b"oud"
+
+    write_zip(tmp_path / "batch.zip", b"nieuwe inhoud", mtime=2_000_000)
+    assert read_file(member) == b"nieuwe inhoud"
+    assert open_archive(path) is not old
+    assert old.closed
+    assert len(archive._readers) == 1
+
+
+def test_reader_cache_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "MAX_OPEN_ARCHIVES", 3)
+    paths = [write_zip(tmp_path / f"batch{i}.zip", b"x") for i in range(5)]
+    readers = [open_archive(path) for path in paths]
+
+    assert len(archive._readers) == 3
+    assert [r.closed for r in readers] == [True, True, False, False, False]
+    # opnieuw openen na verdringen geeft een werkende reader
+    assert read_file(f"{paths[0]}/batch/issue/issue_00001_alto.xml") == b"x"
+
+
+def test_close_archives_for_batch_path(tmp_path):
+    first = write_zip(tmp_path / "a.zip", b"a")
+    second = write_zip(tmp_path / "b.zip", b"b")
+    reader_a, reader_b = open_archive(first), open_archive(second)
+
+    close_archives(f"{first}/batch")
+    assert reader_a.closed and not reader_b.closed
+    with pytest.raises(OSError):
+        reader_a.read("batch/issue/issue_00001_alto.xml")
+
+    close_archives(str(tmp_path / "gewone_map"))
+    assert not reader_b.closed
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="alleen met fork")
+def test_fork_while_lock_is_held(tmp_path):
+    path = write_zip(tmp_path / "batch.zip", b"x")
+    open_archive(path)
+    # een thread van de ouder (discovery) houdt het slot vast op het moment van de fork
+    with archive._readers_lock:
+        pid = os.fork()
+        if pid == 0:
+            import signal
+            signal.alarm(5)
+            ok = read_file(f"{path}/batch/issue/issue_00001_alto.xml") == b"x"
+            os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
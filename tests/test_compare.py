@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+
+from publicatiedatumcontrole.compare import parse_dates, compare_dates
+
+
+def test_parse_dates_ignores_whitespace():
+    values = pd.Series([" 1921-03-05", "1921 - 03 - 05", "1921-03-05\n", "\t1921-3-5 ",
+                        "1921-03-05-2", "1921-03", "1921-00-05", "19 21-03-05", "", None])
+    expected = [[1921, 3, 5]] * 5 + [[-1, -1, -1]] * 5
+    assert parse_dates(values).tolist() == expected
+
+
+def test_distance_with_whitespace_in_mets_date():
+    df = pd.DataFrame({"alto_date": ["1921-03-05", "1921-03-07", "1921-03-05"],
+                       "mets_date": [" 1921-03-05", "1921 - 03 - 05", "1921-03"]})
+    assert compare_dates(df)["distance_score"].to_numpy().tolist() == [0, 2, 9999]
+    assert np.issubdtype(df["distance_score"].dtype, np.integer)
+
+
+def test_overflowing_component_invalidates_only_its_row():
+    df = pd.DataFrame({"alto_date": ["1921-03-05", "1921-03-05", "1921-03-05"],
+                       "mets_date": ["99999999999999999999-01-01", "0001921-0003-005", "1921-03-06"]})
+    assert compare_dates(df)["distance_score"].tolist() == [9999, 0, 1]
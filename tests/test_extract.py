@@ -0,0 +1,60 @@
+import glob
+import os
+
+import pytest
+
+from publicatiedatumcontrole.benchmark import reference_alto_strings
+from publicatiedatumcontrole.extract import ALTO_BACKENDS, blocks_top_down, read_alto_strings
+from publicatiedatumcontrole.runner import find_candidates
+from publicatiedatumcontrole.synthetic import generate_batch
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+COLUMNS = os.path.join(FIXTURES, "columns_00001_alto.xml")
+# dezelfde pagina met attributen tussen enkele aanhalingstekens
+QUOTES = os.path.join(FIXTURES, "quotes_00001_alto.xml")
+MODES = [{}, {"header_fraction": 0.25}, {"header_fraction": 0.6},
+         {"region": {"hmin": 0, "vmin": 0, "hmax": 900, "vmax": 600}},
+         {"region": {"hmin": 1200, "vmin": 300, "hmax": 2000, "vmax": 600}}]
+
+
+@pytest.fixture(scope="module")
+def alto_files(tmp_path_factory):
+    """The fixtures plus a few synthetic front pages."""
+    batch = str(tmp_path_factory.mktemp("synthetic"))
+    generate_batch(batch, issues=4, body_words=600, seed=5)
+    return sorted(glob.glob(os.path.join(FIXTURES, "*.xml"))) + \
+        sorted(glob.glob(os.path.join(batch, "*", "alto", "*.xml")))
+
+
+@pytest.mark.parametrize("backend", list(ALTO_BACKENDS))
+@pytest.mark.parametrize("mode", MODES, ids=["full", "header", "header_wide", "region", "region_column"])
+def test_backends_match_reference(alto_files, backend, mode):
+    for alto_file in alto_files:
+        expected = reference_alto_strings(alto_file, **mode)
+        assert read_alto_strings(alto_file, backend=backend, **mode) == expected, alto_file
+        assert read_alto_strings(alto_file, **mode) == expected, alto_file
+        with open(alto_file, "rb") as f:
+            assert read_alto_strings(alto_file, backend=backend, data=f.read(), **mode) == expected, alto_file
+
+
+@pytest.mark.parametrize("backend", list(ALTO_BACKENDS))
+@pytest.mark.parametrize("alto_file", [COLUMNS, QUOTES], ids=["columns", "quotes"])
+def test_header_band_on_page_stored_by_column(backend, alto_file, months):
+    with open(alto_file, "rb") as f:
+        assert not blocks_top_down(f.read())
+
+    page = read_alto_strings(alto_file, header_fraction=0.25, backend=backend)
+    # kopblokken van beide kolommen, plus het eerste woord onder de band na elk van beide
+    assert page.contents == ["HET", "NIEUWS", "links", "kolom", "tekst", "links",
+                             "Dinsdag", "5", "Maart", "1921", "rechts"]
+    issue = os.path.basename(alto_file).split("_")[0]
+    assert find_candidates(alto_file, months, header_fraction=0.25, backend=backend) == \
+        [(issue, "1921-03-05", 420, 1540, 3600)]
+
+
+@pytest.mark.parametrize("backend", list(ALTO_BACKENDS))
+@pytest.mark.parametrize("alto_file", [COLUMNS, QUOTES], ids=["columns", "quotes"])
+def test_region_on_page_stored_by_column(backend, alto_file):
+    region = {"hmin": 1200, "vmin": 300, "hmax": 2000, "vmax": 600}
+    page = read_alto_strings(alto_file, region=region, backend=backend)
+    assert page.contents == ["Dinsdag", "5", "Maart", "1921"]
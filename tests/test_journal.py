@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from publicatiedatumcontrole.journal import RunJournal, run_journal_dir
+
+from conftest import run_args
+
+
+def test_runs_over_other_batches_keep_their_journal(tmp_path):
+    output = str(tmp_path / "out")
+    args = run_args(output)
+    dir_a = run_journal_dir(output, ["/data/batch1", "/data/batch2"])
+    dir_b = run_journal_dir(output, ["/data/batch3"])
+    assert dir_a != dir_b
+    assert dir_a == run_journal_dir(output, ["/data/batch2", "/data/batch1"])
+
+    journal_a = RunJournal(dir_a, args)
+    journal_a.record_batch("/data/batch1", ("batch1", 3, 3, 2, 0, {}))
+    RunJournal(dir_b, args)
+    assert RunJournal(dir_a, args, resume=True).completed_batches() == {
+        os.path.abspath("/data/batch1"): ("batch1", 3, 3, 2, 0, {})}
+
+    # een nieuwe run over dezelfde batches begint opnieuw
+    assert RunJournal(dir_a, args).completed_batches() == {}
+
+
+@pytest.mark.parametrize("setting, value", [("mets_guided", True), ("alto_parser", "expat"),
+                                            ("kde_backend", "grid"), ("sample", 20), ("threshold", 0.7)])
+def test_resume_refused_with_other_settings(tmp_path, setting, value):
+    journal_dir = run_journal_dir(str(tmp_path), ["/data/batch1"])
+    RunJournal(journal_dir, run_args(str(tmp_path))).record_batch("/data/batch1", ("batch1", 1, 1, 1, 0, {}))
+
+    with pytest.raises(ValueError, match=setting):
+        RunJournal(journal_dir, run_args(str(tmp_path), **{setting: value}), resume=True)
+    assert RunJournal(journal_dir, run_args(str(tmp_path)), resume=True).completed_batches()
+
+
+def test_remove_after_clean_finish(tmp_path):
+    journal_dir = run_journal_dir(str(tmp_path), ["/data/batch1"])
+    journal = RunJournal(journal_dir, run_args(str(tmp_path)))
+    journal.record_batch("/data/batch1", ("batch1", 1, 1, 1, 0, {}))
+    journal.remove()
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,21 @@
+from rapidfuzz import fuzz
+
+from publicatiedatumcontrole.matcher import MonthMatcher
+
+
+def reference_match(token: str, months: dict) -> tuple:
+    """The per-word loop of the original runner."""
+    if token.lower() in ["maar"]:
+        return ()
+    return tuple(month for month in months if fuzz.ratio(token.lower(), month) > 80)
+
+
+def test_matches_plain_fuzz_ratio_loop(months):
+    tokens = ["Maart", "MAART", "maart,", "Maart.", "(maart)", "maart-", "Jan.", "januari", "Januari;",
+              "JANUARI", "jannari", "Febr.", "februari.", "Februari", "mei", "Mei.", "MEI", "juni,",
+              "Juli", "jul!", "Augustus", "aug.", "September", "sept", "octob.", "October", "oktober",
+              "Nov.", "November", "December", "dec.", "Dec'", "maar", "MAAR", "Maar,", "1921", "", "-"]
+    tokens += [f"{t}{p}" for t in ["mei", "juni", "april"] for p in ",.;:!?'\"-"]
+    matcher = MonthMatcher(months)
+    for token in tokens:
+        assert matcher.match(token) == reference_match(token, months), token
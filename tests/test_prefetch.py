@@ -0,0 +1,40 @@
+import time
+
+from publicatiedatumcontrole import prefetch
+from publicatiedatumcontrole.prefetch import Prefetcher
+
+
+def write_files(tmp_path, count, size):
+    paths = []
+    for i in range(count):
+        path = tmp_path / f"file_{i:03d}.xml"
+        path.write_bytes(bytes([i]) * size)
+        paths.append(str(path))
+    return paths
+
+
+def test_reads_in_flight_stay_within_budget(tmp_path, monkeypatch):
+    paths = write_files(tmp_path, 20, 100 * 1024)
+    read = prefetch._read
+    monkeypatch.setattr(prefetch, "_read", lambda path: (time.sleep(0.01), read(path))[1])
+
+    prefetcher = Prefetcher(depth=8, memory_mb=0.3)
+    reserved = []
+    result = []
+    for path, data in prefetcher.iter_files(paths):
+        # gereserveerd: bestanden die onderweg zijn of gelezen maar nog niet verwerkt
+        reserved.append(prefetcher.reserved)
+        result.append((path, data))
+        time.sleep(0.005)
+
+    assert [p for p, _ in result] == paths
+    assert all(data == bytes([i]) * 100 * 1024 for i, (_, data) in enumerate(result))
+    assert max(reserved) <= prefetcher.budget
+    assert max(reserved) >= 2 * 100 * 1024
+    assert prefetcher.reserved == 0
+
+
+def test_file_larger_than_budget_is_still_read(tmp_path):
+    paths = write_files(tmp_path, 3, 512 * 1024)
+    prefetcher = Prefetcher(depth=4, memory_mb=0.25)
+    assert [len(data) for _, data in prefetcher.iter_files(paths)] == [512 * 1024] * 3
@@ -0,0 +1,59 @@
+import json
+import os
+
+from publicatiedatumcontrole.profiles import load_profiles
+from publicatiedatumcontrole.runner import process_batch
+from publicatiedatumcontrole.synthetic import generate_batch
+
+from conftest import run_args
+
+
+def test_profile_recovers_from_moved_date(tmp_path, months, logfile):
+    generate_batch(str(tmp_path / "old"), issues=40, body_words=400, seed=1)
+    # zelfde titels, datum een stuk lager en verder naar rechts
+    generate_batch(str(tmp_path / "moved"), issues=40, body_words=400, seed=2,
+                   date_positions=[(650, 1200), (700, 1500)])
+    profiles = str(tmp_path / "profiles")
+
+    reference = process_batch(str(tmp_path / "moved"), run_args(str(tmp_path / "out_ref")), months, logfile, False)
+    assert reference[3] > 0 and reference[4] > 0
+
+    process_batch(str(tmp_path / "old"), run_args(str(tmp_path / "out_old"), profiles=profiles),
+                  months, logfile, False)
+    old = load_profiles(profiles)
+    assert all(p["peak"][1] < 400 for p in old.values())
+
+    moved = process_batch(str(tmp_path / "moved"), run_args(str(tmp_path / "out_moved"), profiles=profiles),
+                          months, logfile, False)
+    assert moved[3:5] == reference[3:5]
+
+    learned = load_profiles(profiles)
+    for title, profile in learned.items():
+        assert profile["peak"][1] > 600
+        assert profile["runs"] == 2
+        # de regio blijft ook de oude positie omvatten
+        assert profile["bbox"][1] <= old[title]["bbox"][1]
+
+    # de volgende run vindt de datum weer in de (samengevoegde) regio
+    again = process_batch(str(tmp_path / "moved"), run_args(str(tmp_path / "out_again"), profiles=profiles),
+                          months, logfile, False)
+    assert again[3:5] == reference[3:5]
+    with open(logfile, encoding="utf-8") as f:
+        assert sum("past niet meer" in line for line in f) == len(learned)
+
+
+def test_profile_merges_with_previous(tmp_path, months, logfile):
+    generate_batch(str(tmp_path / "a"), issues=40, body_words=400, seed=1)
+    generate_batch(str(tmp_path / "b"), issues=40, body_words=400, seed=3)
+    profiles = str(tmp_path / "profiles")
+    process_batch(str(tmp_path / "a"), run_args(str(tmp_path / "out"), profiles=profiles), months, logfile, False)
+    first = load_profiles(profiles)
+    process_batch(str(tmp_path / "b"), run_args(str(tmp_path / "out"), profiles=profiles), months, logfile, False)
+
+    for name in os.listdir(profiles):
+        with open(os.path.join(profiles, name), encoding="utf-8") as f:
+            merged = json.load(f)
+        previous = first[merged["title_edition"]]
+        assert merged["runs"] == 2
+        assert merged["points"] > previous["points"]
+        assert merged["bbox"][0] <= previous["bbox"][0] and merged["bbox"][3] >= previous["bbox"][3]
@@ -0,0 +1,45 @@
+import pandas as pd
+
+from publicatiedatumcontrole import runner
+from publicatiedatumcontrole.runner import process_batch, analyse_batch, compare_dates
+from publicatiedatumcontrole.synthetic import generate_batch
+
+from conftest import run_args
+
+
+def run_captured(monkeypatch, batch, args, months, logfile) -> dict:
+    """process_batch, keeping the candidates and the compare results it produced."""
+    captured = {"compared": []}
+
+    def capture_analyse(path_batch, args, candidates, dict_mets_dates, *rest, **kwargs):
+        captured["candidates"] = pd.DataFrame(list(candidates))
+        captured["mets"] = pd.DataFrame(dict_mets_dates)
+        return analyse_batch(path_batch, args, candidates, dict_mets_dates, *rest, **kwargs)
+
+    def capture_compare(df, *rest, **kwargs):
+        result = compare_dates(df, *rest, **kwargs)
+        captured["compared"].append(result.copy())
+        return result
+
+    monkeypatch.setattr(runner, "analyse_batch", capture_analyse)
+    monkeypatch.setattr(runner, "compare_dates", capture_compare)
+    captured["result"] = process_batch(batch, args, months, logfile, False)
+    return captured
+
+
+def test_file_workers_give_identical_results(tmp_path, months, logfile, monkeypatch):
+    batch = str(tmp_path / "batch")
+    generate_batch(batch, issues=30, body_words=300, error_rate=0.2, seed=5)
+
+    single = run_captured(monkeypatch, batch, run_args(str(tmp_path / "out1"), file_workers=1),
+                          months, logfile)
+    pooled = run_captured(monkeypatch, batch, run_args(str(tmp_path / "out3"), file_workers=3, file_chunksize=2),
+                          months, logfile)
+
+    assert len(single["candidates"]) > 0 and single["result"][4] > 0
+    pd.testing.assert_frame_equal(pooled["candidates"], single["candidates"])
+    pd.testing.assert_frame_equal(pooled["mets"], single["mets"])
+    assert len(pooled["compared"]) == len(single["compared"]) > 0
+    for pooled_df, single_df in zip(pooled["compared"], single["compared"]):
+        pd.testing.assert_frame_equal(pooled_df, single_df)
+    assert pooled["result"][:5] == single["result"][:5]
@@ -0,0 +1,46 @@
+import os
+
+from publicatiedatumcontrole.runner import process_batch
+from publicatiedatumcontrole.synthetic import generate_batch
+
+from conftest import run_args
+
+
+def report_files(folder):
+    return sorted(os.path.relpath(os.path.join(d, f), folder) for d, _, files in os.walk(folder) for f in files)
+
+
+def test_sample_keeps_reports_of_full_run(tmp_path, months, logfile):
+    batch = str(tmp_path / "batch")
+    generate_batch(batch, issues=60, body_words=300, error_rate=0.2, seed=4)
+    output = str(tmp_path / "out")
+
+    full = process_batch(batch, run_args(output), months, logfile, False)
+    full_reports = report_files(os.path.join(output, "batch"))
+    assert full[4] > 0 and full_reports
+
+    sampled = process_batch(batch, run_args(output, sample=10), months, logfile, False)
+    assert sampled[6]["sampled"] == 20 and not sampled[6]["escalated"]
+    reports = report_files(os.path.join(output, "batch"))
+    assert [f for f in reports if not f.startswith("sample" + os.sep)] == full_reports
+    assert any(f.startswith("sample" + os.sep) for f in reports)
+
+
+def test_escalation_replaces_only_sample_reports(tmp_path, months, logfile):
+    batch = str(tmp_path / "batch")
+    generate_batch(batch, issues=60, body_words=300, error_rate=0.2, seed=4)
+    output = str(tmp_path / "out")
+    full = process_batch(batch, run_args(str(tmp_path / "ref")), months, logfile, False)
+
+    # bestand van een eerdere run in dezelfde batchmap
+    os.makedirs(os.path.join(output, "batch"))
+    with open(os.path.join(output, "batch", "notes.txt"), "w") as f:
+        f.write("niet weggooien")
+
+    escalated = process_batch(batch, run_args(output, sample=10, sample_escalate=0.0), months, logfile, False)
+    assert escalated[6]["escalated"]
+    assert escalated[:5] == full[:5]
+    reports = report_files(os.path.join(output, "batch"))
+    assert "notes.txt" in reports
+    assert not any(f.startswith("sample" + os.sep) for f in reports)
+    assert sorted(set(reports) - {"notes.txt"}) == report_files(os.path.join(str(tmp_path / "ref"), "batch"))
@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from publicatiedatumcontrole.scores import kde_gaussian
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_grid_kde_matches_exact(seed):
+    # titel van 3000 kandidaten: een datumhotspot en verspreide datums in de tekst
+    rng = np.random.default_rng(seed)
+    hotspot, spread = 900, 2100
+    df = pd.DataFrame({
+        "HPOS": np.concatenate([rng.normal(1200, 25, hotspot), rng.uniform(100, 5000, spread)]).round(),
+        "VPOS": np.concatenate([rng.normal(300, 15, hotspot), rng.uniform(100, 8000, spread)]).round(),
+    })
+
+    exact = kde_gaussian(df.copy(), backend="exact")["kde_score"]
+    grid = kde_gaussian(df.copy(), backend="grid")["kde_score"]
+
+    # hoogstens één afrondingsstap van de genormaliseerde score
+    assert (exact - grid).abs().max() <= 0.01 + 1e-9
+    assert exact.idxmax() in set(grid[grid == grid.max()].index)
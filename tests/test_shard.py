@@ -0,0 +1,118 @@
+import os
+import time
+import logging
+import multiprocessing
+
+import pytest
+
+from publicatiedatumcontrole import shard
+from publicatiedatumcontrole.shard import ShardStore, MANIFEST_NAME, _write_json, merge
+
+pytestmark = pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(),
+                                reason="workers erven de vervangen taakfuncties via fork")
+
+
+def write_manifest(manifest_dir, batches: int = 3, shards: int = 4) -> list:
+    for sub in ("shards", "claims", "results", "failed", "logs", "calls"):
+        os.makedirs(os.path.join(manifest_dir, sub), exist_ok=True)
+    manifest = {"created": "", "settings": {}, "batches": []}
+    for b in range(batches):
+        manifest["batches"].append({"path": f"/data/batch{b}", "reduce": f"{b:05d}-reduce",
+                                    "shards": [f"{b:05d}-{s:05d}" for s in range(shards)], "metrics": {}})
+    _write_json(os.path.join(manifest_dir, MANIFEST_NAME), manifest)
+    return [t for batch in manifest["batches"] for t in batch["shards"] + [batch["reduce"]]]
+
+
+@pytest.fixture
+def fake_tasks(monkeypatch):
+    """Tasks that only record which worker ran them."""
+    def record(store, task_id):
+        with open(os.path.join(store.dir, "calls", store.owner), "a") as f:
+            f.write(f"{task_id}\n")
+        time.sleep(0.02)
+        if os.path.exists(os.path.join(store.dir, "broken", task_id)):
+            raise OSError(f"{task_id} kan niet gelezen worden")
+        return {"owner": store.owner}
+
+    monkeypatch.setattr(shard, "run_shard", lambda store, shard_id, *rest: record(store, shard_id))
+    monkeypatch.setattr(shard, "run_reduce", lambda store, batch, *rest: record(store, batch["reduce"]))
+    # wachtende workers niet 15 s laten slapen
+    monkeypatch.setattr(shard, "POLL", 0.1)
+
+
+def run_workers(manifest_dir, count: int = 2, stale_after: float = 600, wait: bool = True) -> dict:
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=shard.work, args=(str(manifest_dir), stale_after),
+                               kwargs={"wait": wait}) for _ in range(count)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+    calls = {}
+    for owner in os.listdir(os.path.join(manifest_dir, "calls")):
+        with open(os.path.join(manifest_dir, "calls", owner)) as f:
+            calls[owner] = f.read().split()
+    return calls
+
+
+def test_every_task_is_claimed_once(tmp_path, fake_tasks):
+    tasks = write_manifest(tmp_path)
+    calls = run_workers(tmp_path)
+
+    claimed = [task for owner_tasks in calls.values() for task in owner_tasks]
+    assert sorted(claimed) == sorted(tasks)
+    assert len(calls) == 2
+    assert ShardStore(str(tmp_path)).missing() == []
+    assert os.listdir(tmp_path / "claims") == []
+
+
+def test_stale_claim_is_taken_over(tmp_path, fake_tasks):
+    tasks = write_manifest(tmp_path, batches=2, shards=2)
+    # gestopte worker: claim al een uur niet ververst
+    stale = tmp_path / "claims" / "00000-00001.lock"
+    stale.write_text("dode-host-1")
+    os.utime(stale, (time.time() - 3600, time.time() - 3600))
+    # levende worker op een andere machine
+    (tmp_path / "claims" / "00001-00000.lock").write_text("andere-host-2")
+
+    calls = run_workers(tmp_path, stale_after=60, wait=False)
+
+    claimed = sorted(task for owner_tasks in calls.values() for task in owner_tasks)
+    assert claimed == sorted(set(tasks) - {"00001-00000", "00001-reduce"})
+    assert ShardStore(str(tmp_path)).missing() == ["00001-00000", "00001-reduce"]
+    assert os.listdir(tmp_path / "claims") == ["00001-00000.lock"]
+
+
+def test_failed_task_is_skipped_and_reported(tmp_path, fake_tasks, caplog):
+    tasks = write_manifest(tmp_path)
+    os.makedirs(tmp_path / "broken")
+    (tmp_path / "broken" / "00001-00002").touch()
+
+    calls = run_workers(tmp_path)
+
+    # elke worker probeert de kapotte shard hoogstens één keer en doet de rest van het manifest
+    assert all(owner_tasks.count("00001-00002") <= 1 for owner_tasks in calls.values())
+    done = {task for owner_tasks in calls.values() for task in owner_tasks} - {"00001-00002"}
+    assert done == set(tasks) - {"00001-00002", "00001-reduce"}
+    store = ShardStore(str(tmp_path))
+    assert store.missing() == ["00001-00002", "00001-reduce"]
+    assert list(store.failures()) == ["00001-00002"]
+    assert store.failures()["00001-00002"]["attempts"] == sum(c.count("00001-00002") for c in calls.values())
+
+    with caplog.at_level(logging.ERROR):
+        assert merge(str(tmp_path), logging.getLogger("test_shard")) is None
+    assert "Taak 00001-00002 mislukt" in caplog.text
+    assert "kan niet gelezen worden" in caplog.text
+
+
+def test_waiting_workers_take_over_a_dead_claim(tmp_path, fake_tasks):
+    tasks = write_manifest(tmp_path, batches=2, shards=2)
+    # net geclaimd door een worker die daarna stopt: pas na stale_after over te nemen
+    (tmp_path / "claims" / "00001-00001.lock").write_text("dode-host-1")
+
+    calls = run_workers(tmp_path, stale_after=1)
+
+    claimed = sorted(task for owner_tasks in calls.values() for task in owner_tasks)
+    assert claimed == sorted(tasks)
+    assert ShardStore(str(tmp_path)).missing() == []
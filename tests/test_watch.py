@@ -0,0 +1,76 @@
+import os
+import shutil
+
+from publicatiedatumcontrole.journal import RunJournal, run_journal_dir
+from publicatiedatumcontrole.watch import Inbox
+
+from conftest import run_args
+
+
+def deliver(inbox_dir, name, contents: bytes, mtime: int):
+    folder = inbox_dir / name / "issue"
+    folder.mkdir(parents=True, exist_ok=True)
+    path = folder / "issue_mets.xml"
+    path.write_bytes(contents)
+    os.utime(path, (mtime, mtime))
+
+
+def ready_after_two_polls(inbox: Inbox) -> list:
+    # de eerste poll legt de snapshot vast, de tweede ziet hem ongewijzigd
+    return inbox.poll() + inbox.poll()
+
+
+def test_batch_is_returned_once_per_delivery(tmp_path):
+    inbox = Inbox(str(tmp_path), stable=0)
+    deliver(tmp_path, "batch1", b"<mets/>", mtime=1_000_000)
+    batch = str(tmp_path / "batch1")
+
+    assert ready_after_two_polls(inbox) == [batch]
+    assert ready_after_two_polls(inbox) == []
+
+    # gecorrigeerde levering met dezelfde naam
+    deliver(tmp_path, "batch1", b"<mets>gecorrigeerd</mets>", mtime=2_000_000)
+    assert ready_after_two_polls(inbox) == [batch]
+    assert ready_after_two_polls(inbox) == []
+
+
+def test_removed_batch_is_forgotten(tmp_path):
+    inbox = Inbox(str(tmp_path), stable=0)
+    deliver(tmp_path, "batch1", b"<mets/>", mtime=1_000_000)
+    assert ready_after_two_polls(inbox) == [str(tmp_path / "batch1")]
+
+    (tmp_path / "batch1" / "issue" / "issue_mets.xml").unlink()
+    (tmp_path / "batch1" / "issue").rmdir()
+    (tmp_path / "batch1").rmdir()
+    assert inbox.poll() == []
+    assert inbox.seen == {} and inbox.pending == {}
+
+    # exact dezelfde levering opnieuw
+    deliver(tmp_path, "batch1", b"<mets/>", mtime=1_000_000)
+    assert ready_after_two_polls(inbox) == [str(tmp_path / "batch1")]
+
+
+def test_resumed_watch_skips_only_unchanged_deliveries(tmp_path):
+    inbox_dir = tmp_path / "inbox"
+    output = str(tmp_path / "out")
+    for name in ("batch1", "batch2", "batch3"):
+        deliver(inbox_dir, name, b"<mets/>", mtime=1_000_000)
+
+    journal_dir = run_journal_dir(output, [], watch_dir=str(inbox_dir))
+    journal = RunJournal(journal_dir, run_args(output))
+    first = Inbox(str(inbox_dir), stable=0)
+    for path in ready_after_two_polls(first):
+        journal.record_batch(path, (os.path.basename(path), 1, 1, 1, 0, {}), source=path,
+                             snapshot=first.seen[path])
+
+    # herstart met --resume: batch2 is intussen gecorrigeerd, batch3 verwijderd en opnieuw geleverd
+    deliver(inbox_dir, "batch2", b"<mets>gecorrigeerd</mets>", mtime=2_000_000)
+    delivered = RunJournal(journal_dir, run_args(output), resume=True).completed_deliveries()
+    inbox = Inbox(str(inbox_dir), stable=0, delivered=delivered)
+    assert ready_after_two_polls(inbox) == [str(inbox_dir / "batch2")]
+
+    shutil.rmtree(inbox_dir / "batch3")
+    assert inbox.poll() == []
+    assert str(inbox_dir / "batch3") not in inbox.seen
+    deliver(inbox_dir, "batch3", b"<mets/>", mtime=1_000_000)
+    assert ready_after_two_polls(inbox) == [str(inbox_dir / "batch3")]